@@ -1,17 +1,72 @@
+import os
+import sys
+
 import gradio as gr
-import pandas as pd
+
+# The shared modules live one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_cache import DatasetCache
+from dataset_view import DEFAULT_PAGE_ROWS, FILTER_OPERATORS, DatasetView, RowFilter
+
+# Uploads stay on the server (in memory, with a Parquet copy on disk); the
+# browser only receives the page of rows it is looking at
+datasets = DatasetCache()
+
+PAGE_SIZES = [25, 50, 100, 500]
 
 
-# Function to load CSV and display the head for confirmation
+def get_view(dataset_key):
+    dataset = datasets.get(dataset_key)
+    if dataset is None:
+        return None
+    if "view" not in dataset.extra:
+        dataset.extra["view"] = DatasetView(dataset.df, dataset.profile)
+    return dataset.extra["view"]
+
+
+# Function to load CSV and display the first page for confirmation
 def load_csv(file):
     if file is None:
-        return "No file uploaded.", None
+        return None, "No file uploaded.", None, gr.update(), gr.update(), gr.update(), 1
+
+    with open(file.name, "rb") as stream:
+        dataset = datasets.load_csv(stream)
+    view = get_view(dataset.key)
+    page = view.page(0, DEFAULT_PAGE_ROWS)
+    columns = gr.update(choices=view.columns, value=None)
+    return (dataset.key, describe(page, 1), page.rows, columns, columns, columns, 1)
+
 
-    # Read the entire CSV file
-    df = pd.read_csv(file.name)
+# Function to fetch one page of the filtered and sorted view
+def show_page(dataset_key, page_number, page_size, sort_by, ascending, filter_column, filter_operator, filter_value):
+    view = get_view(dataset_key)
+    if view is None:
+        return "Upload a CSV file first.", None, 1
 
-    # Display the first 5 rows for confirmation
-    return df.head(), df  # First output for preview, second for full DataFrame
+    filters = []
+    if filter_column and filter_operator and filter_value not in (None, ""):
+        filters.append(RowFilter(filter_column, filter_operator, str(filter_value)))
+    page_size = int(page_size or DEFAULT_PAGE_ROWS)
+    try:
+        page = view.page(0, page_size, sort_by, ascending, filters)
+        page_number = max(1, min(int(page_number or 1), page.page_count))
+        page = view.page((page_number - 1) * page_size, page_size, sort_by, ascending, filters)
+    except (KeyError, TypeError, ValueError) as e:
+        return f"Invalid filter: {e}", None, 1
+    return describe(page, page_number), page.rows, page_number
+
+
+def describe(page, page_number):
+    return f"Page {page_number} of {page.page_count} · {page.total_rows:,} matching rows"
+
+
+# Function to summarize one column on demand
+def show_column_stats(dataset_key, column):
+    view = get_view(dataset_key)
+    if view is None or not column:
+        return None
+    return view.column_stats(column)
 
 
 # Gradio Interface
@@ -19,12 +74,45 @@ with gr.Blocks() as demo:
     gr.Markdown("### 📊 Upload a CSV File to View and Process")
 
     file_input = gr.File(file_types=['.csv'], label="Upload CSV")
+    dataset_key = gr.State()
 
-    # Outputs: One for preview and one for full DataFrame (hidden)
-    preview_output = gr.Dataframe(label="Preview (First 5 Rows)")
-    full_data_output = gr.Dataframe(visible=False)  # Hidden but exists in memory
+    # View controls: sorting, a filter and paging
+    with gr.Row():
+        sort_by = gr.Dropdown(label="Sort by", choices=[])
+        ascending = gr.Checkbox(label="Ascending", value=True)
+        filter_column = gr.Dropdown(label="Filter column", choices=[])
+        filter_operator = gr.Dropdown(label="Operator", choices=list(FILTER_OPERATORS), value="==")
+        filter_value = gr.Textbox(label="Value")
+    with gr.Row():
+        previous_button = gr.Button("◀ Previous")
+        page_number = gr.Number(label="Page", value=1, precision=0)
+        next_button = gr.Button("Next ▶")
+        page_size = gr.Dropdown(label="Rows per page", choices=PAGE_SIZES, value=DEFAULT_PAGE_ROWS)
+
+    page_status = gr.Markdown()
+    preview_output = gr.Dataframe(label="Preview", interactive=False)
+
+    # Column statistics, computed when a column is picked
+    stats_column = gr.Dropdown(label="Column statistics", choices=[])
+    stats_output = gr.JSON()
+
+    view_inputs = [dataset_key, page_number, page_size, sort_by, ascending, filter_column, filter_operator, filter_value]
+    view_outputs = [page_status, preview_output, page_number]
 
     # Trigger load_csv on file upload
-    file_input.change(load_csv, inputs=file_input, outputs=[preview_output, full_data_output])
+    file_input.change(load_csv, inputs=file_input,
+                      outputs=[dataset_key, page_status, preview_output, sort_by, filter_column, stats_column, page_number])
+
+    # Any change to the view fetches the matching page from the server
+    for control in (sort_by, ascending, page_size, filter_column, filter_operator):
+        control.change(lambda key, _, *args: show_page(key, 1, *args), inputs=view_inputs, outputs=view_outputs)
+    filter_value.submit(lambda key, _, *args: show_page(key, 1, *args), inputs=view_inputs, outputs=view_outputs)
+    page_number.submit(show_page, inputs=view_inputs, outputs=view_outputs)
+    previous_button.click(lambda key, number, *args: show_page(key, (number or 1) - 1, *args),
+                          inputs=view_inputs, outputs=view_outputs)
+    next_button.click(lambda key, number, *args: show_page(key, (number or 1) + 1, *args),
+                      inputs=view_inputs, outputs=view_outputs)
+    stats_column.change(show_column_stats, inputs=[dataset_key, stats_column], outputs=stats_output)
 
-demo.launch()
+if __name__ == "__main__":
+    demo.launch()
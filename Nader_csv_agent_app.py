@@ -1,33 +1,97 @@
+import asyncio
+import contextlib
+import json
 import os
-import re
-import tempfile
-import pandas as pd
-from fastapi import FastAPI, File, UploadFile, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
-from langchain_cohere import ChatCohere, create_csv_agent
+import random
+import time
+import uuid
+from functools import partial
+from urllib.parse import urlencode
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+from fastapi import APIRouter, FastAPI, File, UploadFile, Form, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
-from io import StringIO
+from pydantic import BaseModel
+import tracing
+from answer_cache import AnswerCache, CachedAnswer, answer_key
+from chart_store import CACHE_CONTROL, VARIANTS, get_default_store, media_type
+from session_registry import SessionRegistry
+from question_executor import QuestionExecutor, QueueFullError
+from startup import Lazy, Readiness, build_cohere_llm
+from ttl_cache import TTLCache
+
+# langchain, pandas and the Cohere client are imported on first use (or by
+# the background warm-up), so the server starts accepting requests quickly
+if TYPE_CHECKING:
+    from query_planner import PlannedAnswer, QueryPlanner
+    from workspace import Workspace
 
 # Load environment variables
 load_dotenv()
-COHERE_API_KEY = os.getenv("COHERE_API_KEY")
-os.environ['COHERE_API_KEY'] = COHERE_API_KEY
 
-# Initialize the Cohere LLM
-llm = ChatCohere(cohere_api_key=COHERE_API_KEY,
-                 model="command-r-plus-08-2024",
-                 temperature=0)
+# The Cohere LLM, built on first use; a missing API key shows up in /ready
+llm = Lazy(build_cohere_llm)
+
+def build_dataset_cache():
+    from csv_agent import create_dataframe_agent
+    from dataset_cache import DatasetCache
+
+    return DatasetCache(build_agent=lambda df, path, profile: create_dataframe_agent(
+        llm.get(), df, data_paths={"df": path}, profiles={"df": profile}, sql_tool=True),
+        in_use=sessions.uses_dataset)
+
+def build_planner_stats():
+    from query_planner import PlannerStats
+
+    return PlannerStats()
+
+# One agent and DataFrame per browser session, evicted LRU when over budget
+SESSION_COOKIE = "session_id"
+sessions = SessionRegistry()
+
+# Uploads are content-addressed, so re-uploading a known file reuses its frame and agent
+datasets = Lazy(build_dataset_cache)
+
+# Multi-table agents, shared by every session whose workspace holds the same tables
+workspace_agents = TTLCache(max_entries=int(os.getenv("WORKSPACE_AGENTS", "64")), ttl=None)
+
+# Agent runs are blocking, so they go to a bounded worker pool off the event loop
+questions = QuestionExecutor()
+
+# Final answers keyed by dataset, model, temperature and normalized question
+answers = AnswerCache()
 
-# Placeholder empty CSV for initial agent_executor setup
-empty_df = pd.DataFrame()
-temp_dir = tempfile.gettempdir()  # Get a temporary directory for saving files
-temp_csv_path = os.path.join(temp_dir, "temp.csv")
-empty_df.to_csv(temp_csv_path, index=False)  # Create an empty CSV for initialization
-agent_executor = None  # Placeholder for agent
-generated_image_path = None  # Placeholder for generated chart image path
+# Charts drawn by the python tool, stored by content hash
+charts = get_default_store()
 
-# Initialize FastAPI app
-app = FastAPI()
+# Simple aggregate questions are answered straight from the DataFrame; a share
+# of those answers is re-checked against the agent in the background
+planner_stats = Lazy(build_planner_stats)
+PLANNER_VERIFY_RATE = float(os.getenv("QUERY_PLANNER_VERIFY_RATE", "0"))
+
+# Batches fan out over the question workers, at most this many questions at a time
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", str(questions.max_workers)))
+
+def warm_up_modules() -> None:
+    import answer_stream, csv_agent, query_planner, token_usage  # noqa: F401
+
+def warm_up_python_workers() -> None:
+    from python_pool import get_default_pool
+
+    get_default_pool().start()
+
+# Loads everything the first question needs in the background; /ready reports it
+readiness = Readiness({
+    "modules": warm_up_modules,
+    "llm": llm.get,
+    "datasets": datasets.get,
+    "planner": planner_stats.get,
+    "python_workers": warm_up_python_workers,
+})
+
+router = APIRouter()
 
 # Define the HTML template for the web interface
 html_template = """
@@ -44,23 +108,67 @@ html_template = """
         <input type="file" id="file" name="file"><br><br>
         <button type="submit">Upload</button>
     </form>
+    <form action="/workspace/upload" enctype="multipart/form-data" method="post">
+        <label for="files">Or upload related CSVs as named tables (e.g. income_statement.csv, balance_sheet.csv):</label><br>
+        <input type="file" id="files" name="files" multiple><br><br>
+        <button type="submit">Upload tables</button>
+    </form>
     <br>
-    <form action="/ask-question" method="post">
+    <form id="ask-form" action="/ask-question" method="post">
         <label for="question">Ask a Question:</label><br>
         <input type="text" id="question" name="question" style="width: 400px;"><br><br>
         <button type="submit">Submit</button>
     </form>
+    <pre id="stream" style="white-space: pre-wrap;"></pre>
     {response_message}
     {image_display}
     <br>
     <form action="/quit" method="get">
         <button type="submit">Reset Agent</button>
     </form>
+    {stream_script}
 </body>
 </html>
 """
 
-@app.get("/", response_class=HTMLResponse)
+# Streams answers into the page when the browser supports server-sent events;
+# without JavaScript the form posts to /ask-question as before
+stream_script = """
+<script>
+document.getElementById("ask-form").addEventListener("submit", function (event) {
+    if (!window.EventSource) return;
+    event.preventDefault();
+    const output = document.getElementById("stream");
+    const question = document.getElementById("question").value;
+    const source = new EventSource("/ask-stream?question=" + encodeURIComponent(question));
+    let tools = [], text = "";
+    const render = () => { output.textContent = tools.concat([text]).join("\\n").trim(); };
+    source.addEventListener("step", () => { text = ""; render(); });
+    source.addEventListener("token", (e) => { text += JSON.parse(e.data).text; render(); });
+    source.addEventListener("tool_start", (e) => { tools.push("Running " + JSON.parse(e.data).tool + " ..."); render(); });
+    source.addEventListener("answer", (e) => {
+        const answer = JSON.parse(e.data);
+        text = "Response: " + answer.text;
+        render();
+        if (answer.image) {
+            const image = document.createElement("img");
+            image.src = answer.image;
+            image.style.maxWidth = "500px";
+            output.appendChild(document.createElement("br"));
+            output.appendChild(image);
+        }
+        source.close();
+    });
+    source.addEventListener("error", (e) => {
+        text = e.data ? JSON.parse(e.data).error : "The answer stream was interrupted.";
+        render();
+        source.close();
+    });
+});
+</script>
+"""
+
+@router.get("/", response_class=HTMLResponse)
 async def read_root(success: bool = False, response_message: str = None, image: str = None):
     success_message = """
     <p style="color: green;">CSV file uploaded successfully! You can now ask questions.</p>
@@ -69,72 +177,437 @@ async def read_root(success: bool = False, response_message: str = None, image:
     # Render the response message if provided
     response_message_html = f"<p><strong>Response:</strong> {response_message}</p>" if response_message else ""
 
-    # Display image if available
+    # Display image if available; the full-size PNG is a click away
     image_display_html = f"""<br><p><strong>Generated Chart:</strong></p>
-                             <img src="/images/{image}" alt="Chart Image" style="max-width:500px;"/>""" if image else ""
+                             <a href="/charts/{image}?variant=png"><img src="/charts/{image}" alt="Chart Image" style="max-width:500px;"/></a>""" if image else ""
 
     html_content = html_template.format(success_message=success_message,
                                         response_message=response_message_html,
-                                        image_display=image_display_html)
+                                        image_display=image_display_html,
+                                        stream_script=stream_script)
     return HTMLResponse(content=html_content)
 
-@app.post("/upload-csv")
-async def upload_csv(file: UploadFile = File(...)):
-    global agent_executor
+def get_session_id(request: Request) -> str:
+    """Return the caller's session id, minting a new one if there is no cookie."""
+    return request.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex
+
+@router.post("/upload-csv")
+async def upload_csv(request: Request, file: UploadFile = File(...)):
+    session_id = get_session_id(request)
+
+    with tracing.span("upload_csv") as span:
+        try:
+            # Hash the upload and parse it into a typed dataset only if it is new
+            dataset = await run_in_threadpool(datasets.get().load_csv, file.file)
+
+            # Register the dataset's agent, planner and DataFrame for the session
+            sessions.put(session_id, dataset.agent, dataset.df, dataset_key=dataset.key,
+                         extra={"planner": await run_in_threadpool(get_planner, dataset)})
+
+            # Redirect back to the main page with success status
+            response = RedirectResponse(url="/?success=true", status_code=303)
+            response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+            return response
+
+        except Exception as e:
+            span.set(error=repr(e))
+            return {"error": f"An unexpected error occurred: {e}"}
+
+@router.post("/append-csv")
+async def append_csv(request: Request, file: UploadFile = File(...)):
+    """
+    Append the rows of a CSV upload (same columns, with a header) to the
+    session's dataset. Only the new rows are parsed and profiled. The session
+    moves to the extended dataset; answers cached for the previous rows are
+    dropped once no session uses them any more.
+    """
+    session_id = request.cookies.get(SESSION_COOKIE)
+    session = sessions.get(session_id)
+    if not session:
+        return JSONResponse(status_code=400, content={"error": "No CSV file uploaded yet. Please upload a file first."})
+    if "workspace" in session.extra:
+        return JSONResponse(status_code=400, content={"error": "Rows can only be appended to a single uploaded CSV."})
+
+    from csv_ingest import SchemaMismatchError
+
+    with tracing.span("append_csv") as span:
+        previous_key, previous_rows = session.dataset_key, len(session.df)
+        try:
+            dataset = await run_in_threadpool(datasets.get().append_csv, previous_key, file.file)
+        except (KeyError, SchemaMismatchError) as e:
+            span.set(error=repr(e))
+            return JSONResponse(status_code=400, content={"error": str(e).strip("'\"")})
+        except Exception as e:
+            span.set(error=repr(e))
+            return JSONResponse(status_code=500, content={"error": f"An unexpected error occurred: {e}"})
+
+        sessions.put(session_id, dataset.agent, dataset.df, dataset_key=dataset.key,
+                     extra={"planner": await run_in_threadpool(get_planner, dataset)})
+        invalidated = 0 if sessions.uses_dataset(previous_key) else answers.invalidate_dataset(previous_key)
+        span.set(appended_rows=len(dataset.df) - previous_rows, invalidated_answers=invalidated)
+        return {"dataset_key": dataset.key, "rows": len(dataset.df),
+                "appended_rows": len(dataset.df) - previous_rows, "invalidated_answers": invalidated}
+
+def build_workspace_agent(workspace: "Workspace") -> Tuple[Any, "QueryPlanner"]:
+    """Return the multi-table agent and planner for a workspace's tables, building them once."""
+    cached = workspace_agents.get(workspace.key)
+    if cached is None:
+        from csv_agent import create_dataframe_agent
+        from query_planner import QueryPlanner
+
+        frames = workspace.frames()
+        cached = (create_dataframe_agent(llm.get(), frames, data_paths=workspace.paths(),
+                                         profiles=workspace.profiles(), sql_tool=True),
+                  QueryPlanner(frames, stats=planner_stats.get()))
+        workspace_agents.set(workspace.key, cached)
+    return cached
+
+@router.post("/workspace/upload")
+async def upload_workspace(request: Request, files: List[UploadFile] = File(...)):
+    """
+    Add one or more CSVs to the session's workspace, each as a table named
+    after its file (income_statement.csv becomes `income_statement`), and
+    answer questions across all of them. Tables are stored and memory-mapped
+    once, however many sessions upload the same file.
+    """
+    from workspace import Workspace, get_default_table_store, table_name
+
+    session_id = get_session_id(request)
+    names = [table_name(file.filename) for file in files]
+    if len(set(names)) != len(names):
+        return JSONResponse(status_code=400, content={"error": f"Table names must be unique: {', '.join(names)}."})
+
+    with tracing.span("upload_workspace", tables=len(files)) as span:
+        try:
+            # Start from the session's current tables; its workspace changes only on success
+            session = sessions.get(session_id)
+            previous = session.extra.get("workspace") if session else None
+            workspace = Workspace(get_default_table_store(), previous.tables if previous else None)
+            for name, file in zip(names, files):
+                await run_in_threadpool(workspace.add_csv, name, file.file)
+            agent, planner = await run_in_threadpool(build_workspace_agent, workspace)
+
+            sessions.put(session_id, agent, None, dataset_key=workspace.key,
+                         extra={"planner": planner, "workspace": workspace})
+            response = RedirectResponse(url="/?success=true", status_code=303)
+            response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+            return response
+
+        except Exception as e:
+            span.set(error=repr(e))
+            return {"error": f"An unexpected error occurred: {e}"}
+
+@router.get("/workspace/tables")
+async def workspace_tables(request: Request):
+    """List the tables in the session's workspace."""
+    session = sessions.get(request.cookies.get(SESSION_COOKIE))
+    workspace = session.extra.get("workspace") if session else None
+    if workspace is None:
+        return {"tables": []}
+    return {"tables": [{"name": name, "rows": table.profile["rows"],
+                        "columns": [column["name"] for column in table.profile["columns"]], "key": table.key}
+                       for name, table in workspace.tables.items()]}
+
+@router.get("/workspace/stats")
+async def workspace_stats():
+    """Report the shared table store's mapped tables and hit counters."""
+    from workspace import get_default_table_store
 
+    return {**get_default_table_store().stats(), "agents": workspace_agents.stats()}
+
+def get_planner(dataset) -> "QueryPlanner":
+    """Return the dataset's query planner, building it on first use."""
+    if "planner" not in dataset.extra:
+        from query_planner import QueryPlanner
+
+        dataset.extra["planner"] = QueryPlanner({"df": dataset.df}, stats=planner_stats.get())
+    return dataset.extra["planner"]
+
+async def verify_planned(planner: "QueryPlanner", planned: "PlannedAnswer", agent, question: str) -> None:
+    """Run the agent on a question the planner answered and record whether they agree."""
     try:
-        # Read the uploaded file into a pandas DataFrame
-        contents = await file.read()
-        df = pd.read_csv(StringIO(contents.decode('utf-8')))
+        answer = await questions.run(run_agent, agent, question)
+        planner.check_agreement(planned, answer.text)
+    except Exception:
+        pass
 
-        # Save the DataFrame to a temporary CSV file
-        df.to_csv(temp_csv_path, index=False)
+def run_agent(agent, question: str, callbacks: list = ()) -> CachedAnswer:
+    """Run the agent on a question and capture its answer and chart."""
+    from token_usage import TracingCallbackHandler
+
+    with tracing.span("agent") as span, charts.capture() as chart_keys:
+        handler = TracingCallbackHandler()
+        response = agent.invoke({"input": question}, config={"callbacks": [handler, *callbacks]})
+        response_message = response.get("output")
+        steps = len(response.get("intermediate_steps", []))
+        tracing.AGENT_STEPS.observe(steps)
+        span.set(steps=steps, llm_calls=handler.usage.llm_calls,
+                 input_tokens=handler.usage.input_tokens, output_tokens=handler.usage.output_tokens,
+                 answer_bytes=len(response_message or ""), charts=len(chart_keys))
 
-        # Create the agent for the uploaded CSV
-        agent_executor = create_csv_agent(llm, temp_csv_path)
+    # The last chart the python tool drew goes with the answer
+    return CachedAnswer(text=response_message, image=chart_keys[-1] if chart_keys else None)
 
-        # Redirect back to the main page with success status
-        return RedirectResponse(url="/?success=true", status_code=303)
+async def start_answer(session, question: str, callbacks: list = ()) -> Tuple["asyncio.Future", str]:
+    """
+    Resolve a question for a session: answer simple aggregates directly,
+    serve repeated questions from the cache, otherwise start an agent run.
+    Returns a future of the answer (already done for the planner and the
+    cache) and where it comes from. A full question queue raises
+    QueueFullError here, before anything is awaited.
+    """
+    span = tracing.current_span()
+    planner = session.extra.get("planner")
+    planned = planner.answer(question) if planner else None
+    if span is not None:
+        span.set(fast_path=planned is not None)
+    if planned is not None:
+        if random.random() < PLANNER_VERIFY_RATE:
+            asyncio.create_task(verify_planned(planner, planned, session.agent, question))
+        return done_future(CachedAnswer(text=planned.text)), "planner"
 
-    except Exception as e:
-        return {"error": f"An unexpected error occurred: {e}"}
+    # Building the LLM client reads its settings and may do I/O; keep it off the loop
+    model = llm.get() if llm.built else await run_in_threadpool(llm.get)
+    key = answer_key(session.dataset_key, model.model, model.temperature, question)
+    answer = answers.get(key)
+    if span is not None:
+        span.set(answer_cache="hit" if answer is not None else "miss")
+    if answer is not None:
+        return done_future(answer), "cache"
+    # Identical questions in flight share one agent run; only that run takes a worker
+    return answers.compute_async(key, partial(questions.submit, run_agent, session.agent, question,
+                                              callbacks=list(callbacks))), "agent"
 
-@app.post("/ask-question")
-async def ask_question(question: str = Form(...)):
-    global agent_executor, generated_image_path
-    if not agent_executor:
+def done_future(answer: CachedAnswer) -> "asyncio.Future":
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(answer)
+    return future
+
+async def answer_question(session, question: str) -> Tuple[CachedAnswer, str]:
+    """Answer a question without blocking the event loop; return the answer and where it came from."""
+    answer, source = await start_answer(session, question)
+    return await answer, source
+
+@router.post("/ask-question")
+async def ask_question(request: Request, question: str = Form(...)):
+    session = sessions.get(request.cookies.get(SESSION_COOKIE))
+    if not session:
         return {"error": "No CSV file uploaded yet. Please upload a file first."}
 
+    with tracing.span("ask_question", question_bytes=len(question)) as span:
+        try:
+            answer, _ = await answer_question(session, question)
+            response_message = answer.text
+            if answer.image:
+                session.generated_image_path = answer.image
+
+            # Redirect back to the homepage with the response (and the chart, if there is one)
+            query = {"response_message": response_message or ""}
+            if session.generated_image_path:
+                query["image"] = session.generated_image_path
+            return RedirectResponse(url=f"/?{urlencode(query)}", status_code=303)
+
+        except QueueFullError as e:
+            span.set(rejected=True)
+            return JSONResponse(status_code=503,
+                                content={"error": str(e)},
+                                headers={"Retry-After": str(e.retry_after)})
+        except Exception as e:
+            span.set(error=repr(e))
+            return {"error": f"Failed to process the question. Error: {e}"}
+
+class BatchQuestions(BaseModel):
+    questions: List[str]
+    max_concurrency: Optional[int] = None
+
+@router.post("/ask-batch")
+async def ask_batch(request: Request, batch: BatchQuestions):
+    """
+    Answer many questions about the session's dataset concurrently, sharing
+    its DataFrame, profile and agent. Results stream back as JSON lines in
+    the order they finish, each with its `index` in the batch, its timing and
+    either the answer or the error that question alone ran into.
+    """
+    session = sessions.get(request.cookies.get(SESSION_COOKIE))
+    if not session:
+        return JSONResponse(status_code=400, content={"error": "No CSV file uploaded yet. Please upload a file first."})
+    if not batch.questions or len(batch.questions) > BATCH_MAX_QUESTIONS:
+        return JSONResponse(status_code=400,
+                            content={"error": f"Send between 1 and {BATCH_MAX_QUESTIONS} questions."})
+
+    concurrency = max(1, min(batch.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer_one(index: int, question: str) -> dict:
+        async with semaphore:
+            started = time.perf_counter()
+            with tracing.span("batch_question", question_bytes=len(question)) as span:
+                try:
+                    answer, source = await answer_question(session, question)
+                    result = {"answer": answer.text, "source": source,
+                              "image": f"/charts/{answer.image}" if answer.image else None}
+                except QueueFullError as e:
+                    span.set(rejected=True)
+                    result = {"error": str(e), "rejected": True}
+                except Exception as e:
+                    span.set(error=repr(e))
+                    result = {"error": f"Failed to process the question. Error: {e}"}
+            return {"index": index, "question": question, **result,
+                    "seconds": round(time.perf_counter() - started, 3)}
+
+    async def results():
+        with tracing.span("ask_batch", questions=len(batch.questions), concurrency=concurrency) as span:
+            tasks = [asyncio.ensure_future(answer_one(index, question))
+                     for index, question in enumerate(batch.questions)]
+            errors = 0
+            try:
+                for next_result in asyncio.as_completed(tasks):
+                    result = await next_result
+                    errors += "error" in result
+                    yield json.dumps(result) + "\n"
+            finally:
+                # The client went away: drop the questions that have not started
+                for task in tasks:
+                    task.cancel()
+                span.set(errors=errors)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def answer_event(answer: CachedAnswer, source: str) -> str:
+    from answer_stream import format_sse
+
+    return format_sse("answer", {"text": answer.text, "source": source,
+                                 "image": f"/charts/{answer.image}" if answer.image else None})
+
+@router.get("/ask-stream")
+async def ask_stream(request: Request, question: str):
+    """
+    Answer a question as server-sent events: `step`, `token`, `tool_start`,
+    `tool_end` and `tool_error` while the agent works, then one `answer`
+    (or `error`) event. Planner and cached answers arrive as a single `answer`.
+    """
+    session = sessions.get(request.cookies.get(SESSION_COOKIE))
+    if not session:
+        return JSONResponse(status_code=400, content={"error": "No CSV file uploaded yet. Please upload a file first."})
+
+    from answer_stream import AsyncAgentEvents, format_sse
+
+    stream = AsyncAgentEvents()
+    # The executor admits or rejects the question before the stream starts
     try:
-        # Use the agent to process the question
-        response = agent_executor.invoke({"input": question})
-        response_message = response.get("output")
+        task, source = await start_answer(session, question, callbacks=[stream.handler])
+    except QueueFullError as e:
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": str(e.retry_after)})
+    if source != "agent":
+        return StreamingResponse(iter([answer_event(task.result(), source)]), media_type="text/event-stream")
+
+    async def events():
+        with tracing.span("ask_stream", question_bytes=len(question)) as span:
+            first_event = None
+            started = asyncio.get_running_loop().time()
+            async for event, data in stream.follow(task):
+                if first_event is None:
+                    first_event = asyncio.get_running_loop().time() - started
+                    span.set(first_event_seconds=round(first_event, 6))
+                yield format_sse(event, data)
+            try:
+                answer = task.result()
+            except Exception as e:
+                span.set(error=repr(e))
+                yield format_sse("error", {"error": f"Failed to process the question. Error: {e}"})
+                return
+            session.generated_image_path = answer.image or session.generated_image_path
+            yield answer_event(answer, "agent")
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-        # Extract the image file name (if a chart was created)
-        image_match = re.search(r'\("(?P<filename>[^"]+\.png)"\)', response_message)
-        if image_match:
-            generated_image_path = image_match.group("filename")
-
-        # Redirect back to the homepage with the response
-        return RedirectResponse(
-            url=f"/?response_message={response_message}&image={generated_image_path}",
-            status_code=303
-        )
-
-    except Exception as e:
-        return {"error": f"Failed to process the question. Error: {e}"}
-
-@app.get("/images/{image_name}")
-async def get_image(image_name: str):
-    """Serve the generated image file."""
-    image_file_path = os.path.join(os.getcwd(), image_name)
-    if os.path.exists(image_file_path):
-        return FileResponse(image_file_path)
-    return {"error": "Image not found."}
-
-@app.get("/quit")
-async def quit_app():
-    global agent_executor, generated_image_path
-    agent_executor = None
-    generated_image_path = None
+@router.get("/charts/stats")
+async def chart_stats():
+    """Report chart store size and eviction counters."""
+    return charts.stats()
+
+@router.get("/charts/{chart_key}")
+async def get_chart(request: Request, chart_key: str, variant: str = None):
+    """
+    Serve a stored chart. Without `variant`, browsers that accept WebP get
+    the compressed copy; `variant=thumb` is a small preview and `variant=png`
+    the original. Repeat requests are answered 304 from the ETag.
+    """
+    negotiated = variant is None
+    if negotiated:
+        variant = "webp" if "image/webp" in request.headers.get("accept", "") else "png"
+    if variant not in VARIANTS:
+        return JSONResponse(status_code=400, content={"error": f"Unknown variant; use one of {', '.join(VARIANTS)}."})
+    path = charts.path(chart_key, variant)
+    if path is None:
+        return JSONResponse(status_code=404, content={"error": "Chart not found."})
+
+    etag = charts.etag(chart_key, variant)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if negotiated:
+        headers["Vary"] = "Accept"
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type(variant), headers=headers)
+
+@router.get("/quit")
+async def quit_app(request: Request):
+    sessions.remove(request.cookies.get(SESSION_COOKIE))
     return RedirectResponse(url="/", status_code=303)
+
+@router.get("/sessions/stats")
+async def session_stats():
+    """Report session registry size and hit/miss/eviction counters."""
+    return sessions.stats()
+
+@router.get("/datasets/stats")
+async def dataset_stats():
+    """Report dataset cache size and memory/disk hit counters."""
+    return datasets.get().stats()
+
+@router.get("/answers/stats")
+async def answer_stats():
+    """Report answer cache size and hit/miss counters."""
+    return answers.stats()
+
+@router.get("/questions/stats")
+async def question_stats():
+    """Report question worker pool load and rejection counters."""
+    return questions.stats()
+
+@router.get("/planner/stats")
+async def planner_statistics():
+    """Report the query planner's hit rate and its agreement with the agent."""
+    return planner_stats.get().as_dict()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose span durations, payload sizes, token counts and agent steps for Prometheus."""
+    return PlainTextResponse(tracing.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@router.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the warm-up has loaded everything, else 503 with each step's state."""
+    readiness.start()
+    status = readiness.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+def create_app(warm_up: bool = True) -> FastAPI:
+    """
+    Build the FastAPI app. With `warm_up`, heavy modules, the LLM client and
+    the python workers are loaded on a background thread once the server has
+    started; otherwise on first use (or the first /ready probe).
+    """
+    @contextlib.asynccontextmanager
+    async def lifespan(application: FastAPI):
+        if warm_up:
+            readiness.start()
+        yield
+
+    application = FastAPI(lifespan=lifespan)
+    application.include_router(router)
+    return application
+
+app = create_app(warm_up=os.getenv("STARTUP_WARM_UP", "1") == "1")
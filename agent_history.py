@@ -0,0 +1,200 @@
+"""
+Token budgets for the tool results an agent carries from step to step.
+
+Every step of a tool-use loop sends the earlier steps back to the model, so a
+tool that prints a whole DataFrame makes every later call bigger. Each tool
+output is capped to a token budget, keeping its head and tail and a note of
+its shape. Once the history as a whole exceeds its budget, the outputs of the
+oldest steps are replaced by one-line summaries; the latest steps are kept
+whole.
+
+The native `cohere_agent` loop compacts its `chat_history` and `tool_results`
+with it, and the langchain csv agent passes `trim_intermediate_steps` to its
+AgentExecutor. Tokens are estimated like the schema preambles, without a
+tokenizer.
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import tracing
+from text_utils import CHARS_PER_TOKEN, estimate_tokens
+
+
+DEFAULT_TOOL_OUTPUT_TOKENS = int(os.getenv("HISTORY_TOOL_OUTPUT_TOKENS", "600"))
+DEFAULT_HISTORY_TOKENS = int(os.getenv("HISTORY_TOKENS", "3000"))
+DEFAULT_KEEP_RECENT_STEPS = int(os.getenv("HISTORY_KEEP_RECENT_STEPS", "2"))
+
+SUMMARY_CHARS = 160
+
+# How pandas ends the repr of a frame it truncated
+_FRAME_SHAPE = re.compile(r"\[(\d+) rows x (\d+) columns\]")
+
+HISTORY_TOKENS_SAVED = tracing.metrics.counter(
+    "csv_agent_history_tokens_saved_total", "Estimated prompt tokens left out of agent histories.")
+
+
+@dataclass
+class HistoryStats:
+    """What compaction did during one agent run."""
+    outputs_trimmed: int = 0
+    steps_compacted: int = 0
+    tokens_saved: int = 0  # summed over the run's LLM calls
+
+    def add(self, other: "HistoryStats") -> None:
+        self.outputs_trimmed += other.outputs_trimmed
+        self.steps_compacted += other.steps_compacted
+        self.tokens_saved += other.tokens_saved
+
+
+def describe_shape(text: str) -> str:
+    """Describe the size of a tool output, and the DataFrame it printed if any."""
+    shape = f"{text.count(chr(10)) + 1:,} lines, {len(text):,} characters"
+    match = _FRAME_SHAPE.search(text)
+    if match:
+        shape = f"a DataFrame of {int(match.group(1)):,} rows x {int(match.group(2)):,} columns, {shape}"
+    return shape
+
+
+def trim_text(text: str, max_tokens: int) -> str:
+    """Cap `text` to about `max_tokens`, keeping its head and tail and noting what was cut."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Leave room for the note, so a trimmed output is within budget and never trimmed again
+    note = f"[... {len(text):,} characters omitted; the output was {describe_shape(text)} ...]"
+    budget = max(0, max_tokens * CHARS_PER_TOKEN - len(note) - 2)
+    head, tail = text[:budget * 2 // 3], text[len(text) - budget // 3:]
+    # Cut at line boundaries so tables keep whole rows
+    if "\n" in head:
+        head = head[:head.rindex("\n")]
+    if "\n" in tail:
+        tail = tail[tail.index("\n") + 1:]
+    omitted = len(text) - len(head) - len(tail)
+    return f"{head}\n[... {omitted:,} characters omitted; the output was {describe_shape(text)} ...]\n{tail}"
+
+
+def summarize_text(text: str) -> str:
+    """One line standing in for an old tool output."""
+    first_line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+    if len(first_line) > SUMMARY_CHARS:
+        first_line = first_line[:SUMMARY_CHARS] + "..."
+    return f"[earlier output compacted: {describe_shape(text)}] {first_line}"
+
+
+def _map_text(value: Any, function: Callable[[str], str]) -> Any:
+    """Apply `function` to every string in a tool output (str, dict or list)."""
+    if isinstance(value, str):
+        return function(value)
+    if isinstance(value, dict):
+        return {key: _map_text(item, function) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_map_text(item, function) for item in value]
+    return value
+
+
+def _tokens(value: Any) -> int:
+    return estimate_tokens(value if isinstance(value, str) else json.dumps(value, default=str))
+
+
+def _field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def _replace(item: Any, **changes: Any) -> Any:
+    """Copy a Cohere message or tool result, as a dict or a pydantic model."""
+    if isinstance(item, dict):
+        return {**item, **changes}
+    if hasattr(item, "model_copy"):
+        return item.model_copy(update=changes)
+    return item.copy(update=changes)
+
+
+def record_history_stats(stats: HistoryStats) -> None:
+    """Add a run's savings to the metrics and the current span."""
+    HISTORY_TOKENS_SAVED.inc(stats.tokens_saved)
+    span = tracing.current_span()
+    if span is not None:
+        for name, value in (("history_tokens_saved", stats.tokens_saved),
+                            ("history_outputs_trimmed", stats.outputs_trimmed),
+                            ("history_steps_compacted", stats.steps_compacted)):
+            span.set(**{name: span.attributes.get(name, 0) + value})
+
+
+class HistoryManager:
+    """
+    Keeps the tool results an agent sends back to the model within budget.
+
+    `tool_output_tokens` caps every tool output; once the tool outputs of a
+    request exceed `history_tokens`, those of the oldest steps are summarized,
+    except for the last `keep_recent_steps` steps.
+    """
+
+    def __init__(self,
+                 tool_output_tokens: int = DEFAULT_TOOL_OUTPUT_TOKENS,
+                 history_tokens: int = DEFAULT_HISTORY_TOKENS,
+                 keep_recent_steps: int = DEFAULT_KEEP_RECENT_STEPS):
+        self.tool_output_tokens = tool_output_tokens
+        self.history_tokens = history_tokens
+        self.keep_recent_steps = keep_recent_steps
+
+    def cap_output(self, output: Any) -> Any:
+        """Cap every string in a tool output to the per-output budget."""
+        return _map_text(output, lambda text: trim_text(text, self.tool_output_tokens))
+
+    def compact(self, steps: Sequence[Any], stats: Optional[HistoryStats] = None) -> List[Any]:
+        """
+        Cap and, over budget, summarize a sequence of tool outputs, oldest first.
+
+        Returns the outputs to send; the tokens left out are added to `stats`.
+        """
+        stats = stats if stats is not None else HistoryStats()
+        before = [_tokens(output) for output in steps]
+        outputs = [self.cap_output(output) for output in steps]
+        sizes = [_tokens(output) for output in outputs]
+        stats.outputs_trimmed += sum(size < original for size, original in zip(sizes, before))
+
+        compactable = max(0, len(outputs) - self.keep_recent_steps)
+        for index in range(compactable):
+            if sum(sizes) <= self.history_tokens:
+                break
+            summary = _map_text(outputs[index], summarize_text)
+            if _tokens(summary) < sizes[index]:
+                outputs[index], sizes[index] = summary, _tokens(summary)
+                stats.steps_compacted += 1
+        stats.tokens_saved += sum(before) - sum(sizes)
+        return outputs
+
+    def trim_intermediate_steps(self, steps: List[Tuple[Any, Any]]) -> List[Tuple[Any, Any]]:
+        """
+        `AgentExecutor(trim_intermediate_steps=...)` hook for the langchain path.
+
+        Called before every LLM call with the untouched steps so far, so each
+        call's savings are counted once.
+        """
+        stats = HistoryStats()
+        observations = self.compact([observation for _, observation in steps], stats)
+        record_history_stats(stats)
+        return [(action, observation) for (action, _), observation in zip(steps, observations)]
+
+    def compact_cohere(self, chat_history: Optional[list], tool_results: list,
+                       stats: Optional[HistoryStats] = None) -> Tuple[Optional[list], list]:
+        """
+        Compact a native Cohere request: the TOOL messages of `chat_history`
+        and this step's `tool_results`, which count as the latest step.
+        """
+        messages = list(chat_history or [])
+        tool_positions = [index for index, message in enumerate(messages)
+                          if _field(message, "role") == "TOOL" and _field(message, "tool_results")]
+        steps = [[_field(result, "outputs") for result in _field(messages[index], "tool_results")]
+                 for index in tool_positions]
+        steps.append([result["outputs"] for result in tool_results])
+
+        compacted = self.compact(steps, stats)
+        for index, outputs in zip(tool_positions, compacted):
+            results = [_replace(result, outputs=result_outputs)
+                       for result, result_outputs in zip(_field(messages[index], "tool_results"), outputs)]
+            messages[index] = _replace(messages[index], tool_results=results)
+        tool_results = [{**result, "outputs": outputs} for result, outputs in zip(tool_results, compacted[-1])]
+        return (messages if chat_history is not None else None), tool_results
@@ -0,0 +1,110 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Tuple
+
+from text_utils import normalize_question
+from ttl_cache import AsyncSingleFlight, SingleFlight, TTLCache
+
+
+# Defaults, overridable through the environment
+DEFAULT_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    """The final answer text and the chart (if any) generated with it."""
+    text: str
+    image: Optional[str] = None
+
+
+AnswerKey = Tuple[str, str, float, str]
+
+
+def answer_key(dataset_key: str, model: str, temperature: float, question: str) -> AnswerKey:
+    """Build the cache key for a question asked against a dataset with a given model."""
+    return (dataset_key, model, float(temperature), normalize_question(question))
+
+
+class AnswerCache:
+    """
+    Cache of final agent answers with TTL and LRU eviction.
+
+    Only deterministic runs (temperature 0) are cached; anything else is
+    always computed. Identical questions that arrive while the first one is
+    still running wait for it instead of starting another agent run.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS):
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._flights = SingleFlight()
+        self._async_flights = AsyncSingleFlight()
+
+    def get(self, key: AnswerKey) -> Optional[CachedAnswer]:
+        if not self._cacheable(key):
+            return None
+        return self._cache.get(key)
+
+    def get_or_compute(self, key: AnswerKey, compute: Callable[[], CachedAnswer]) -> CachedAnswer:
+        """Return the cached answer for `key`, computing it once if needed."""
+        answer = self.get(key)
+        if answer is not None:
+            return answer
+        return self.compute(key, compute)
+
+    def compute(self, key: AnswerKey, compute: Callable[[], CachedAnswer]) -> CachedAnswer:
+        """
+        Compute and store the answer for `key` after a cache miss.
+
+        Concurrent callers for the same key share a single execution.
+        """
+        if not self._cacheable(key):
+            return compute()
+
+        def compute_and_store() -> CachedAnswer:
+            # Another caller may have filled the cache while we were queued
+            answer = self._cache.get(key, count=False)
+            if answer is None:
+                answer = compute()
+                self._cache.set(key, answer)
+            return answer
+
+        return self._flights.do(key, compute_and_store)
+
+    def compute_async(self, key: AnswerKey, start: Callable[[], Awaitable[CachedAnswer]]) -> Awaitable[CachedAnswer]:
+        """
+        Event-loop version of `compute`: `start()` begins the computation
+        (e.g. submits it to a worker pool) and is called only by the first
+        caller for `key`; the others await the same result without using a
+        worker. Errors raised by `start()` itself propagate straight away.
+        """
+        if not self._cacheable(key):
+            return asyncio.ensure_future(start())
+        answer = self._cache.get(key, count=False)
+        if answer is not None:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(answer)
+            return future
+
+        def start_and_store() -> "asyncio.Future":
+            future = asyncio.ensure_future(start())
+            future.add_done_callback(
+                lambda done: done.cancelled() or done.exception() is not None or self._cache.set(key, done.result()))
+            return future
+
+        # A caller that goes away must not cancel the computation the others await
+        return asyncio.shield(self._async_flights.do(key, start_and_store))
+
+    def invalidate_dataset(self, dataset_key: str) -> int:
+        """Drop every cached answer for a dataset; return how many were dropped."""
+        return self._cache.remove_where(lambda key: key[0] == dataset_key)
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats["shared_in_flight"] = self._flights.shared + self._async_flights.shared
+        return stats
+
+    @staticmethod
+    def _cacheable(key: AnswerKey) -> bool:
+        return key[2] == 0.0
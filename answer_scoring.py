@@ -0,0 +1,51 @@
+"""
+Scoring of free-text answers against expected values.
+
+Shared by the offline evaluation runner and the query planner, which checks
+sampled agent answers against the values it computed itself.
+"""
+import re
+from typing import Any, List
+
+import pandas as pd
+
+
+NUMBER_PATTERN = re.compile(
+    r"(?P<number>[-+]?\d[\d,]*(?:\.\d+)?(?:[eE][-+]?\d+)?)\s*(?P<suffix>%|thousand|million|billion|trillion)?",
+    re.IGNORECASE,
+)
+SCALES = {"thousand": 1e3, "million": 1e6, "billion": 1e9, "trillion": 1e12}
+
+
+def extract_numbers(text: str) -> List[float]:
+    """Return every number mentioned in an answer, applying %, million, billion, etc."""
+    numbers = []
+    for match in NUMBER_PATTERN.finditer(text or ""):
+        try:
+            value = float(match.group("number").replace(",", ""))
+        except ValueError:
+            continue
+        suffix = (match.group("suffix") or "").lower()
+        if suffix == "%":
+            numbers.extend([value, value / 100])
+        else:
+            numbers.append(value * SCALES.get(suffix, 1))
+    return numbers
+
+
+def score_answer(answer: str, expected: Any, tolerance: float = 1e-6) -> float:
+    """
+    Score an answer 1.0 or 0.0.
+
+    Numeric ground truth matches if any number in the answer is within the
+    relative `tolerance`; anything else must appear in the answer verbatim
+    (case-insensitive).
+    """
+    if expected is None or (isinstance(expected, float) and pd.isna(expected)):
+        return 0.0
+    try:
+        target = float(expected)
+    except (TypeError, ValueError):
+        return float(str(expected).lower() in (answer or "").lower())
+    allowed = tolerance * max(abs(target), 1e-12)
+    return float(any(abs(value - target) <= allowed for value in extract_numbers(answer)))
@@ -0,0 +1,145 @@
+"""
+Live progress of an agent run: LLM tokens, tool calls and tool outputs.
+
+`AgentEventHandler` is a langchain callback that turns the run into
+`(event, data)` pairs as they happen. The agent already calls its LLM in
+streaming mode, so tokens arrive while the model is still writing.
+`iter_agent_events` follows a run from synchronous code (the Gradio
+generators); `AsyncAgentEvents` follows one from the event loop (the SSE
+endpoint). Events:
+
+    step        {"step"}                    an LLM call starts
+    token       {"step", "text"}            a piece of the model's text
+    tool_start  {"step", "tool", "input"}   the agent calls a tool
+    tool_end    {"step", "output"}          the tool's (trimmed) output
+    tool_error  {"step", "error"}
+"""
+import asyncio
+import contextvars
+import json
+import os
+import queue
+import threading
+from typing import Any, AsyncIterator, Callable, Iterator, List, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+DEFAULT_TOOL_OUTPUT_CHARS = int(os.getenv("STREAM_TOOL_OUTPUT_CHARS", "2000"))
+
+_DONE = object()
+
+
+def _trim(text: Any, max_chars: int) -> str:
+    text = str(getattr(text, "content", text))
+    return text if len(text) <= max_chars else text[:max_chars] + " …"
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Encode one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class AgentEventHandler(BaseCallbackHandler):
+    """Forwards an agent run's progress to `emit(event, data)` as it happens."""
+
+    def __init__(self, emit: Callable[[str, dict], None], max_output_chars: int = DEFAULT_TOOL_OUTPUT_CHARS):
+        self.emit = emit
+        self.max_output_chars = max_output_chars
+        self.step = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.step += 1
+        self.emit("step", {"step": self.step})
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        self.step += 1
+        self.emit("step", {"step": self.step})
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if token:
+            self.emit("token", {"step": self.step, "text": token})
+
+    def on_tool_start(self, serialized, input_str: str, **kwargs) -> None:
+        tool = (serialized or {}).get("name") or kwargs.get("name")
+        self.emit("tool_start", {"step": self.step, "tool": tool,
+                                 "input": _trim(input_str, self.max_output_chars)})
+
+    def on_tool_end(self, output: Any, **kwargs) -> None:
+        self.emit("tool_end", {"step": self.step, "output": _trim(output, self.max_output_chars)})
+
+    def on_tool_error(self, error: BaseException, **kwargs) -> None:
+        self.emit("tool_error", {"step": self.step, "error": repr(error)})
+
+
+def iter_agent_events(run: Callable[[List[BaseCallbackHandler]], Any]) -> Iterator[Tuple[str, Any]]:
+    """
+    Call `run(callbacks)` on a thread and yield its events as they happen,
+    ending with `("result", value)`; exceptions from `run` are re-raised.
+    """
+    events: "queue.Queue[Tuple[Any, Any]]" = queue.Queue()
+    handler = AgentEventHandler(lambda event, data: events.put((event, data)))
+    context = contextvars.copy_context()
+
+    def target():
+        try:
+            events.put(("result", context.run(run, [handler])))
+        except BaseException as e:
+            events.put((_DONE, e))
+
+    threading.Thread(target=target, daemon=True).start()
+    while True:
+        event, data = events.get()
+        if event is _DONE:
+            raise data
+        yield event, data
+        if event == "result":
+            return
+
+
+class AsyncAgentEvents:
+    """
+    Collects an agent run's events on the event loop.
+
+    Pass `handler` in the run's callbacks, start the run as a task, then
+    iterate `follow(task)`; it ends once the task is done.
+    """
+
+    def __init__(self, max_output_chars: int = DEFAULT_TOOL_OUTPUT_CHARS):
+        self._loop = asyncio.get_running_loop()
+        self._events: "asyncio.Queue[Tuple[Any, Any]]" = asyncio.Queue()
+        self.handler = AgentEventHandler(self._emit, max_output_chars)
+
+    def _emit(self, event: str, data: dict) -> None:
+        # Callbacks fire on worker threads
+        self._loop.call_soon_threadsafe(self._events.put_nowait, (event, data))
+
+    async def follow(self, task: "asyncio.Future") -> AsyncIterator[Tuple[str, Any]]:
+        task.add_done_callback(lambda _: self._events.put_nowait((_DONE, None)))
+        while True:
+            event, data = await self._events.get()
+            if event is _DONE:
+                return
+            yield event, data
+
+
+class ProgressText:
+    """Folds events into readable text: one line per tool call, then the model's latest text."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.tokens: List[str] = []
+
+    def add(self, event: str, data: Any) -> str:
+        if event == "step":
+            self.tokens = []
+        elif event == "token":
+            self.tokens.append(data["text"])
+        elif event == "tool_start":
+            self.lines.append(f"🔧 {data['tool']} …")
+        elif event == "tool_error":
+            self.lines.append(f"⚠️ {data['error']}")
+        return self.text()
+
+    def text(self) -> str:
+        return "\n".join(self.lines + ["".join(self.tokens)]).strip()
@@ -0,0 +1,198 @@
+"""
+Content-addressed store for charts drawn by the python tool.
+
+Python workers render every open matplotlib figure to PNG after a tool call
+and send the bytes back with the output (see `python_pool`), so charts no
+longer have to be saved into the working directory and scraped out of the
+answer text. Each chart is stored once under the SHA-256 of its PNG bytes,
+with a compressed WebP variant and a WebP thumbnail next to it, and the
+least recently used charts are evicted when the store outgrows its budget.
+Because a key never changes content, charts can be served with a strong
+ETag and an immutable Cache-Control header.
+"""
+import contextlib
+import contextvars
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+
+
+# Budgets, overridable through the environment
+CHART_DIR = os.getenv("CHART_DIR", os.path.join(tempfile.gettempdir(), "csv_agent_charts"))
+DEFAULT_MAX_BYTES = int(os.getenv("CHART_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+DEFAULT_THUMBNAIL_PIXELS = int(os.getenv("CHART_THUMBNAIL_PIXELS", "320"))
+DEFAULT_WEBP_QUALITY = int(os.getenv("CHART_WEBP_QUALITY", "85"))
+
+# Served with every chart: the key is a content hash, so a URL never changes content
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+VARIANTS = {
+    "png": ("png", "image/png"),
+    "webp": ("webp", "image/webp"),
+    "thumb": ("thumb.webp", "image/webp"),
+}
+
+_capture: contextvars.ContextVar = contextvars.ContextVar("chart_capture", default=None)
+
+
+class ChartStore:
+    """
+    Stores PNG charts by content hash with WebP and thumbnail variants.
+
+    Total size on disk is capped at `max_bytes`, evicting the least recently
+    stored or served charts first. Stored charts found in `directory` at
+    startup are indexed oldest first.
+    """
+
+    def __init__(self,
+                 directory: str = CHART_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 thumbnail_pixels: int = DEFAULT_THUMBNAIL_PIXELS,
+                 webp_quality: int = DEFAULT_WEBP_QUALITY):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.thumbnail_pixels = thumbnail_pixels
+        self.webp_quality = webp_quality
+        os.makedirs(directory, exist_ok=True)
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._nbytes = 0
+        self.stored = 0
+        self.duplicates = 0
+        self.evictions = 0
+        self._scan()
+
+    def put(self, png: bytes) -> str:
+        """Store a PNG chart and its variants; return its key."""
+        key = hashlib.sha256(png).hexdigest()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.duplicates += 1
+                return key
+        files = {"png": png, **self._render_variants(png)}
+        with self._lock:
+            nbytes = 0
+            for variant, data in files.items():
+                path = self._path(key, variant)
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+                nbytes += len(data)
+            self._entries[key] = nbytes
+            self._nbytes += nbytes
+            self.stored += 1
+            self._evict(keep=key)
+        return key
+
+    def path(self, key: str, variant: str = "png") -> Optional[str]:
+        """Return the file of a stored chart variant, or None if it is unknown or evicted."""
+        if variant not in VARIANTS:
+            return None
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key, variant)
+        return path if os.path.exists(path) else None
+
+    def etag(self, key: str, variant: str = "png") -> str:
+        return f'"{key}-{variant}"'
+
+    @contextlib.contextmanager
+    def capture(self) -> Iterator[List[str]]:
+        """Collect the keys of the charts the python tool draws inside this block."""
+        keys: List[str] = []
+        token = _capture.set((self, keys))
+        try:
+            yield keys
+        finally:
+            _capture.reset(token)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "charts": len(self._entries),
+                "bytes": self._nbytes,
+                "max_bytes": self.max_bytes,
+                "stored": self.stored,
+                "duplicates": self.duplicates,
+                "evictions": self.evictions,
+            }
+
+    def _render_variants(self, png: bytes) -> Dict[str, bytes]:
+        from PIL import Image
+
+        variants = {}
+        with Image.open(io.BytesIO(png)) as image:
+            image = image.convert("RGBA") if image.mode not in ("RGB", "RGBA") else image
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=self.webp_quality, method=6)
+            variants["webp"] = buffer.getvalue()
+            image.thumbnail((self.thumbnail_pixels, self.thumbnail_pixels))
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=self.webp_quality, method=6)
+            variants["thumb"] = buffer.getvalue()
+        return variants
+
+    def _evict(self, keep: str) -> None:
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            key, nbytes = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            del self._entries[key]
+            self._nbytes -= nbytes
+            self.evictions += 1
+            for variant in VARIANTS:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._path(key, variant))
+
+    def _scan(self) -> None:
+        stored = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".png"):
+                key = name[:-len(".png")]
+                sizes = [os.path.getsize(self._path(key, variant))
+                         for variant in VARIANTS if os.path.exists(self._path(key, variant))]
+                stored.append((os.path.getmtime(self._path(key, "png")), key, sum(sizes)))
+        for _, key, nbytes in sorted(stored):
+            self._entries[key] = nbytes
+            self._nbytes += nbytes
+
+    def _path(self, key: str, variant: str) -> str:
+        return os.path.join(self.directory, f"{key}.{VARIANTS[variant][0]}")
+
+
+def media_type(variant: str) -> str:
+    return VARIANTS[variant][1]
+
+
+def publish_charts(charts: List[bytes]) -> List[str]:
+    """
+    Store charts drawn by a tool call in the store capturing the current
+    context; return their keys, or nothing if no capture is active.
+    """
+    capture = _capture.get()
+    if capture is None or not charts:
+        return []
+    store, keys = capture
+    new_keys = [store.put(png) for png in charts]
+    keys.extend(new_keys)
+    return new_keys
+
+
+_default_store: Optional[ChartStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store() -> ChartStore:
+    """Return the process-wide chart store shared by the apps."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ChartStore()
+        return _default_store
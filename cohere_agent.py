@@ -0,0 +1,224 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import tracing
+from agent_history import HistoryManager, HistoryStats, record_history_stats
+from python_pool import get_default_pool
+from token_usage import TokenUsage, cohere_usage
+
+
+COHERE_MODEL = os.getenv("COHERE_MODEL", "command-r-plus")
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "60"))
+DEFAULT_TOOL_WORKERS = int(os.getenv("TOOL_CALL_WORKERS", "8"))
+
+
+def run_python_code(code: str) -> dict:
+    """
+    Function to run given python code in the warm python worker pool
+    """
+    return {"python_answer": get_default_pool().run(code)}
+
+
+@dataclass
+class ToolCallTiming:
+    """How long one tool call took and how it ended."""
+    step: int
+    name: str
+    parameters: Dict[str, Any]
+    seconds: float
+    status: str = "ok"  # "ok", "error" or "timeout"
+
+
+class ToolDispatcher:
+    """
+    Runs the tool calls of one agent step concurrently.
+
+    Each call runs on a thread, so I/O-bound tools overlap; python execution
+    tools already hand their code to the worker process pool. Results come
+    back in the order the model issued the calls, and a call that fails or
+    exceeds its timeout yields an error output instead of failing the step.
+    """
+
+    def __init__(self,
+                 functions_map: Dict[str, Callable[..., Any]],
+                 timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: float = DEFAULT_TOOL_TIMEOUT,
+                 max_workers: int = DEFAULT_TOOL_WORKERS):
+        self.functions_map = functions_map
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def dispatch(self, tool_calls: list, step: int = 0, timings: Optional[List[ToolCallTiming]] = None) -> List[dict]:
+        """Run a batch of tool calls and return Cohere `tool_results`, in call order."""
+        started = time.perf_counter()
+        # Each call runs in a copy of the caller's context so its span joins the trace
+        futures = [self._pool.submit(contextvars.copy_context().run, self._timed, tool_call)
+                   for tool_call in tool_calls]
+
+        tool_results = []
+        for tool_call, future in zip(tool_calls, futures):
+            # Every call's deadline counts from when the batch started
+            timeout = self.timeouts.get(tool_call.name, self.default_timeout)
+            remaining = max(0.0, timeout - (time.perf_counter() - started))
+            try:
+                output, seconds, status = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                output = {"error": f"Tool {tool_call.name} timed out after {timeout:g} seconds"}
+                seconds, status = timeout, "timeout"
+            tool_results.append({"call": tool_call, "outputs": [output]})
+            if timings is not None:
+                timings.append(ToolCallTiming(step=step, name=tool_call.name,
+                                              parameters=dict(tool_call.parameters),
+                                              seconds=seconds, status=status))
+        return tool_results
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
+
+    def _timed(self, tool_call):
+        started = time.perf_counter()
+        with tracing.span("tool", tool=tool_call.name) as span:
+            try:
+                function = self.functions_map[tool_call.name]
+                output = function(**tool_call.parameters)
+                status = "ok"
+            except Exception as e:
+                output = {"error": f"Tool {tool_call.name} failed: {e!r}"}
+                status = "error"
+            span.set(status=status)
+        return output, time.perf_counter() - started, status
+
+
+def _chat(co, usage: Optional[TokenUsage], **kwargs):
+    """Call `co.chat`, tracing the call and adding its billed tokens to `usage`."""
+    start, started = time.time(), time.perf_counter()
+    response = co.chat(**kwargs)
+    input_tokens, output_tokens = cohere_usage(response)
+    tracing.record_llm_call(start, time.perf_counter() - started, input_tokens, output_tokens)
+    if usage is not None:
+        usage.add(input_tokens, output_tokens)
+    return response
+
+
+def cohere_agent(
+    message: str,
+    preamble: str,
+    tools: List[dict],
+    functions_map: Optional[Dict[str, Callable[..., Any]]] = None,
+    co=None,
+    model: str = COHERE_MODEL,
+    temperature: Optional[float] = None,
+    force_single_step: bool = False,
+    verbose: bool = False,
+    max_steps: int = 15,
+    dispatcher: Optional[ToolDispatcher] = None,
+    timings: Optional[List[ToolCallTiming]] = None,
+    usage: Optional[TokenUsage] = None,
+    history: Optional[HistoryManager] = None,
+    history_stats: Optional[HistoryStats] = None,
+) -> str:
+    """
+    Function to handle multi-step tool use api.
+
+    Args:
+        message (str): The message to send to the Cohere AI model.
+        preamble (str): The preamble or context for the conversation.
+        tools (list of dict): List of tools to use in the conversation.
+        functions_map (dict, optional): Tool name to function. Defaults to `run_python_code` only.
+        co (cohere.Client, optional): Client to use. Defaults to one built from COHERE_API_KEY.
+        model (str, optional): Cohere model name.
+        temperature (float, optional): Sampling temperature. Defaults to the API default.
+        verbose (bool, optional): Whether to print verbose output. Defaults to False.
+        max_steps (int, optional): Maximum number of tool-use steps. Defaults to 15.
+        dispatcher (ToolDispatcher, optional): Runs each step's tool calls concurrently.
+        timings (list, optional): Receives a ToolCallTiming for every tool call.
+        usage (TokenUsage, optional): Accumulates the billed tokens of every step.
+        history (HistoryManager, optional): Token budgets for the tool results sent back each step.
+        history_stats (HistoryStats, optional): Accumulates what the history compaction left out.
+
+    Returns:
+        str: The final response from the call.
+    """
+    if co is None:
+        import cohere
+        co = cohere.Client(api_key=os.environ["COHERE_API_KEY"])
+    chat_kwargs = {} if temperature is None else {"temperature": temperature}
+    own_dispatcher = dispatcher is None
+    if own_dispatcher:
+        dispatcher = ToolDispatcher(functions_map or {"run_python_code": run_python_code})
+    history = history or HistoryManager()
+    stats = HistoryStats()
+
+    try:
+        counter = 1
+        # Tokens compacted out of the history so far; every later call leaves them out too
+        left_out = 0
+        response = _chat(
+            co,
+            usage,
+            model=model,
+            message=message,
+            preamble=preamble,
+            tools=tools,
+            force_single_step=force_single_step,
+            **chat_kwargs,
+        )
+        if verbose:
+            print("\nrunning 0th step.")
+            print(response.text)
+
+        while response.tool_calls and counter <= max_steps:
+            if verbose:
+                print(f"\nrunning {counter}th step.")
+
+            step_timings: List[ToolCallTiming] = []
+            tool_results = dispatcher.dispatch(response.tool_calls, step=counter, timings=step_timings)
+            if timings is not None:
+                timings.extend(step_timings)
+
+            if verbose:
+                for result, timing in zip(tool_results, step_timings):
+                    print(
+                        f"= running tool {timing.name}, with parameters: {timing.parameters}"
+                    )
+                    print(f"== tool results ({timing.seconds:.2f}s, {timing.status}): {result['outputs']}")
+
+            step_stats = HistoryStats()
+            chat_history, tool_results = history.compact_cohere(response.chat_history, tool_results, step_stats)
+            left_out += step_stats.tokens_saved
+            stats.outputs_trimmed += step_stats.outputs_trimmed
+            stats.steps_compacted += step_stats.steps_compacted
+            stats.tokens_saved += left_out
+
+            response = _chat(
+                co,
+                usage,
+                model=model,
+                message="",
+                chat_history=chat_history,
+                preamble=preamble,
+                tools=tools,
+                force_single_step=force_single_step,
+                tool_results=tool_results,
+                **chat_kwargs,
+            )
+            if verbose:
+                print(response.text)
+            counter += 1
+
+        tracing.AGENT_STEPS.observe(counter - 1)
+        record_history_stats(stats)
+        if history_stats is not None:
+            history_stats.add(stats)
+        if verbose and stats.tokens_saved:
+            print(f"\nhistory compaction saved ~{stats.tokens_saved} tokens "
+                  f"({stats.outputs_trimmed} outputs trimmed, {stats.steps_compacted} steps compacted)")
+        return response.text
+    finally:
+        if own_dispatcher:
+            dispatcher.shutdown()
@@ -0,0 +1,144 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain.agents import Tool
+from langchain_cohere import ChatCohere
+from langchain_cohere.csv_agent.agent import create_prompt
+from langchain_cohere.csv_agent.prompts import CSV_PREAMBLE
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import BaseTool
+from langchain_experimental.tools.python.tool import PythonAstREPLTool
+from pydantic import BaseModel, Field
+
+from agent_history import HistoryManager
+from python_pool import PythonWorkerPool, get_default_pool
+from schema_profile import profile_frame, render_preamble
+from sql_engine import SQLEngine
+
+
+class PythonToolInput(BaseModel):
+    code: str = Field(description="Python code to execute.")
+
+
+def get_dataframe_python_tool(frames: Dict[str, pd.DataFrame],
+                              data_paths: Optional[Dict[str, str]] = None,
+                              pool: Optional[PythonWorkerPool] = None) -> Tool:
+    """
+    Returns a python tool whose interpreter already has the given DataFrames loaded.
+
+    When `data_paths` maps the frame names to their stored files, code runs in
+    the warm worker pool instead of in the serving process.
+    """
+    if data_paths:
+        pool = pool or get_default_pool()
+
+        def python_interpreter(code: str) -> str:
+            """A function that will return the output of the python code.
+
+            Args:
+                code: the python code to run.
+            """
+            return pool.run(code, frames=data_paths)
+    else:
+        python_repl = PythonAstREPLTool(locals={"pd": pd, **frames})
+
+        def python_interpreter(code: str) -> str:
+            """A function that will return the output of the python code.
+
+            Args:
+                code: the python code to run.
+            """
+            return python_repl.run(code)
+
+    python_tool = Tool(
+        name="python_interpreter",
+        description="Executes python code and returns the result. The code runs in a static sandbox without interactive mode, so print output or save output to a file.",
+        func=python_interpreter,
+    )
+    python_tool.args_schema = PythonToolInput
+    return python_tool
+
+
+class SQLToolInput(BaseModel):
+    query: str = Field(description="A single read-only SQL query.")
+
+
+def get_sql_tool(tables: Dict[str, Union[str, pd.DataFrame]]) -> Tool:
+    """
+    Returns a SQL tool whose DuckDB engine has the given tables registered
+    under their names (stored Parquet paths are queried in place).
+    """
+    engine = SQLEngine(tables)
+
+    sql_tool = Tool(
+        name="sql_query",
+        description=f"Runs one read-only DuckDB SQL query and returns the result as a table, at most {engine.max_rows} rows. "
+                    f"Tables: {', '.join(engine.tables)}. Prefer it for filters, aggregations and joins over large tables.",
+        func=engine.query,
+    )
+    sql_tool.args_schema = SQLToolInput
+    return sql_tool
+
+
+def describe_frames(frames: Dict[str, pd.DataFrame],
+                    profiles: Optional[Dict[str, dict]] = None,
+                    sample_values: int = 3) -> str:
+    """
+    Build the attachment message that tells the model which DataFrames it has.
+
+    The message is a token-budgeted schema summary rather than a head()
+    preview, so it stays small however wide the tables are. Pass the cached
+    `profiles` to skip profiling the frames again.
+    """
+    profiles = profiles or {name: profile_frame(df, sample_values) for name, df in frames.items()}
+    names = ", ".join(f"`{name}`" for name in frames)
+    return f"The DataFrames {names} are already loaded in the python interpreter.\n\n{render_preamble(profiles)}"
+
+
+def create_dataframe_agent(llm: ChatCohere,
+                           df: Union[pd.DataFrame, Dict[str, pd.DataFrame]],
+                           extra_tools: List[BaseTool] = [],
+                           number_of_head_rows: int = 3,
+                           verbose: bool = True,
+                           return_intermediate_steps: bool = True,
+                           message: Optional[str] = None,
+                           data_paths: Optional[Dict[str, str]] = None,
+                           profiles: Optional[Dict[str, dict]] = None,
+                           sql_tool: bool = False,
+                           history: Optional[HistoryManager] = None) -> AgentExecutor:
+    """
+    Same agent as langchain_cohere's create_csv_agent, but built from DataFrames
+    that are already in memory instead of CSV paths it would parse again.
+
+    A single frame is exposed to the model as `df`; a dict exposes each frame
+    under its key. Pass `data_paths` (same keys, stored file paths) to run the
+    generated code in the warm python worker pool, and `profiles` (same keys,
+    see schema_profile.py) to reuse cached schema profiles in the prompt;
+    `number_of_head_rows` is the number of sample values shown per column.
+    With `sql_tool` the agent also gets a SQL tool over the same tables.
+    Earlier tool outputs are sent back to the model within the token budgets
+    of `history` (see agent_history.py).
+    """
+    frames = df if isinstance(df, dict) else {"df": df}
+    message = message or describe_frames(frames, profiles, number_of_head_rows)
+    prompt = create_prompt(system_message=HumanMessage(message))
+
+    final_tools = [get_dataframe_python_tool(frames, data_paths)] + extra_tools
+    if sql_tool:
+        final_tools.append(get_sql_tool(data_paths or frames))
+    if "preamble" in llm.__dict__ and not llm.__dict__.get("preamble"):
+        llm = ChatCohere(**llm.__dict__)
+        llm.preamble = CSV_PREAMBLE.format(
+            current_date=datetime.now().strftime("%A, %B %d, %Y %H:%M:%S")
+        )
+
+    agent = create_tool_calling_agent(llm=llm, tools=final_tools, prompt=prompt)
+    return AgentExecutor(
+        agent=agent,
+        tools=final_tools,
+        verbose=verbose,
+        return_intermediate_steps=return_intermediate_steps,
+        trim_intermediate_steps=(history or HistoryManager()).trim_intermediate_steps,
+    )
@@ -1,67 +1,104 @@
-import os
-import re
-import tempfile
-import pandas as pd
+from functools import partial
 import gradio as gr
 from dotenv import load_dotenv
-from io import StringIO
-from langchain_cohere import ChatCohere, create_csv_agent
+from answer_cache import AnswerCache, CachedAnswer, answer_key
+from chart_store import get_default_store
+from session_registry import SessionRegistry
+from startup import Lazy, Readiness, build_cohere_llm
 
 # Load environment variables
 load_dotenv()
-COHERE_API_KEY = os.getenv("COHERE_API_KEY")
-os.environ['COHERE_API_KEY'] = COHERE_API_KEY
 
-# Initialize the Cohere LLM
-llm = ChatCohere(cohere_api_key=COHERE_API_KEY,
-                 model="command-r-plus-08-2024",
-                 temperature=0)
+# The Cohere LLM, built on first use
+llm = Lazy(build_cohere_llm)
 
-# Placeholder for agent, generated image, and dataframe
-agent_executor = None
-generated_image_path = None
-uploaded_df = None
+def build_dataset_cache():
+    from csv_agent import create_dataframe_agent
+    from dataset_cache import DatasetCache
 
-# Function to handle CSV upload
-def upload_csv(file):
-    global agent_executor, uploaded_df
+    return DatasetCache(build_agent=lambda df, path, profile: create_dataframe_agent(
+        llm.get(), df, data_paths={"df": path}, profiles={"df": profile}, sql_tool=True),
+        in_use=sessions.uses_dataset)
+
+def warm_up_modules() -> None:
+    import answer_stream, csv_agent, query_planner  # noqa: F401
+
+# Agent, generated image, and dataframe for each browser session
+sessions = SessionRegistry()
+
+# Uploads are content-addressed, so re-uploading a known file reuses its frame and agent
+datasets = Lazy(build_dataset_cache)
+
+# Final answers keyed by dataset, model, temperature and normalized question
+answers = AnswerCache()
+
+# Charts drawn by the python tool, stored by content hash
+charts = get_default_store()
+
+# langchain and the LLM client load in the background while the UI starts
+readiness = Readiness({"modules": warm_up_modules, "llm": llm.get, "datasets": datasets.get})
 
+# Function to handle CSV upload
+def upload_csv(file, request: gr.Request):
     try:
-        uploaded_df = pd.read_csv(file.name)
-        temp_csv_path = os.path.join(tempfile.gettempdir(), "temp.csv")
-        uploaded_df.to_csv(temp_csv_path, index=False)
+        with open(file.name, "rb") as stream:
+            dataset = datasets.get().load_csv(stream)
+        uploaded_df = dataset.df
+
+        # Simple aggregate questions are answered straight from the DataFrame
+        if "planner" not in dataset.extra:
+            from query_planner import QueryPlanner
 
-        # Create the CSV agent
-        agent_executor = create_csv_agent(llm, temp_csv_path)
+            dataset.extra["planner"] = QueryPlanner({"df": uploaded_df})
+        sessions.put(request.session_hash, dataset.agent, uploaded_df, dataset_key=dataset.key,
+                     extra={"planner": dataset.extra["planner"]})
         return "✅ CSV uploaded successfully!", uploaded_df.head(), None
     except Exception as e:
         return f"❌ Error uploading CSV: {e}", None, None
 
+# Function to run the agent and capture its answer and chart
+def run_agent(agent, question, callbacks=()):
+    with charts.capture() as chart_keys:
+        response = agent.invoke({"input": question}, config={"callbacks": list(callbacks)})
+    response_message = response.get("output")
+
+    # The last chart the python tool drew goes with the answer
+    return CachedAnswer(text=response_message, image=chart_keys[-1] if chart_keys else None)
+
 # Function to handle user questions
-def ask_question(question):
-    global agent_executor, generated_image_path
+def ask_question(question, request: gr.Request):
+    session = sessions.get(request.session_hash)
 
-    if not agent_executor:
-        return "❗ Please upload a CSV file first.", None
+    if not session:
+        yield "❗ Please upload a CSV file first.", None
+        return
 
-    try:
-        response = agent_executor.invoke({"input": question})
-        response_message = response.get("output")
+    from answer_stream import ProgressText, iter_agent_events
 
-        # Extract image path if a chart was generated
-        image_match = re.search(r'\("(?P<filename>[^\"]+\.png)"\)', response_message)
-        generated_image_path = image_match.group("filename") if image_match else None
+    try:
+        # Computed directly for simple aggregates, served from the cache for
+        # repeated questions, otherwise the agent's progress is shown as it runs
+        planned = session.extra["planner"].answer(question)
+        key = answer_key(session.dataset_key, llm.get().model, llm.get().temperature, question)
+        answer = CachedAnswer(text=planned.text) if planned is not None else answers.get(key)
+        if answer is None:
+            progress = ProgressText()
+            run = lambda callbacks: answers.compute(key, partial(run_agent, session.agent, question, callbacks))
+            for event, data in iter_agent_events(run):
+                if event == "result":
+                    answer = data
+                else:
+                    yield progress.add(event, data), None
+
+        session.generated_image_path = charts.path(answer.image) if answer.image else None
+        yield answer.text, session.generated_image_path
 
-        return response_message, generated_image_path
     except Exception as e:
-        return f"⚠️ Failed to process the question: {e}", None
+        yield f"⚠️ Failed to process the question: {e}", None
 
 # Function to reset the agent
-def reset_agent():
-    global agent_executor, generated_image_path, uploaded_df
-    agent_executor = None
-    generated_image_path = None
-    uploaded_df = None
+def reset_agent(request: gr.Request):
+    sessions.remove(request.session_hash)
     return "🔄 Agent reset. You can upload a new CSV.", None, None
 
 # Gradio Interface
@@ -93,4 +130,6 @@ with gr.Blocks() as demo:
     reset_button.click(reset_agent, outputs=[upload_status, df_head_output, image_output])
 
 # Launch the Gradio App
-demo.launch()
\ No newline at end of file
+if __name__ == "__main__":
+    readiness.start()
+    demo.launch()
\ No newline at end of file
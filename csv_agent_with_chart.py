@@ -1,72 +1,107 @@
-import os
-import re
-import tempfile
-import pandas as pd
+from functools import partial
 import gradio as gr
 from dotenv import load_dotenv
-from PIL import Image
-from langchain_cohere import ChatCohere, create_csv_agent
+from answer_cache import AnswerCache, CachedAnswer, answer_key
+from chart_store import get_default_store
+from session_registry import SessionRegistry
+from startup import Lazy, Readiness, build_cohere_llm
 
 # Load environment variables
 load_dotenv()
-COHERE_API_KEY = os.getenv("COHERE_API_KEY")
-os.environ['COHERE_API_KEY'] = COHERE_API_KEY
 
-# Initialize the Cohere LLM
-llm = ChatCohere(cohere_api_key=COHERE_API_KEY,
-                 model="command-r-plus-08-2024",
-                 temperature=0)
+# The Cohere LLM, built on first use
+llm = Lazy(build_cohere_llm)
 
-# Placeholders
-agent_executor = None
-uploaded_df = None
+def build_dataset_cache():
+    from csv_agent import create_dataframe_agent
+    from dataset_cache import DatasetCache
+
+    return DatasetCache(build_agent=lambda df, path, profile: create_dataframe_agent(
+        llm.get(), df, data_paths={"df": path}, profiles={"df": profile}, sql_tool=True),
+        in_use=sessions.uses_dataset)
+
+def warm_up_modules() -> None:
+    import answer_stream, csv_agent, query_planner  # noqa: F401
+
+# Agent and dataframe for each browser session
+sessions = SessionRegistry()
+
+# Uploads are content-addressed, so re-uploading a known file reuses its frame and agent
+datasets = Lazy(build_dataset_cache)
+
+# Final answers keyed by dataset, model, temperature and normalized question
+answers = AnswerCache()
+
+# Charts drawn by the python tool, stored by content hash
+charts = get_default_store()
+
+# langchain and the LLM client load in the background while the UI starts
+readiness = Readiness({"modules": warm_up_modules, "llm": llm.get, "datasets": datasets.get})
 
 # Upload CSV
-def upload_csv(file):
-    global agent_executor, uploaded_df
+def upload_csv(file, request: gr.Request):
     try:
-        uploaded_df = pd.read_csv(file.name)
-        temp_csv_path = os.path.join(tempfile.gettempdir(), "temp.csv")
-        uploaded_df.to_csv(temp_csv_path, index=False)
-        agent_executor = create_csv_agent(llm, temp_csv_path)
+        with open(file.name, "rb") as stream:
+            dataset = datasets.get().load_csv(stream)
+        uploaded_df = dataset.df
+        # Simple aggregate questions are answered straight from the DataFrame
+        if "planner" not in dataset.extra:
+            from query_planner import QueryPlanner
+
+            dataset.extra["planner"] = QueryPlanner({"df": uploaded_df})
+        sessions.put(request.session_hash, dataset.agent, uploaded_df, dataset_key=dataset.key,
+                     extra={"planner": dataset.extra["planner"]})
         return "✅ CSV uploaded successfully!", uploaded_df.head(), gr.update(visible=False)
     except Exception as e:
         return f"❌ Error uploading CSV: {e}", None, gr.update(visible=False)
 
-# Handle User Questions
-def ask_question(question):
-    global agent_executor
-
-    if not agent_executor:
-        return "❗ Please upload a CSV file first.", gr.update(visible=False)
+# Run the Agent and capture its answer and chart
+def run_agent(agent, question, callbacks=()):
+    with charts.capture() as chart_keys:
+        response = agent.invoke({"input": question}, config={"callbacks": list(callbacks)})
+    response_message = response.get("output")
 
-    try:
-        # Agent Response
-        response = agent_executor.invoke({"input": question})
-        response_message = response.get("output")
+    # The last chart the python tool drew goes with the answer
+    return CachedAnswer(text=response_message, image=chart_keys[-1] if chart_keys else None)
 
-        # Detect Markdown-style image reference
-        image_match = re.search(r'!\[.*?\]\("(?P<filename>[^"]+\.png)"\)', response_message)
-        if image_match:
-            image_path = image_match.group("filename")
+# Handle User Questions
+def ask_question(question, request: gr.Request):
+    session = sessions.get(request.session_hash)
 
-            # Remove the Markdown image reference from the response
-            response_message = re.sub(r'!\[.*?\]\("[^"]+\.png"\)', '', response_message).strip()
+    if not session:
+        yield "❗ Please upload a CSV file first.", gr.update(visible=False)
+        return
 
-            # Check if the image exists and load it
-            if os.path.exists(image_path):
-                return response_message, gr.update(value=image_path, visible=True)
+    from answer_stream import ProgressText, iter_agent_events
 
-        return response_message, gr.update(visible=False)
+    try:
+        # Computed directly for simple aggregates, served from the cache for
+        # repeated questions, otherwise the agent's progress is shown as it runs
+        planned = session.extra["planner"].answer(question)
+        key = answer_key(session.dataset_key, llm.get().model, llm.get().temperature, question)
+        answer = CachedAnswer(text=planned.text) if planned is not None else answers.get(key)
+        if answer is None:
+            progress = ProgressText()
+            run = lambda callbacks: answers.compute(key, partial(run_agent, session.agent, question, callbacks))
+            for event, data in iter_agent_events(run):
+                if event == "result":
+                    answer = data
+                else:
+                    yield progress.add(event, data), gr.update(visible=False)
+
+        # Show the chart if it is still in the store
+        image_path = charts.path(answer.image) if answer.image else None
+        if image_path:
+            yield answer.text, gr.update(value=image_path, visible=True)
+        else:
+            yield answer.text, gr.update(visible=False)
 
     except Exception as e:
-        return f"⚠️ Failed to process the question: {e}", gr.update(visible=False)
+        yield f"⚠️ Failed to process the question: {e}", gr.update(visible=False)
 
 # Reset Agent
-def reset_agent():
-    global agent_executor, uploaded_df
-    agent_executor = None
-    uploaded_df = None
+def reset_agent(request: gr.Request):
+    sessions.remove(request.session_hash)
     return gr.update(value="🔄 Agent reset. You can upload a new CSV."), None, gr.update(visible=False), gr.update(visible=True), gr.update(visible=True)
 
 # Gradio Interface
@@ -110,4 +145,6 @@ with gr.Blocks(css="""
     reset_button.click(reset_agent, outputs=[upload_status, df_head_output, image_output, file_input, upload_button])
 
 # Launch the Gradio App
-demo.launch()
+if __name__ == "__main__":
+    readiness.start()
+    demo.launch()
@@ -0,0 +1,254 @@
+import os
+import tempfile
+import uuid
+from typing import BinaryIO, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+
+# Where parsed datasets are stored, and how many rows are parsed at a time
+DATASET_DIR = os.getenv("DATASET_DIR", os.path.join(tempfile.gettempdir(), "csv_agent_datasets"))
+DEFAULT_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "100000"))
+
+# Text columns with at most this share of distinct values are stored as categories
+CATEGORY_MAX_RATIO = 0.5
+
+# "2017-10-01-2018-09-29" style period labels, and plain "2017-09-30" dates
+PERIOD_PATTERN = r"^(\d{4}-\d{2}-\d{2})-(\d{4}-\d{2}-\d{2})$"
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+
+def downcast_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shrink column dtypes without changing any value.
+
+    Integers go to the narrowest integer type, floats go to float32 only when
+    every value survives the round trip, and repetitive text becomes a category.
+    """
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            as_float32 = series.astype(np.float32)
+            if ((as_float32.astype(series.dtype) == series) | series.isna()).all():
+                df[column] = as_float32
+        elif series.dtype == object:
+            non_null = series.count()
+            if non_null and series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * non_null:
+                df[column] = series.astype("category")
+    return df
+
+
+def split_period_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn date-like text columns into real date columns.
+
+    A column of period labels such as "2017-10-01-2018-09-29" keeps its label
+    and gains `<column>_start` and `<column>_end` datetime columns; a column of
+    plain "YYYY-MM-DD" dates is converted in place.
+    """
+    for column in list(df.columns):
+        series = df[column]
+        if not (series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype)):
+            continue
+        values = series.dropna().astype(str)
+        if values.empty:
+            continue
+        if values.str.match(PERIOD_PATTERN).all():
+            bounds = series.astype("string").str.extract(PERIOD_PATTERN)
+            position = df.columns.get_loc(column) + 1
+            df.insert(position, f"{column}_start", pd.to_datetime(bounds[0]))
+            df.insert(position + 1, f"{column}_end", pd.to_datetime(bounds[1]))
+        elif values.str.match(DATE_PATTERN).all():
+            df[column] = pd.to_datetime(series.astype("string"))
+    return df
+
+
+def concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate parsed chunks, merging categories instead of falling back to text."""
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            columns[column] = pd.Series(union_categoricals(parts, ignore_order=True), name=column)
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def iter_csv_chunks(stream: BinaryIO, chunksize: int = DEFAULT_CHUNK_ROWS, **read_csv_kwargs) -> Iterable[pd.DataFrame]:
+    """Parse a binary CSV stream a chunk of rows at a time, downcasting each chunk."""
+    reader = pd.read_csv(stream, chunksize=chunksize, encoding="utf-8-sig", **read_csv_kwargs)
+    with reader:
+        for chunk in reader:
+            yield downcast_frame(chunk)
+
+
+def dataset_path(name: Optional[str] = None, directory: str = DATASET_DIR) -> str:
+    """Return a fresh path for a stored dataset."""
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{name or uuid.uuid4().hex}.parquet")
+
+
+def _kind(series: pd.Series) -> str:
+    """What a parsed column holds, as far as appending chunks to it goes."""
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(series):
+        return "number"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "date"
+    return "text"
+
+
+def _stored_schema(chunk: pd.DataFrame) -> pa.Schema:
+    """
+    The Parquet schema of a streamed dataset, fixed from its first chunk.
+
+    Numbers are stored at full width, since a later chunk may not fit the
+    first one's narrow dtypes; `load_dataset` narrows them again. Repetitive
+    text is dictionary-encoded, so it stays compact while it is read back.
+    """
+    fields = []
+    for field in pa.Schema.from_pandas(chunk, preserve_index=False):
+        series = chunk[field.name]
+        if pa.types.is_integer(field.type):
+            field = field.with_type(pa.int64())
+        elif pa.types.is_floating(field.type):
+            field = field.with_type(pa.float64())
+        elif _kind(series) == "text":
+            non_null = series.count()
+            repetitive = non_null and series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * non_null
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()) if repetitive else pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def _stream_to_parquet(stream: BinaryIO, path: str, chunksize: int, **read_csv_kwargs) -> Optional[bool]:
+    """
+    Write each parsed chunk to `path` as one row group. Returns False if no
+    rows were parsed, and None if a chunk did not fit the first one's schema.
+    """
+    reader = pd.read_csv(stream, chunksize=chunksize, encoding="utf-8-sig", **read_csv_kwargs)
+    writer = None
+    try:
+        with reader:
+            for chunk in reader:
+                chunk = split_period_columns(chunk)
+                kinds = [_kind(chunk[column]) for column in chunk.columns]
+                if writer is None:
+                    schema, first_kinds = _stored_schema(chunk), kinds
+                    writer = pq.ParquetWriter(path, schema)
+                if list(chunk.columns) != schema.names or kinds != first_kinds:
+                    return None
+                try:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False).cast(schema)
+                except pa.ArrowException:
+                    return None
+                writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return writer is not None
+
+
+def ingest_csv(stream: BinaryIO,
+               path: Optional[str] = None,
+               chunksize: int = DEFAULT_CHUNK_ROWS,
+               **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Parse a CSV upload in chunks into a compact, typed DataFrame.
+
+    With `path`, each chunk is written there as Parquet as soon as it is
+    parsed and the frame is read back from the file, so peak memory is about
+    one chunk plus the frame at full-width dtypes (before `load_dataset`
+    narrows them), not several copies of it. If a later chunk does not fit
+    the first one's columns (say, a number column that turns to text), the
+    stream is parsed again in memory: downcast chunks are concatenated and
+    then written, which takes a few times the size of the final frame at
+    peak, as does parsing without a `path` or from a stream that cannot be
+    rewound.
+    """
+    if path and stream.seekable():
+        start = stream.tell()
+        streamed = _stream_to_parquet(stream, path, chunksize, **read_csv_kwargs)
+        if streamed is not None:
+            return load_dataset(path) if streamed else pd.DataFrame()
+        stream.seek(start)
+
+    chunks = list(iter_csv_chunks(stream, chunksize=chunksize, **read_csv_kwargs))
+    if not chunks:
+        return pd.DataFrame()
+    df = downcast_frame(split_period_columns(concat_chunks(chunks)))
+    if path:
+        df.to_parquet(path, index=False)
+    return df
+
+
+def load_dataset(path: str) -> pd.DataFrame:
+    """Load a dataset previously stored by `ingest_csv`, with its compact dtypes."""
+    # Columns are handed over from Arrow one at a time, not copied as a whole
+    df = pq.read_table(path).to_pandas(split_blocks=True, self_destruct=True)
+    return downcast_frame(df)
+
+
+class SchemaMismatchError(ValueError):
+    """Raised when appended rows do not fit the columns of the dataset they extend."""
+
+
+def _fit_numeric(series: pd.Series, dtype: np.dtype) -> pd.Series:
+    """Cast parsed numbers to `dtype` when every value survives, so appends keep narrow dtypes."""
+    try:
+        values = pd.to_numeric(series)
+    except (TypeError, ValueError):
+        raise SchemaMismatchError(f"Column {series.name!r} must be numeric.")
+    if values.isna().any() and pd.api.types.is_integer_dtype(dtype):
+        return values
+    try:
+        cast = values.astype(dtype)
+    except (TypeError, ValueError, OverflowError):
+        return values
+    return cast if ((cast.astype(values.dtype) == values) | values.isna()).all() else values
+
+
+def conform_rows(rows: pd.DataFrame, base: pd.DataFrame) -> pd.DataFrame:
+    """
+    Check that parsed rows have the columns of `base` and cast them to its
+    dtypes, so the two frames can be concatenated without widening to text.
+    """
+    if rows.empty:
+        raise SchemaMismatchError("The upload has no rows to append.")
+    missing = [str(column) for column in base.columns if column not in rows.columns]
+    extra = [str(column) for column in rows.columns if column not in base.columns]
+    if missing or extra:
+        raise SchemaMismatchError(f"Columns do not match the dataset: missing {missing or 'none'}, "
+                                  f"unexpected {extra or 'none'}.")
+    rows = rows[list(base.columns)].reset_index(drop=True)
+    for column in base.columns:
+        target, series = base[column].dtype, rows[column]
+        if series.dtype == target:
+            continue
+        if pd.api.types.is_bool_dtype(target):
+            if not pd.api.types.is_bool_dtype(series):
+                raise SchemaMismatchError(f"Column {column!r} must be true/false.")
+        elif pd.api.types.is_numeric_dtype(target):
+            rows[column] = _fit_numeric(series, target)
+        elif pd.api.types.is_datetime64_any_dtype(target):
+            try:
+                rows[column] = pd.to_datetime(series.astype("string"))
+            except (TypeError, ValueError):
+                raise SchemaMismatchError(f"Column {column!r} must hold dates.")
+        else:
+            # Text (or categories of text): keep the values as strings
+            text = series.astype(object).where(series.isna(), series.astype(str))
+            rows[column] = text.astype("category") if isinstance(target, pd.CategoricalDtype) else text
+    return rows
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, Optional
+
+import pandas as pd
+
+import tracing
+from csv_ingest import DATASET_DIR, concat_chunks, conform_rows, dataset_path, ingest_csv, load_dataset
+from schema_profile import PROFILE_VERSION, profile_frame, update_profile
+from session_registry import frame_nbytes
+from ttl_cache import KeyedLocks
+
+
+# Budgets, overridable through the environment
+DEFAULT_MAX_MEMORY_BYTES = int(os.getenv("DATASET_CACHE_MAX_MEMORY_BYTES", str(2 * 1024 * 1024 * 1024)))
+DEFAULT_MAX_DISK_BYTES = int(os.getenv("DATASET_CACHE_MAX_DISK_BYTES", str(10 * 1024 * 1024 * 1024)))
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def fingerprint_stream(stream: BinaryIO, chunk_size: int = HASH_CHUNK_BYTES) -> str:
+    """
+    Hash a binary stream chunk by chunk and rewind it.
+
+    The upload is never held in memory as a whole; only `chunk_size` bytes
+    are read at a time.
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedDataset:
+    """A parsed dataset, its schema profile and the agent built over it."""
+    key: str
+    df: pd.DataFrame
+    profile: Dict[str, Any]
+    path: str
+    agent: Any = None
+    nbytes: int = 0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+class DatasetCache:
+    """
+    Content-addressed cache of uploaded datasets.
+
+    Uploads are keyed by the SHA-256 of their bytes. A re-upload of a known
+    file is served from memory, or from the Parquet copy on disk, instead of
+    parsing the CSV and building a new agent. Memory and disk usage are each
+    capped, evicting the least recently used datasets first.
+
+    `build_agent(df, path, profile)` is called once per dataset loaded into memory.
+    `in_use(key)` tells whether a session still works on a dataset, such as
+    `SessionRegistry.uses_dataset`; its Parquet file is then kept on disk
+    even after the dataset leaves memory, since the session's tools read it.
+    """
+
+    def __init__(self,
+                 build_agent: Optional[Callable[[pd.DataFrame, str, Dict[str, Any]], Any]] = None,
+                 directory: str = DATASET_DIR,
+                 max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+                 in_use: Optional[Callable[[str], bool]] = None):
+        self.build_agent = build_agent
+        self.in_use = in_use
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._entries: "OrderedDict[str, CachedDataset]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Concurrent uploads of the same file wait for a single parse
+        self._key_locks = KeyedLocks()
+        self._nbytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.appends = 0
+        self.evictions = 0
+
+    def load_csv(self, stream: BinaryIO) -> CachedDataset:
+        """Return the cached dataset for a CSV upload, parsing it only if it is new."""
+        with tracing.span("dataset.load") as span:
+            key = fingerprint_stream(stream)
+            stream.seek(0, os.SEEK_END)
+            span.set(upload_bytes=stream.tell())
+            stream.seek(0)
+            with self._key_locks.hold(key):
+                dataset = self.get(key)
+                if dataset is not None:
+                    span.set(source="memory")
+                    return dataset
+
+                path = self._path(key)
+                if os.path.exists(path):
+                    df = load_dataset(path)
+                    profile = self._read_profile(key) or profile_frame(df)
+                    with self._lock:
+                        self.disk_hits += 1
+                    span.set(source="disk")
+                else:
+                    # Write under a temporary name so a crash never leaves a partial dataset
+                    partial_path = f"{path}.partial"
+                    with tracing.span("dataset.parse_csv"):
+                        df = ingest_csv(stream, partial_path)
+                    os.replace(partial_path, path)
+                    profile = profile_frame(df)
+                    self._write_profile(key, profile)
+                    with self._lock:
+                        self.misses += 1
+                    self._enforce_disk_budget(keep=key)
+                    span.set(source="parse")
+
+                span.set(rows=len(df), parquet_bytes=os.path.getsize(path))
+                with tracing.span("dataset.build_agent"):
+                    return self._add(key, df, profile, path)
+
+    def append_csv(self, key: str, stream: BinaryIO) -> CachedDataset:
+        """
+        Return dataset `key` extended with the rows of a CSV upload.
+
+        The result is a new dataset whose key chains `key` with the hash of
+        the new rows, so answers cached for the old rows stay keyed to them.
+        Only the new rows are parsed and profiled; the profile is merged from
+        the old one. Raises KeyError if `key` is unknown and
+        SchemaMismatchError if the rows do not fit its columns.
+        """
+        with tracing.span("dataset.append") as span:
+            base = self.get(key)
+            if base is None:
+                raise KeyError(f"Dataset {key} is not loaded; upload it again.")
+            new_key = hashlib.sha256(f"{key}+{fingerprint_stream(stream)}".encode()).hexdigest()
+            with self._key_locks.hold(new_key):
+                dataset = self.get(new_key)
+                if dataset is not None:
+                    span.set(source="memory")
+                    return dataset
+
+                path = self._path(new_key)
+                with tracing.span("dataset.parse_csv"):
+                    appended = conform_rows(ingest_csv(stream), base.df)
+                df = concat_chunks([base.df, appended])
+                profile = update_profile(base.profile, df, appended)
+                partial_path = f"{path}.partial"
+                df.to_parquet(partial_path, index=False)
+                os.replace(partial_path, path)
+                self._write_profile(new_key, profile)
+                with self._lock:
+                    self.appends += 1
+                self._enforce_disk_budget(keep=new_key)
+                span.set(source="append", rows=len(df), appended_rows=len(appended),
+                         parquet_bytes=os.path.getsize(path))
+                with tracing.span("dataset.build_agent"):
+                    return self._add(new_key, df, profile, path)
+
+    def get(self, key: Optional[str]) -> Optional[CachedDataset]:
+        """Return an in-memory dataset by key and mark it as recently used."""
+        with self._lock:
+            dataset = self._entries.get(key) if key else None
+            if dataset is None:
+                return None
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+        self._touch(dataset.path)
+        return dataset
+
+    def stats(self) -> dict:
+        """Return cache size and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._nbytes,
+                "disk_bytes": self._disk_usage(),
+                "max_memory_bytes": self.max_memory_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "appends": self.appends,
+                "evictions": self.evictions,
+            }
+
+    def _add(self, key: str, df: pd.DataFrame, profile: Dict[str, Any], path: str) -> CachedDataset:
+        agent = self.build_agent(df, path, profile) if self.build_agent else None
+        dataset = CachedDataset(key=key, df=df, profile=profile, path=path,
+                                agent=agent, nbytes=frame_nbytes(df))
+        with self._lock:
+            self._entries[key] = dataset
+            self._nbytes += dataset.nbytes
+            # Always keep the dataset that was just loaded
+            while len(self._entries) > 1 and self._nbytes > self.max_memory_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self.evictions += 1
+        return dataset
+
+    def _path(self, key: str) -> str:
+        return dataset_path(key, self.directory)
+
+    def _profile_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.profile.json")
+
+    def _read_profile(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._profile_path(key), "r") as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Profiles written by an older layout are recomputed
+        return profile if profile.get("version") == PROFILE_VERSION else None
+
+    def _write_profile(self, key: str, profile: Dict[str, Any]) -> None:
+        with open(self._profile_path(key), "w") as f:
+            json.dump(profile, f)
+
+    def _touch(self, path: str) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _stored_files(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".parquet"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name[:-len(".parquet")], path))
+        return files
+
+    def _disk_usage(self) -> int:
+        return sum(size for _, size, _, _ in self._stored_files())
+
+    def _enforce_disk_budget(self, keep: str) -> None:
+        files = sorted(self._stored_files())
+        usage = sum(size for _, size, _, _ in files)
+        for _, size, key, path in files:
+            if usage <= self.max_disk_bytes:
+                break
+            # Datasets being loaded, in memory or in use by a session stay on
+            # disk: the python workers and the SQL tool load them from there
+            if key == keep or key in self._entries or key in self._key_locks:
+                continue
+            if self.in_use is not None and self.in_use(key):
+                continue
+            for stale in (path, self._profile_path(key)):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            usage -= size
@@ -0,0 +1,169 @@
+"""
+Server-side windows over a dataset, for previews of uploads too large to
+send to the browser.
+
+The DataFrame stays in the serving process (the dataset cache keeps it, with
+its Parquet copy on disk); clients ask for one page of rows at a time,
+optionally filtered and sorted, and for column statistics when they need
+them. Filter and sort results are kept as row positions, so paging through a
+sorted view of millions of rows sorts once.
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from schema_profile import profile_column
+
+
+# Defaults, overridable through the environment
+DEFAULT_PAGE_ROWS = int(os.getenv("DATASET_VIEW_PAGE_ROWS", "50"))
+MAX_PAGE_ROWS = int(os.getenv("DATASET_VIEW_MAX_PAGE_ROWS", "1000"))
+DEFAULT_ORDER_CACHE_SIZE = int(os.getenv("DATASET_VIEW_ORDER_CACHE", "8"))
+TOP_VALUES = 10
+
+FILTER_OPERATORS = ("==", "!=", ">", ">=", "<", "<=", "contains")
+
+
+@dataclass(frozen=True)
+class RowFilter:
+    """Keep rows whose `column` compares to `value` with `operator`."""
+    column: str
+    operator: str
+    value: str
+
+
+@dataclass
+class Page:
+    """One window of a (filtered, sorted) view."""
+    rows: pd.DataFrame
+    offset: int
+    limit: int
+    total_rows: int
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-self.total_rows // self.limit))
+
+
+class DatasetView:
+    """
+    Pages, filters, sorts and summarizes one DataFrame on the server.
+
+    The row positions of the last `order_cache_size` filter/sort
+    combinations are cached, as are column statistics.
+    """
+
+    def __init__(self, df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None,
+                 order_cache_size: int = DEFAULT_ORDER_CACHE_SIZE):
+        self.df = df
+        self.order_cache_size = order_cache_size
+        self._profiles = {column["name"]: column for column in (profile or {}).get("columns", [])}
+        self._orders: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self):
+        return [str(column) for column in self.df.columns]
+
+    def page(self, offset: int = 0, limit: int = DEFAULT_PAGE_ROWS, sort_by: Optional[str] = None,
+             ascending: bool = True, filters: Sequence[RowFilter] = ()) -> Page:
+        """Return `limit` rows starting at `offset` of the filtered and sorted view."""
+        limit = max(1, min(int(limit), MAX_PAGE_ROWS))
+        positions = self._positions(sort_by or None, ascending, tuple(filters))
+        total = len(self.df) if positions is None else len(positions)
+        offset = max(0, min(int(offset), max(total - 1, 0)))
+        if positions is None:
+            rows = self.df.iloc[offset:offset + limit]
+        else:
+            rows = self.df.iloc[positions[offset:offset + limit]]
+        return Page(rows=rows, offset=offset, limit=limit, total_rows=total)
+
+    def column_stats(self, column: str) -> Dict[str, Any]:
+        """Summarize a column: its profile plus quartiles or most frequent values."""
+        with self._lock:
+            cached = self._stats.get(column)
+        if cached is not None:
+            return cached
+        series = self._column(column)
+        stats = dict(self._profiles.get(column) or profile_column(series))
+        values = series.dropna()
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            if len(values):
+                quantiles = values.astype("float64").quantile([0.25, 0.5, 0.75])
+                stats.update(mean=float(values.mean()), std=float(values.std()),
+                             p25=float(quantiles[0.25]), median=float(quantiles[0.5]), p75=float(quantiles[0.75]))
+        else:
+            counts = values.astype(str).value_counts().head(TOP_VALUES)
+            stats["top_values"] = {str(value): int(count) for value, count in counts.items()}
+        with self._lock:
+            self._stats[column] = stats
+        return stats
+
+    def _positions(self, sort_by: Optional[str], ascending: bool,
+                   filters: Tuple[RowFilter, ...]) -> Optional[np.ndarray]:
+        """Row positions of the view, or None for all rows in their stored order."""
+        if sort_by is None and not filters:
+            return None
+        key = (sort_by, ascending, filters)
+        with self._lock:
+            positions = self._orders.get(key)
+            if positions is not None:
+                self._orders.move_to_end(key)
+                return positions
+
+        if filters:
+            mask = np.ones(len(self.df), dtype=bool)
+            for row_filter in filters:
+                mask &= self._mask(row_filter)
+            positions = np.flatnonzero(mask)
+        else:
+            positions = np.arange(len(self.df))
+        if sort_by is not None:
+            values = self._column(sort_by).iloc[positions].reset_index(drop=True)
+            order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+            positions = positions[order]
+
+        with self._lock:
+            self._orders[key] = positions
+            while len(self._orders) > self.order_cache_size:
+                self._orders.popitem(last=False)
+        return positions
+
+    def _mask(self, row_filter: RowFilter) -> np.ndarray:
+        if row_filter.operator not in FILTER_OPERATORS:
+            raise ValueError(f"Unknown filter operator {row_filter.operator!r}; use one of {', '.join(FILTER_OPERATORS)}.")
+        series = self._column(row_filter.column)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Unordered categoricals only compare for equality; compare their values instead
+            series = series.astype(series.cat.categories.dtype)
+        if row_filter.operator == "contains":
+            matches = series.astype(str).str.contains(row_filter.value, case=False, regex=False)
+            return (matches & series.notna()).to_numpy(dtype=bool)
+        value = _coerce(series, row_filter.value)
+        comparison = {
+            "==": series.__eq__, "!=": series.__ne__, ">": series.__gt__,
+            ">=": series.__ge__, "<": series.__lt__, "<=": series.__le__,
+        }[row_filter.operator](value)
+        return comparison.fillna(False).to_numpy(dtype=bool)
+
+    def _column(self, column: str) -> pd.Series:
+        if column not in self.columns:
+            raise KeyError(f"Unknown column {column!r}.")
+        return self.df.iloc[:, self.columns.index(column)]
+
+
+def _coerce(series: pd.Series, value: str) -> Any:
+    """Convert a filter value typed by a user to the column's type."""
+    if pd.api.types.is_bool_dtype(series):
+        return value.strip().lower() in ("1", "true", "yes")
+    if pd.api.types.is_numeric_dtype(series):
+        return float(value)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    return value
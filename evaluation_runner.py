@@ -0,0 +1,370 @@
+"""
+Batch accuracy and latency evaluation for the financial CSV agents.
+
+Runs every case of a question file against the native `cohere_agent` loop or
+the langchain csv agent, scores numeric answers against ground truth and
+writes one row per use case in the `evaluation_results.csv` schema
+(usecase,run,score,temperature,tokens,latency), so the results can be
+analyzed with the `analyze_evaluation_results` tool.
+
+Example:
+    python evaluation_runner.py financial-csv-agent/evaluation_questions.json \\
+        --agent native --run B --offline financial-csv-agent/evaluation_recordings.json \\
+        --baseline-run A
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from answer_scoring import score_answer
+from schema_profile import head_preview, preamble_savings, profile_file, render_preamble
+from token_usage import TokenUsage, TokenUsageHandler
+
+
+RESULT_COLUMNS = ["usecase", "run", "score", "temperature", "tokens", "latency"]
+
+NATIVE_TOOLS = [
+    {
+        "name": "run_python_code",
+        "description": "given a python code, runs it",
+        "parameter_definitions": {
+            "code": {
+                "description": "executable python code",
+                "type": "str",
+                "required": True
+            }
+        }
+    },
+]
+
+NATIVE_PREAMBLE = """
+You are an expert who answers the user's question in complete sentences. You are working with pandas dataframes in Python. Ensure your output is a string.
+The dataframes are already loaded in the python tool under the names given below.
+{schema}
+"""
+
+
+@dataclass
+class EvaluationCase:
+    usecase: str
+    question: str
+    expected: Any = None
+    tolerance: float = 1e-6
+
+
+@dataclass
+class CaseResult:
+    usecase: str
+    score: float
+    tokens: int
+    latency: float
+    answer: str = ""
+    error: Optional[str] = None
+    verify_tokens: int = 0
+    verify_latency: float = 0.0
+
+
+@dataclass
+class Verification:
+    """An agent run that checked a planner answer, reported apart from the planner's own cost."""
+    tokens: int
+    latency: float
+
+
+@dataclass
+class QuestionFile:
+    cases: List[EvaluationCase]
+    tables: Dict[str, str] = field(default_factory=dict)
+
+
+def load_question_file(path: str) -> QuestionFile:
+    """
+    Load evaluation cases from JSON or CSV.
+
+    JSON files hold {"tables": {name: csv_path}, "cases": [...]}, with table
+    paths relative to the file. CSV files have usecase, question, expected
+    and optional tolerance columns.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    if path.endswith(".csv"):
+        rows = pd.read_csv(path, encoding="utf-8-sig").to_dict("records")
+        tables = {}
+    else:
+        with open(path, "r") as f:
+            data = json.load(f)
+        rows = data["cases"]
+        tables = {name: os.path.join(base, table) for name, table in data.get("tables", {}).items()}
+
+    cases = []
+    for row in rows:
+        tolerance = row.get("tolerance")
+        cases.append(EvaluationCase(
+            usecase=str(row["usecase"]),
+            question=str(row["question"]),
+            expected=row.get("expected"),
+            tolerance=1e-6 if tolerance is None or pd.isna(tolerance) else float(tolerance),
+        ))
+    return QuestionFile(cases=cases, tables=tables)
+
+
+def run_case(case: EvaluationCase, ask: Callable[[str], Tuple[str, TokenUsage]]) -> CaseResult:
+    """
+    Ask one question, timing it and isolating failures.
+
+    `ask` may return a `Verification` after the answer and usage; its agent
+    run is reported separately and not counted in the answer's latency.
+    """
+    started = time.perf_counter()
+    verification = None
+    try:
+        answer, usage, *rest = ask(case.question)
+        verification = rest[0] if rest else None
+        error = None
+    except Exception as e:
+        answer, usage, error = "", TokenUsage(), repr(e)
+    latency = time.perf_counter() - started - (verification.latency if verification else 0.0)
+    return CaseResult(usecase=case.usecase,
+                      score=score_answer(answer, case.expected, case.tolerance),
+                      tokens=usage.total_tokens, latency=latency, answer=answer, error=error,
+                      verify_tokens=verification.tokens if verification else 0,
+                      verify_latency=verification.latency if verification else 0.0)
+
+
+def run_cases(cases: List[EvaluationCase], ask: Callable[[str], Tuple[str, TokenUsage]],
+              repeats: int = 1, concurrency: int = 4) -> List[CaseResult]:
+    """Run every case `repeats` times with up to `concurrency` runs in flight."""
+    jobs = [case for case in cases for _ in range(repeats)]
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return list(pool.map(lambda case: run_case(case, ask), jobs))
+
+
+def summarize(results: List[CaseResult], run: str, temperature: float) -> List[dict]:
+    """Average repeated runs into one `evaluation_results.csv` row per use case."""
+    frame = pd.DataFrame([r.__dict__ for r in results])
+    rows = []
+    for usecase, group in frame.groupby("usecase", sort=False):
+        rows.append({
+            "usecase": usecase,
+            "run": run,
+            "score": round(float(group["score"].mean()), 4),
+            "temperature": temperature,
+            "tokens": int(round(group["tokens"].mean())),
+            "latency": round(float(group["latency"].mean()), 2),
+        })
+    return rows
+
+
+def write_results(rows: List[dict], path: str) -> None:
+    """Append rows to a results CSV, writing the header if the file is new."""
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    missing_newline = False
+    if not new_file:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            missing_newline = f.read(1) != b"\n"
+    with open(path, "a", newline="") as f:
+        if missing_newline:
+            f.write("\n")
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, lineterminator="\n")
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def compare_runs(baseline: pd.DataFrame, rows: List[dict],
+                 max_score_drop: float = 0.0, max_latency_increase: float = 0.5) -> List[str]:
+    """
+    Compare a run against a baseline run and describe every regression.
+
+    A use case regresses if its score drops by more than `max_score_drop` or
+    its latency grows by more than `max_latency_increase` (relative).
+    """
+    regressions = []
+    baseline = baseline.groupby("usecase")[["score", "latency"]].mean()
+    for row in rows:
+        if row["usecase"] not in baseline.index:
+            continue
+        before = baseline.loc[row["usecase"]]
+        if row["score"] < before["score"] - max_score_drop:
+            regressions.append(f"{row['usecase']}: score {before['score']:.3f} -> {row['score']:.3f}")
+        if before["latency"] > 0 and row["latency"] > before["latency"] * (1 + max_latency_increase):
+            regressions.append(f"{row['usecase']}: latency {before['latency']:.2f}s -> {row['latency']:.2f}s")
+    return regressions
+
+
+def schema_preamble(tables: Dict[str, str]) -> str:
+    """Render the tables' schema preamble and report its savings over head() previews."""
+    preamble = render_preamble({name: profile_file(path) for name, path in tables.items()})
+    frames = {name: pd.read_csv(path, encoding="utf-8-sig") for name, path in tables.items()}
+    savings = preamble_savings(preamble, head_preview(frames))
+    print(f"schema preamble: ~{savings['preamble_tokens']} tokens instead of "
+          f"~{savings['preview_tokens']} for head(3) previews "
+          f"({savings['saved_ratio']:.0%} fewer per LLM call)", file=sys.stderr)
+    return preamble
+
+
+def native_asker(tables: Dict[str, str], co: Any, model: str, temperature: float) -> Callable[[str], Tuple[str, TokenUsage]]:
+    """Build an `ask` function over the native cohere_agent loop."""
+    from cohere_agent import ToolDispatcher, cohere_agent
+    from python_pool import get_default_pool
+
+    # Start the python workers up front so their warm-up is not timed
+    pool = get_default_pool()
+    pool.start()
+    preamble = NATIVE_PREAMBLE.format(schema=schema_preamble(tables))
+    dispatcher = ToolDispatcher({"run_python_code": lambda code: {"python_answer": pool.run(code, frames=tables)}})
+
+    def ask(question: str) -> Tuple[str, TokenUsage]:
+        usage = TokenUsage()
+        answer = cohere_agent(question, preamble, NATIVE_TOOLS, co=co, model=model,
+                              temperature=temperature, dispatcher=dispatcher, usage=usage)
+        return answer, usage
+
+    return ask
+
+
+def csv_agent_asker(tables: Dict[str, str], llm: Any) -> Callable[[str], Tuple[str, TokenUsage]]:
+    """Build an `ask` function over the langchain csv agent."""
+    from csv_agent import create_dataframe_agent
+    from python_pool import get_default_pool
+
+    get_default_pool().start()
+    frames = {name: pd.read_csv(path) for name, path in tables.items()}
+    schema_preamble(tables)
+    agent = create_dataframe_agent(llm, frames, data_paths=tables, verbose=False,
+                                   profiles={name: profile_file(path) for name, path in tables.items()})
+
+    def ask(question: str) -> Tuple[str, TokenUsage]:
+        handler = TokenUsageHandler()
+        response = agent.invoke({"input": question}, config={"callbacks": [handler]})
+        return response.get("output"), handler.usage
+
+    return ask
+
+
+def planner_asker(tables: Dict[str, str], ask: Callable[[str], Tuple[str, TokenUsage]],
+                  verify: bool = False) -> Tuple[Callable[[str], Tuple[str, TokenUsage]], Any]:
+    """
+    Put the deterministic query planner in front of an `ask` function.
+
+    With `verify`, the agent also answers every question the planner handled,
+    and the planner records whether the two agree; that run's tokens and
+    latency come back as a `Verification`, not as the planner's.
+    """
+    from csv_ingest import ingest_csv
+    from query_planner import QueryPlanner
+
+    frames = {}
+    for name, path in tables.items():
+        with open(path, "rb") as f:
+            frames[name] = ingest_csv(f)
+    planner = QueryPlanner(frames)
+
+    def ask_with_planner(question: str) -> Tuple[str, TokenUsage]:
+        planned = planner.answer(question)
+        if planned is None:
+            return ask(question)
+        if not verify:
+            return planned.text, TokenUsage()
+        started = time.perf_counter()
+        answer, usage = ask(question)
+        latency = time.perf_counter() - started
+        planner.check_agreement(planned, answer)
+        return planned.text, TokenUsage(), Verification(tokens=usage.total_tokens, latency=latency)
+
+    return ask_with_planner, planner
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run accuracy and latency evaluations for the CSV agents.")
+    parser.add_argument("questions", help="JSON or CSV question file with expected answers")
+    parser.add_argument("--agent", choices=["native", "csv"], default="native")
+    parser.add_argument("--run", default="A", help="label written to the `run` column")
+    parser.add_argument("--model", default=os.getenv("COHERE_MODEL", "command-r-plus"))
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--table", action="append", default=[], metavar="NAME=PATH",
+                        help="extra or overriding table for the agent")
+    parser.add_argument("--offline", metavar="RECORDINGS",
+                        help="replay recorded LLM responses instead of calling Cohere")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated LLM latency when offline")
+    parser.add_argument("--output", default="evaluation_results.csv")
+    parser.add_argument("--baseline-run", help="fail if this run regresses against the given run label")
+    parser.add_argument("--max-score-drop", type=float, default=0.0)
+    parser.add_argument("--max-latency-increase", type=float, default=0.5)
+    parser.add_argument("--planner", action="store_true",
+                        help="answer simple aggregate questions with the query planner, without the LLM")
+    parser.add_argument("--planner-verify", action="store_true",
+                        help="with --planner, also run the agent on planned questions and report agreement")
+    args = parser.parse_args(argv)
+
+    question_file = load_question_file(args.questions)
+    tables = dict(question_file.tables)
+    for item in args.table:
+        name, path = item.split("=", 1)
+        tables[name] = path
+
+    if args.agent == "native":
+        if args.offline:
+            from fake_llm import RecordedCohereClient, load_recordings
+            co = RecordedCohereClient(load_recordings(args.offline), latency=args.latency)
+        else:
+            import cohere
+            co = cohere.Client(api_key=os.environ["COHERE_API_KEY"])
+        ask = native_asker(tables, co, args.model, args.temperature)
+    else:
+        if args.offline:
+            from fake_llm import FakeChatModel, load_recordings
+            llm = FakeChatModel(recordings=load_recordings(args.offline), latency=args.latency,
+                                model=args.model, temperature=args.temperature)
+        else:
+            from langchain_cohere import ChatCohere
+            llm = ChatCohere(cohere_api_key=os.environ["COHERE_API_KEY"],
+                             model=args.model, temperature=args.temperature)
+        ask = csv_agent_asker(tables, llm)
+
+    planner = None
+    if args.planner:
+        ask, planner = planner_asker(tables, ask, verify=args.planner_verify)
+
+    results = run_cases(question_file.cases, ask, repeats=args.repeats, concurrency=args.concurrency)
+    for result in results:
+        status = f"error: {result.error}" if result.error else f"score={result.score:g}"
+        verify_note = (f" verify_tokens={result.verify_tokens} verify_latency={result.verify_latency:.2f}s"
+                       if result.verify_latency else "")
+        print(f"{result.usecase}: {status} tokens={result.tokens} latency={result.latency:.2f}s{verify_note}")
+    if planner is not None:
+        print(f"query planner: {planner.stats.as_dict()}", file=sys.stderr)
+        verified = [result for result in results if result.verify_latency]
+        if verified:
+            print(f"planner verification: {len(verified)} agent runs, "
+                  f"{sum(result.verify_tokens for result in verified)} tokens, "
+                  f"{sum(result.verify_latency for result in verified):.2f}s", file=sys.stderr)
+
+    rows = summarize(results, args.run, args.temperature)
+    baseline = None
+    if args.baseline_run and os.path.exists(args.output):
+        previous = pd.read_csv(args.output, encoding="utf-8-sig")
+        baseline = previous[previous["run"].astype(str) == args.baseline_run]
+    write_results(rows, args.output)
+
+    if baseline is not None and not baseline.empty:
+        regressions = compare_runs(baseline, rows, args.max_score_drop, args.max_latency_increase)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
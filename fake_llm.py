@@ -0,0 +1,186 @@
+"""
+Offline stand-ins for the Cohere LLM, for evaluation and load tests.
+
+Both fakes replay scripted steps per question. A recording maps a question
+to the list of steps the model takes for it:
+
+    {"what is the highest value of cost of goods and service?": [
+        {"tool_calls": [{"name": "run_python_code",
+                         "parameters": {"code": "print(df['CostOfGoodsAndServicesSold'].max())"}}],
+         "input_tokens": 950, "output_tokens": 40},
+        {"text": "The highest value is 169559000000.", "input_tokens": 1010, "output_tokens": 25}
+    ]}
+
+Questions are matched after `normalize_question`; unknown questions get
+`default_steps`.
+"""
+import json
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from text_utils import normalize_question
+
+
+DEFAULT_STEPS = [{"text": "I could not find a recorded answer for this question."}]
+
+# The langchain csv agent calls its python tool `python_interpreter`
+DEFAULT_TOOL_ALIASES = {"run_python_code": "python_interpreter"}
+
+
+def load_recordings(path: str) -> Dict[str, List[dict]]:
+    """Load a recording file, normalizing its questions."""
+    with open(path, "r") as f:
+        recordings = json.load(f)
+    return {normalize_question(question): steps for question, steps in recordings.items()}
+
+
+def _step(steps: List[dict], index: int) -> dict:
+    # Past the end of a script the model only gives its final text
+    if index < len(steps):
+        return steps[index]
+    return {"text": steps[-1].get("text", "") if steps else ""}
+
+
+class RecordedCohereClient:
+    """Replays recorded `co.chat` responses for the native `cohere_agent` loop."""
+
+    def __init__(self, recordings: Dict[str, List[dict]], latency: float = 0.0,
+                 default_steps: Optional[List[dict]] = None):
+        self.recordings = {normalize_question(q): steps for q, steps in recordings.items()}
+        self.latency = latency
+        self.default_steps = default_steps or DEFAULT_STEPS
+
+    def chat(self, message: str = "", chat_history: Optional[list] = None, **kwargs) -> Any:
+        if self.latency:
+            time.sleep(self.latency)
+        if message:
+            conversation, index = normalize_question(message), 0
+        else:
+            previous = chat_history[-1]
+            conversation, index = previous["conversation"], previous["step"] + 1
+
+        spec = _step(self.recordings.get(conversation, self.default_steps), index)
+        tool_calls = [SimpleNamespace(name=call["name"], parameters=call.get("parameters", {}))
+                      for call in spec.get("tool_calls", [])]
+        billed = SimpleNamespace(input_tokens=spec.get("input_tokens", 0),
+                                 output_tokens=spec.get("output_tokens", 0))
+        return SimpleNamespace(
+            text=spec.get("text", ""),
+            tool_calls=tool_calls,
+            chat_history=[{"conversation": conversation, "step": index}],
+            meta=SimpleNamespace(billed_units=billed),
+        )
+
+
+class RecordingCohereClient:
+    """Wraps a real Cohere client and records its responses for offline replay."""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.recordings: Dict[str, List[dict]] = {}
+        self._conversations: Dict[int, str] = {}
+
+    def chat(self, message: str = "", chat_history: Optional[list] = None, **kwargs) -> Any:
+        response = self.client.chat(message=message, chat_history=chat_history, **kwargs)
+        conversation = message or self._conversations.get(id(chat_history), "")
+        if message:
+            self.recordings[conversation] = []
+        self._conversations[id(response.chat_history)] = conversation
+        billed = getattr(getattr(response, "meta", None), "billed_units", None)
+        self.recordings[conversation].append({
+            "text": response.text,
+            "tool_calls": [{"name": call.name, "parameters": call.parameters}
+                           for call in (response.tool_calls or [])],
+            "input_tokens": int(getattr(billed, "input_tokens", 0) or 0),
+            "output_tokens": int(getattr(billed, "output_tokens", 0) or 0),
+        })
+        return response
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.recordings, f, indent=2)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Langchain chat model that replays scripted steps, for the csv agent path.
+
+    `latency` is slept before every response to mimic an API round trip.
+    """
+
+    recordings: Dict[str, List[dict]] = {}
+    default_steps: List[dict] = DEFAULT_STEPS
+    tool_aliases: Dict[str, str] = DEFAULT_TOOL_ALIASES
+    latency: float = 0.0
+    model: str = "fake-command-r-plus"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-cohere-chat"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "FakeChatModel":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        """Stream the scripted text word by word; `latency` is spread over the words."""
+        message = self._respond(messages)
+        words = re.findall(r"\S+\s*", message.content) or [""]
+        for position, word in enumerate(words):
+            if self.latency:
+                time.sleep(self.latency / len(words))
+            last = position == len(words) - 1
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=word,
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                    for i, call in enumerate(message.tool_calls)
+                ] if last else [],
+                usage_metadata=message.usage_metadata if last else None,
+            ))
+            if run_manager and word:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        index = sum(isinstance(message, AIMessage) for message in messages)
+        spec = _step(self._steps_for(messages), index)
+        tool_calls = [
+            {"name": self.tool_aliases.get(call["name"], call["name"]),
+             "args": call.get("parameters", {}),
+             "id": f"call_{index}_{position}",
+             "type": "tool_call"}
+            for position, call in enumerate(spec.get("tool_calls", []))
+        ]
+        input_tokens = spec.get("input_tokens", 0)
+        output_tokens = spec.get("output_tokens", 0)
+        return AIMessage(
+            content=spec.get("text", ""),
+            tool_calls=tool_calls,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens,
+                            "total_tokens": input_tokens + output_tokens},
+        )
+
+    def _steps_for(self, messages: List[BaseMessage]) -> List[dict]:
+        # The question is the last human message before the model's first reply
+        question = ""
+        for message in messages:
+            if isinstance(message, AIMessage):
+                break
+            if isinstance(message, HumanMessage):
+                question = message.content
+        recordings = {normalize_question(q): steps for q, steps in self.recordings.items()}
+        return recordings.get(normalize_question(question), self.default_steps)
@@ -0,0 +1,345 @@
+"""
+Load test for the FastAPI CSV agent app, with no network or API key needed.
+
+Starts `Nader_csv_agent_app.app` in a child process with `ChatCohere`
+replaced by `fake_llm.FakeChatModel`, which sleeps `--latency` seconds per
+LLM call and replays scripted tool calls against the uploaded DataFrame.
+Virtual users then drive mixed `/upload-csv` and `/ask-question` traffic at
+each concurrency level in turn, and every stage reports p50/p95/p99 latency,
+throughput, error and rejection rates and the server's RSS growth.
+
+Example:
+    python load_test.py --concurrency 1,4,16,64 --duration 20 --latency 0.2 \\
+        --json load_test_results.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Steps the fake LLM takes for any question: two python tool calls, then an answer
+LOAD_TEST_STEPS = [
+    {"tool_calls": [{"name": "python_interpreter",
+                     "parameters": {"code": "print(df.describe().to_string())"}}],
+     "input_tokens": 1200, "output_tokens": 40},
+    {"tool_calls": [{"name": "python_interpreter",
+                     "parameters": {"code": "print(df.select_dtypes('number').sum().max())"}}],
+     "input_tokens": 1600, "output_tokens": 35},
+    {"text": "The largest column total is shown above.", "input_tokens": 1700, "output_tokens": 20},
+]
+
+# Questions that repeat across users, so the answer cache gets exercised too
+COMMON_QUESTIONS = [
+    "What is the largest column total?",
+    "Describe the dataset.",
+    "Which column has the highest mean?",
+    "How many rows are there?",
+]
+
+COLUMNS = ["Revenue", "CostOfRevenue", "GrossProfit", "OperatingExpenses", "NetIncomeLoss"]
+
+
+@dataclass
+class Sample:
+    kind: str  # "upload" or "ask"
+    seconds: float
+    outcome: str  # "ok", "rejected" or "error"
+
+
+@dataclass
+class StageResult:
+    concurrency: int
+    duration: float
+    samples: List[Sample] = field(default_factory=list)
+    rss_start: Optional[int] = None
+    rss_end: Optional[int] = None
+
+    def summary(self) -> dict:
+        summary = {
+            "concurrency": self.concurrency,
+            "requests": len(self.samples),
+            "throughput": round(len(self.samples) / self.duration, 2) if self.duration else 0.0,
+            "error_rate": _rate(self.samples, "error"),
+            "rejected_rate": _rate(self.samples, "rejected"),
+            "rss_start_mb": _megabytes(self.rss_start),
+            "rss_end_mb": _megabytes(self.rss_end),
+            "rss_growth_mb": (_megabytes(self.rss_end - self.rss_start)
+                              if self.rss_start is not None and self.rss_end is not None else None),
+        }
+        for kind in ("all", "upload", "ask"):
+            latencies = [s.seconds for s in self.samples
+                         if s.outcome == "ok" and kind in ("all", s.kind)]
+            for q in (50, 95, 99):
+                summary[f"{kind}_p{q}_ms"] = _percentile_ms(latencies, q)
+        return summary
+
+
+def _rate(samples: List[Sample], outcome: str) -> float:
+    if not samples:
+        return 0.0
+    return round(sum(s.outcome == outcome for s in samples) / len(samples), 4)
+
+
+def _percentile_ms(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    return round(float(np.percentile(values, q)) * 1000, 1)
+
+
+def _megabytes(nbytes: Optional[int]) -> Optional[float]:
+    return None if nbytes is None else round(nbytes / (1024 * 1024), 1)
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """
+    Resident memory of a process and all its descendants, in bytes.
+
+    The python tool runs in worker processes, so their memory counts too.
+    Returns None where /proc is not available.
+    """
+    pids, total = [pid], 0
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f"/proc/{current}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children", "r") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+    return total
+
+
+def make_csv(rows: int, seed: int) -> bytes:
+    """Build a synthetic financial CSV; the same seed gives the same bytes."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.integers(0, 10 ** 9, size=(rows, len(COLUMNS))), columns=COLUMNS)
+    df.insert(0, "Year", np.arange(2000, 2000 + rows))
+    return df.to_csv(index=False).encode()
+
+
+def build_fake_llm(latency: float, recordings: Optional[str] = None):
+    from fake_llm import FakeChatModel, load_recordings
+    return FakeChatModel(recordings=load_recordings(recordings) if recordings else {},
+                         default_steps=LOAD_TEST_STEPS, latency=latency)
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Run the app with the fake LLM; this is the child process of `main`."""
+    import uvicorn
+
+    import Nader_csv_agent_app as app_module
+
+    # The dataset cache builds agents over the module's `llm` when a dataset is loaded
+    app_module.llm.set(build_fake_llm(args.latency, args.recordings))
+    uvicorn.run(app_module.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def start_server(args: argparse.Namespace, port: int, dataset_dir: str) -> subprocess.Popen:
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+               "--latency", str(args.latency)]
+    if args.recordings:
+        command += ["--recordings", args.recordings]
+    env = dict(os.environ, DATASET_DIR=dataset_dir)
+    # The agents print every step; keep only the server's errors
+    return subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL)
+
+
+async def wait_until_ready(client, server: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            # 200 once the warm-up has loaded the agent modules and python workers
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready in time")
+
+
+class VirtualUser:
+    """One browser session: uploads a dataset, then mostly asks questions."""
+
+    def __init__(self, base_url: str, args: argparse.Namespace, rng: random.Random):
+        import httpx
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=args.timeout)
+        self.args = args
+        self.rng = rng
+        self.uploaded = False
+
+    async def step(self) -> Sample:
+        if not self.uploaded or self.rng.random() < self.args.upload_ratio:
+            return await self._upload()
+        return await self._ask()
+
+    async def _upload(self) -> Sample:
+        # Reused seeds hit the dataset cache; fresh ones are parsed from scratch
+        if self.rng.random() < self.args.repeat_ratio:
+            seed = self.rng.randrange(self.args.datasets)
+        else:
+            seed = self.args.datasets + self.rng.randrange(10 ** 9)
+        files = {"file": ("load_test.csv", io.BytesIO(make_csv(self.args.rows, seed)), "text/csv")}
+        sample = await self._timed("upload", self.client.post("/upload-csv", files=files))
+        if sample.outcome == "ok":
+            self.uploaded = True
+        return sample
+
+    async def _ask(self) -> Sample:
+        if self.rng.random() < self.args.repeat_ratio:
+            question = self.rng.choice(COMMON_QUESTIONS)
+        else:
+            question = f"What is the total of {self.rng.choice(COLUMNS)} (request {uuid.uuid4().hex[:8]})?"
+        return await self._timed("ask", self.client.post("/ask-question", data={"question": question}))
+
+    async def _timed(self, kind: str, request) -> Sample:
+        started = time.perf_counter()
+        try:
+            response = await request
+            # Both endpoints redirect on success and answer 200 with an error body otherwise
+            if response.status_code == 303:
+                outcome = "ok"
+            elif response.status_code == 503:
+                outcome = "rejected"
+            else:
+                outcome = "error"
+        except Exception:
+            outcome = "error"
+        return Sample(kind=kind, seconds=time.perf_counter() - started, outcome=outcome)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+async def run_stage(base_url: str, args: argparse.Namespace, concurrency: int,
+                    server_pid: int, rng: random.Random) -> StageResult:
+    users = [VirtualUser(base_url, args, random.Random(rng.random())) for _ in range(concurrency)]
+    result = StageResult(concurrency=concurrency, duration=args.duration,
+                         rss_start=process_tree_rss(server_pid))
+    deadline = time.perf_counter() + args.duration
+
+    async def drive(user: VirtualUser) -> None:
+        while time.perf_counter() < deadline:
+            sample = await user.step()
+            result.samples.append(sample)
+            if sample.outcome == "rejected":
+                await asyncio.sleep(args.retry_delay)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(drive(user) for user in users))
+    result.duration = time.perf_counter() - started
+    result.rss_end = process_tree_rss(server_pid)
+    await asyncio.gather(*(user.close() for user in users))
+    return result
+
+
+def print_summary(summaries: List[dict]) -> None:
+    columns = ["concurrency", "requests", "throughput", "all_p50_ms", "all_p95_ms", "all_p99_ms",
+               "ask_p95_ms", "upload_p95_ms", "error_rate", "rejected_rate", "rss_end_mb", "rss_growth_mb"]
+    print(pd.DataFrame(summaries)[columns].to_string(index=False))
+
+
+async def run(args: argparse.Namespace) -> Dict[str, object]:
+    import httpx
+
+    port = args.port or _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="csv_agent_load_test_") as dataset_dir:
+        server = start_server(args, port, dataset_dir)
+        try:
+            async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+                await wait_until_ready(client, server)
+                rng = random.Random(args.seed)
+
+                # Start the python workers before measuring, so stage one's RSS is not all warm-up
+                warmup = VirtualUser(base_url, args, random.Random(args.seed))
+                await warmup.step()
+                await warmup.step()
+                await warmup.close()
+
+                summaries = []
+                for concurrency in args.concurrency:
+                    stage = await run_stage(base_url, args, concurrency, server.pid, rng)
+                    summaries.append(stage.summary())
+                    print(f"concurrency={concurrency}: {len(stage.samples)} requests "
+                          f"in {stage.duration:.1f}s", file=sys.stderr)
+                server_stats = {}
+                for name in ("sessions", "datasets", "answers", "questions"):
+                    server_stats[name] = (await client.get(f"/{name}/stats")).json()
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+    return {"stages": summaries, "server": server_stats}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _concurrency_levels(value: str) -> List[int]:
+    return [int(level) for level in value.split(",") if level.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the FastAPI CSV agent app with a fake LLM.")
+    parser.add_argument("--concurrency", type=_concurrency_levels, default=[1, 4, 16, 64],
+                        help="comma separated virtual user counts, one stage each")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per stage")
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated seconds per LLM call")
+    parser.add_argument("--recordings", help="scripted steps per question (see fake_llm.py)")
+    parser.add_argument("--upload-ratio", type=float, default=0.1,
+                        help="share of requests that upload a dataset once a user has one")
+    parser.add_argument("--repeat-ratio", type=float, default=0.5,
+                        help="share of uploads and questions that repeat earlier ones")
+    parser.add_argument("--datasets", type=int, default=4, help="number of distinct repeated datasets")
+    parser.add_argument("--rows", type=int, default=1000, help="rows per uploaded CSV")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client request timeout")
+    parser.add_argument("--retry-delay", type=float, default=0.5, help="back-off after a 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args)
+        return 0
+
+    report = asyncio.run(run(args))
+    print_summary(report["stages"])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    errors = sum(stage["error_rate"] for stage in report["stages"])
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
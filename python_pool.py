@@ -0,0 +1,395 @@
+import ast
+import contextlib
+import io
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import tracing
+from chart_store import publish_charts
+
+
+# Defaults, overridable through the environment
+DEFAULT_POOL_SIZE = int(os.getenv("PYTHON_WORKERS", "2"))
+DEFAULT_TIMEOUT = float(os.getenv("PYTHON_WORKER_TIMEOUT", "30"))
+DEFAULT_MEMORY_LIMIT = int(os.getenv("PYTHON_WORKER_MEMORY_BYTES", str(4 * 1024 * 1024 * 1024)))
+DEFAULT_FRAME_CACHE_SIZE = int(os.getenv("PYTHON_WORKER_FRAME_CACHE", "8"))
+DEFAULT_CHART_DPI = int(os.getenv("PYTHON_WORKER_CHART_DPI", "100"))
+
+
+def sanitize_code(code: str) -> str:
+    """Strip whitespace and markdown code fences the model wraps around its code."""
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", code)
+    return re.sub(r"(\s|`)*$", "", code)
+
+
+# ---------------------------------------------------------------------------
+# Worker process side
+# ---------------------------------------------------------------------------
+
+def _load_frame(path: str):
+    from csv_ingest import ingest_csv, load_dataset
+    from workspace import ARROW_SUFFIX, map_frame
+    if path.endswith(".parquet"):
+        return load_dataset(path)
+    if path.endswith(ARROW_SUFFIX):
+        # Workspace tables are mapped, so every worker shares the same pages
+        return map_frame(path)
+    # Parse CSVs like uploads are, so frames match their schema profiles
+    with open(path, "rb") as f:
+        return ingest_csv(f)
+
+
+def _get_frame(cache: "OrderedDict", path: str, cache_size: int):
+    """Return a DataFrame by path, reusing it while the file is unchanged."""
+    mtime = os.path.getmtime(path)
+    cached = cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        cache.move_to_end(path)
+        return cached[1]
+    df = _load_frame(path)
+    cache[path] = (mtime, df)
+    while len(cache) > cache_size:
+        cache.popitem(last=False)
+    return df
+
+
+def _execute(code: str, namespace: dict) -> str:
+    """
+    Run code like a notebook cell: capture stdout and, if the last statement
+    is an expression, append its value.
+    """
+    output = io.StringIO()
+    try:
+        tree = ast.parse(code)
+        last = tree.body[-1] if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+        body = ast.Module(body=tree.body[:-1] if last else tree.body, type_ignores=[])
+        with contextlib.redirect_stdout(output):
+            exec(compile(body, "<python_interpreter>", "exec"), namespace)
+            if last is not None:
+                value = eval(compile(ast.Expression(last.value), "<python_interpreter>", "eval"), namespace)
+                if value is not None:
+                    print(value)
+    except Exception as e:
+        return output.getvalue() + repr(e)
+    return output.getvalue()
+
+
+# Figures the code closed itself, rendered just before they were closed
+_closed_charts: List[bytes] = []
+
+
+def _render_figure(figure, dpi: int = DEFAULT_CHART_DPI) -> Optional[bytes]:
+    buffer = io.BytesIO()
+    try:
+        figure.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+    except Exception:
+        return None
+    return buffer.getvalue()
+
+
+def _capture_closed_figures() -> None:
+    """
+    Make `plt.close` render figures before closing them, so code that saves a
+    chart and closes it (`plt.savefig(...); plt.close()`) still shows it.
+    """
+    import importlib.util
+    if importlib.util.find_spec("matplotlib") is None:
+        return
+    import matplotlib.pyplot as plt
+    from matplotlib._pylab_helpers import Gcf
+
+    close = plt.close
+
+    def close_and_capture(fig=None):
+        managers = Gcf.get_all_fig_managers()
+        if fig is None:
+            active = Gcf.get_active()
+            managers = [active] if active is not None else []
+        elif fig != "all":
+            managers = [manager for manager in managers
+                        if fig is manager.canvas.figure or fig == manager.num
+                        or fig == manager.canvas.figure.get_label()]
+        for manager in managers:
+            chart = _render_figure(manager.canvas.figure)
+            if chart is not None:
+                _closed_charts.append(chart)
+        close(fig)
+
+    close_and_capture.original = close
+    plt.close = close_and_capture
+
+
+def _collect_charts(dpi: int = DEFAULT_CHART_DPI) -> List[bytes]:
+    """Return the figures the code closed, then render every open one to PNG and close them all."""
+    charts = list(_closed_charts)
+    _closed_charts.clear()
+    plt = sys.modules.get("matplotlib.pyplot")
+    if plt is None:
+        return charts
+    for number in plt.get_fignums():
+        chart = _render_figure(plt.figure(number), dpi)
+        if chart is not None:
+            charts.append(chart)
+    getattr(plt.close, "original", plt.close)("all")
+    return charts
+
+
+def _worker_main(conn, preload: Dict[str, str], memory_limit: int, cache_size: int) -> None:
+    """Entry point of a worker process: warm up, then run code sent over `conn`."""
+    # Figures are rendered off-screen and sent back instead of shown
+    os.environ["MPLBACKEND"] = "Agg"
+    if memory_limit:
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        except (ImportError, ValueError, OSError):
+            pass
+
+    import pandas as pd
+    # Each call gets a shallow copy of the cached frames; copy-on-write keeps
+    # its in-place changes (drop, column assignment, ...) out of the cache
+    pd.set_option("mode.copy_on_write", True)
+    _capture_closed_figures()
+    frames: "OrderedDict" = OrderedDict()
+    for path in preload.values():
+        _get_frame(frames, path, cache_size)
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            code, frame_paths = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        charts = []
+        try:
+            namespace = {"__name__": "__main__", "pd": pd}
+            for name, path in {**preload, **frame_paths}.items():
+                namespace[name] = _get_frame(frames, path, cache_size).copy(deep=False)
+            result = _execute(code, namespace)
+            charts = _collect_charts()
+        except MemoryError:
+            result = "MemoryError: the code exceeded the worker memory limit"
+        except Exception as e:
+            result = repr(e)
+        conn.send(("ok", result, charts))
+
+
+# ---------------------------------------------------------------------------
+# Serving process side
+# ---------------------------------------------------------------------------
+
+class PythonWorker:
+    """One warm worker process, killed and respawned when code runs away."""
+
+    def __init__(self, context, preload: Dict[str, str], memory_limit: int, cache_size: int):
+        self._context = context
+        self._preload = preload
+        self._memory_limit = memory_limit
+        self._cache_size = cache_size
+        self.process = None
+        self.conn = None
+        self.spawn()
+
+    def spawn(self) -> None:
+        parent_conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self._preload, self._memory_limit, self._cache_size),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.conn.recv()  # wait until pandas and the preloaded frames are ready
+
+    def run(self, code: str, frame_paths: Dict[str, str], timeout: float) -> Tuple[str, List[bytes]]:
+        """Run code in the worker and return its output and PNG charts; raise TimeoutError or EOFError if it misbehaves."""
+        self.conn.send((code, frame_paths))
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        _, result, charts = self.conn.recv()
+        return result, charts
+
+    def kill(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+        if self.process is not None:
+            self.process.join()
+        if self.conn is not None:
+            self.conn.close()
+
+
+class PythonWorkerPool:
+    """
+    Pool of warm Python worker processes for the python_interpreter tool.
+
+    Workers import pandas once at startup and keep recently used DataFrames
+    loaded, so tool calls skip import and parse costs. Each call gets a fresh
+    namespace with the requested DataFrames bound under their names, a
+    wall-clock timeout and a memory cap; a worker that times out or dies is
+    killed and replaced, and the serving process is never affected.
+    Workers are started lazily on the first call.
+    """
+
+    def __init__(self,
+                 size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                 preload: Optional[Dict[str, str]] = None,
+                 frame_cache_size: int = DEFAULT_FRAME_CACHE_SIZE):
+        self.size = size
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.preload = {name: os.path.abspath(path) for name, path in (preload or {}).items()}
+        self.frame_cache_size = frame_cache_size
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[PythonWorker]" = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._retired = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.total_seconds = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                worker = self._new_worker()
+                self._workers.append(worker)
+                self._idle.put(worker)
+            self._started = True
+
+    def run(self, code: str, frames: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> str:
+        """
+        Run python code on an idle worker and return its output.
+
+        `frames` maps variable names to CSV or Parquet paths that should be
+        bound as DataFrames for this call. Matplotlib figures the code draws,
+        whether it leaves them open or closes them, are handed to the chart
+        store capturing the caller's context.
+        """
+        self.start()
+        frame_paths = {name: os.path.abspath(path) for name, path in (frames or {}).items()}
+        timeout = timeout or self.timeout
+        with tracing.span("python_tool", code_bytes=len(code), frames=len(frame_paths)) as span:
+            try:
+                self._replace_retired()
+            except Exception as e:
+                span.set(status="no_worker")
+                return f"RuntimeError: no python worker could be started ({e!r})"
+            queued = time.perf_counter()
+            worker = self._idle.get()
+            started = time.perf_counter()
+            span.set(wait_seconds=round(started - queued, 6))
+            charts = []
+            healthy = True
+            try:
+                output, charts = worker.run(sanitize_code(code), frame_paths, timeout)
+                span.set(status="ok")
+            except TimeoutError:
+                self._count(timeouts=1)
+                healthy = self._respawn(worker)
+                output = f"TimeoutError: the code did not finish within {timeout:g} seconds"
+                span.set(status="timeout")
+            except (EOFError, OSError):
+                self._count(crashes=1)
+                healthy = self._respawn(worker)
+                output = "RuntimeError: the python worker crashed (it may have exceeded its memory limit)"
+                span.set(status="crash")
+            finally:
+                self._count(calls=1, seconds=time.perf_counter() - started)
+                # A worker that could not be respawned is replaced on a later call
+                if healthy:
+                    self._idle.put(worker)
+            keys = publish_charts(charts)
+            if keys:
+                output = output.rstrip("\n") + f"\n[{len(keys)} chart(s) captured and shown to the user]"
+            span.set(output_bytes=len(output), charts=len(charts), chart_bytes=sum(map(len, charts)))
+            return output
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "workers": len(self._workers),
+            "idle": self._idle.qsize(),
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+            "total_seconds": round(self.total_seconds, 3),
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for worker in self._workers:
+                worker.kill()
+            self._workers = []
+            self._idle = queue.Queue()
+            self._started = False
+            self._retired = 0
+
+    def _count(self, calls: int = 0, timeouts: int = 0, crashes: int = 0, seconds: float = 0.0) -> None:
+        with self._lock:
+            self.calls += calls
+            self.timeouts += timeouts
+            self.crashes += crashes
+            self.total_seconds += seconds
+
+    def _new_worker(self) -> PythonWorker:
+        return PythonWorker(self._context, self.preload, self.memory_limit, self.frame_cache_size)
+
+    def _respawn(self, worker: PythonWorker) -> bool:
+        """Restart a worker; if it does not come up, retire it and return False."""
+        worker.kill()
+        try:
+            worker.spawn()
+            return True
+        except Exception:
+            worker.kill()
+            with self._lock:
+                if worker in self._workers:
+                    self._workers.remove(worker)
+                    self._retired += 1
+            return False
+
+    def _replace_retired(self) -> None:
+        """Start workers in place of retired ones; raise only if no worker is left."""
+        while True:
+            with self._lock:
+                if not self._retired:
+                    return
+                self._retired -= 1
+            try:
+                worker = self._new_worker()
+            except Exception:
+                with self._lock:
+                    self._retired += 1
+                    if self._workers:
+                        return
+                raise
+            with self._lock:
+                self._workers.append(worker)
+            self._idle.put(worker)
+
+
+_default_pool: Optional[PythonWorkerPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> PythonWorkerPool:
+    """Return the process-wide worker pool shared by the apps and tools."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = PythonWorkerPool()
+        return _default_pool
@@ -0,0 +1,337 @@
+"""
+Deterministic fast path for simple aggregate and ratio questions.
+
+Questions such as "what is the highest value of cost of goods and service?"
+or "what is the ratio of the largest stockholders equity to the smallest
+revenue?" are one pandas aggregation each. `QueryPlanner` recognizes the
+aggregate or ratio intent, fuzzy-matches the phrases to column names
+(CamelCase names are split into words) and, when every word of a phrase
+matches exactly one best column, computes the answer directly. Anything it is
+not sure about returns None so the caller falls back to the LLM agent.
+"""
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from answer_scoring import score_answer
+from schema_profile import period_coverage
+from text_utils import normalize_question
+
+
+AGGREGATES = {
+    "max": ("highest", "largest", "maximum", "max", "biggest", "greatest", "peak"),
+    "min": ("lowest", "smallest", "minimum", "min", "least"),
+    "mean": ("average", "mean", "avg"),
+    "median": ("median",),
+    "sum": ("total", "sum"),
+}
+AGGREGATE_WORDS = {word: aggregate for aggregate, words in AGGREGATES.items() for word in words}
+AGGREGATE_LABELS = {"max": "highest", "min": "lowest", "mean": "average", "median": "median", "sum": "total"}
+
+_AGG = "|".join(sorted(AGGREGATE_WORDS, key=len, reverse=True))
+_LEAD = r"^(?:what is |what's |what was |find |compute |calculate |give me |show )?(?:the )?"
+_SEP = r" (?:divided by|over|to|and|vs|versus) (?:the )?"
+
+# "ratio of the largest stockholders equity to the smallest revenue"
+RATIO_OF_AGGREGATES = re.compile(
+    _LEAD + rf"ratio (?:of|between) (?:the )?(?P<agg1>{_AGG}) (?P<x>.+?){_SEP}(?P<agg2>{_AGG}) (?P<y>.+)$")
+# "minimum ratio of operating income loss divided by non operating income expense"
+AGGREGATE_OF_RATIO = re.compile(
+    _LEAD + rf"(?P<agg>{_AGG}) (?:value of (?:the )?)?ratio (?:of|between) (?:the )?(?P<x>.+?){_SEP}(?P<y>.+)$")
+# "highest value of cost of goods and service", "largest gross profit margin"
+AGGREGATE = re.compile(
+    _LEAD + rf"(?P<agg>{_AGG}) (?:values? )?(?:of |for |in )?(?:the )?(?P<x>.+)$")
+
+STOPWORDS = {"the", "of", "and", "a", "an", "in", "for", "from", "to", "by", "with", "on", "at",
+             "value", "values", "column", "amount"}
+
+# "<phrase> margin" is the phrase divided by revenue, row by row
+MARGIN_SUFFIX = " margin"
+MARGIN_DENOMINATOR = "revenue"
+
+DEFAULT_TOKEN_SIMILARITY = 0.85
+
+# Words with and without these prefixes are never fuzzy-matched: "operating" is not "nonoperating"
+NEGATING_PREFIXES = ("non", "un", "dis")
+
+# "revenue and cost" names two measures, unless both halves belong to one column name
+CONJUNCTION = re.compile(r" (?:and|or) ")
+
+# Summing or averaging rows that mix annual and quarterly periods double counts
+PERIOD_SENSITIVE = {"sum", "mean", "median"}
+
+
+def split_words(text: str) -> List[str]:
+    """Split text or a CamelCase/snake_case column name into lower-case words."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    text = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1 \2", text)
+    return [word for word in re.split(r"[^a-z0-9]+", text.lower()) if word]
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def content_words(text: str) -> List[str]:
+    return [_stem(word) for word in split_words(text) if word not in STOPWORDS]
+
+
+@dataclass
+class ColumnRef:
+    table: str
+    column: str
+
+    def label(self, tables: int) -> str:
+        return self.column if tables == 1 else f"{self.table}.{self.column}"
+
+
+@dataclass
+class Plan:
+    """A recognized question: how to compute it and from which columns."""
+    kind: str  # "aggregate", "aggregate_of_ratio" or "ratio_of_aggregates"
+    aggregates: Tuple[str, ...]
+    columns: Tuple[ColumnRef, ...]
+    confidence: float
+
+
+@dataclass
+class PlannedAnswer:
+    text: str
+    value: float
+    plan: Plan
+    seconds: float
+
+
+@dataclass
+class PlannerStats:
+    """Hit rate of the fast path and its agreement with the agent on checked answers."""
+    questions: int = 0
+    hits: int = 0
+    agreements: int = 0
+    disagreements: int = 0
+    seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, hit: bool, seconds: float) -> None:
+        with self._lock:
+            self.questions += 1
+            self.hits += hit
+            self.seconds += seconds
+
+    def record_agreement(self, agreed: bool) -> None:
+        with self._lock:
+            self.agreements += agreed
+            self.disagreements += not agreed
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            checked = self.agreements + self.disagreements
+            return {
+                "questions": self.questions,
+                "hits": self.hits,
+                "fallbacks": self.questions - self.hits,
+                "hit_rate": round(self.hits / self.questions, 4) if self.questions else 0.0,
+                "agreements": self.agreements,
+                "disagreements": self.disagreements,
+                "agreement_rate": round(self.agreements / checked, 4) if checked else None,
+                "total_seconds": round(self.seconds, 6),
+            }
+
+
+class QueryPlanner:
+    """
+    Answers single-aggregation questions over DataFrames without the LLM.
+
+    A phrase matches a column when every content word of the phrase matches
+    a word of the column name (exactly, as two joined words, or with string
+    similarity of at least `token_similarity`, never across a negating
+    prefix); among those columns the one whose name is covered best wins,
+    and ties or phrases naming several columns fall back to the agent.
+    """
+
+    def __init__(self, frames: Dict[str, pd.DataFrame],
+                 token_similarity: float = DEFAULT_TOKEN_SIMILARITY,
+                 stats: Optional[PlannerStats] = None):
+        self.frames = frames
+        self.token_similarity = token_similarity
+        self.stats = stats or PlannerStats()
+        self._columns = [
+            (ColumnRef(table, str(column)), content_words(column))
+            for table, df in frames.items()
+            for column in df.columns
+            if pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column])
+        ]
+        self._mixed_periods = {
+            table for table, df in frames.items()
+            if any(len(period["lengths"]) > 1 for period in period_coverage(df))
+        }
+
+    def answer(self, question: str) -> Optional[PlannedAnswer]:
+        """Compute the answer if the question is recognized, else return None."""
+        started = time.perf_counter()
+        try:
+            plan = self.plan(question)
+            value = self.execute(plan) if plan else None
+        except (ArithmeticError, TypeError, ValueError):
+            plan, value = None, None
+        if value is None or not np.isfinite(value):
+            self.stats.record(False, time.perf_counter() - started)
+            return None
+        seconds = time.perf_counter() - started
+        self.stats.record(True, seconds)
+        return PlannedAnswer(text=self.describe(plan, value), value=value, plan=plan, seconds=seconds)
+
+    def plan(self, question: str) -> Optional[Plan]:
+        """Recognize the question's intent and columns, or return None."""
+        text = normalize_question(question)
+
+        match = RATIO_OF_AGGREGATES.match(text)
+        if match:
+            x, y = self.match_column(match["x"]), self.match_column(match["y"])
+            if x and y:
+                return Plan("ratio_of_aggregates",
+                            (AGGREGATE_WORDS[match["agg1"]], AGGREGATE_WORDS[match["agg2"]]),
+                            (x[0], y[0]), min(x[1], y[1]))
+            return None
+
+        match = AGGREGATE_OF_RATIO.match(text)
+        if match:
+            return self._row_ratio(AGGREGATE_WORDS[match["agg"]], match["x"], match["y"])
+
+        match = AGGREGATE.match(text)
+        if match:
+            aggregate, phrase = AGGREGATE_WORDS[match["agg"]], match["x"]
+            column = self.match_column(phrase)
+            if column:
+                return Plan("aggregate", (aggregate,), (column[0],), column[1])
+            if phrase.endswith(MARGIN_SUFFIX):
+                return self._row_ratio(aggregate, phrase[:-len(MARGIN_SUFFIX)], MARGIN_DENOMINATOR)
+        return None
+
+    def match_column(self, phrase: str) -> Optional[Tuple[ColumnRef, float]]:
+        """
+        Return the single best column for a phrase and its coverage, or None.
+
+        A phrase joined by "and"/"or" must name one column as a whole and in
+        each part ("cost of goods and services"); if a part names a column of
+        its own ("revenue and cost"), the question asks for several measures.
+        """
+        match = self._match_phrase(phrase)
+        if match is None:
+            return None
+        parts = CONJUNCTION.split(phrase)
+        if len(parts) > 1:
+            for part in parts:
+                part_match = self._match_phrase(part)
+                if part_match is not None and part_match[0] != match[0]:
+                    return None
+        return match
+
+    def _match_phrase(self, phrase: str) -> Optional[Tuple[ColumnRef, float]]:
+        words = content_words(phrase)
+        if not words:
+            return None
+        scored = []
+        for ref, column_words in self._columns:
+            matched = self._match_words(words, column_words)
+            if matched is not None:
+                scored.append((matched / len(column_words), ref))
+        if not scored:
+            return None
+        scored.sort(key=lambda item: item[0], reverse=True)
+        if len(scored) > 1 and scored[1][0] == scored[0][0]:
+            return None
+        return scored[0][1], scored[0][0]
+
+    def execute(self, plan: Plan) -> Optional[float]:
+        """Run a plan as vectorized pandas operations."""
+        if any(aggregate in PERIOD_SENSITIVE for aggregate in plan.aggregates) and \
+                any(ref.table in self._mixed_periods for ref in plan.columns):
+            return None
+        series = [self.frames[ref.table][ref.column].astype("float64") for ref in plan.columns]
+        if plan.kind == "aggregate":
+            return _aggregate(series[0], plan.aggregates[0])
+        if plan.kind == "aggregate_of_ratio":
+            ratio = (series[0] / series[1]).replace([np.inf, -np.inf], np.nan)
+            return _aggregate(ratio, plan.aggregates[0])
+        numerator = _aggregate(series[0], plan.aggregates[0])
+        denominator = _aggregate(series[1], plan.aggregates[1])
+        if numerator is None or not denominator:
+            return None
+        return numerator / denominator
+
+    def describe(self, plan: Plan, value: float) -> str:
+        tables = len(self.frames)
+        labels = [ref.label(tables) for ref in plan.columns]
+        names = [AGGREGATE_LABELS[aggregate] for aggregate in plan.aggregates]
+        if plan.kind == "aggregate":
+            subject = f"{names[0]} {labels[0]}"
+        elif plan.kind == "aggregate_of_ratio":
+            subject = f"{names[0]} ratio of {labels[0]} to {labels[1]}"
+        else:
+            subject = f"ratio of the {names[0]} {labels[0]} to the {names[1]} {labels[1]}"
+        return f"The {subject} is {format_number(value)}."
+
+    def check_agreement(self, planned: PlannedAnswer, agent_answer: str, tolerance: float = 1e-3) -> bool:
+        """Record whether the agent's answer contains the planned value."""
+        agreed = score_answer(agent_answer, planned.value, tolerance) == 1.0
+        self.stats.record_agreement(agreed)
+        return agreed
+
+    def _row_ratio(self, aggregate: str, x: str, y: str) -> Optional[Plan]:
+        numerator, denominator = self.match_column(x), self.match_column(y)
+        if not (numerator and denominator) or numerator[0].table != denominator[0].table:
+            return None
+        return Plan("aggregate_of_ratio", (aggregate,), (numerator[0], denominator[0]),
+                    min(numerator[1], denominator[1]))
+
+    def _match_words(self, words: List[str], column_words: List[str]) -> Optional[int]:
+        """Return how many column words the phrase covers, or None unless it covers every phrase word."""
+        remaining = list(column_words)
+        i = 0
+        while i < len(words):
+            # "non operating" matches "Nonoperating"
+            if i + 1 < len(words) and words[i] + words[i + 1] in remaining:
+                remaining.remove(words[i] + words[i + 1])
+                i += 2
+                continue
+            match = self._best_word(words[i], remaining)
+            if match is None:
+                return None
+            remaining.remove(match)
+            i += 1
+        return len(column_words) - len(remaining)
+
+    def _best_word(self, word: str, candidates: List[str]) -> Optional[str]:
+        if word in candidates:
+            return word
+        if len(word) < 5:
+            return None
+        best, best_ratio = None, self.token_similarity
+        for candidate in candidates:
+            if any(word.startswith(prefix) != candidate.startswith(prefix) for prefix in NEGATING_PREFIXES):
+                continue
+            ratio = SequenceMatcher(None, word, candidate).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        return best
+
+
+def _aggregate(series: pd.Series, aggregate: str) -> Optional[float]:
+    values = series.dropna()
+    if values.empty:
+        return None
+    return float(getattr(values, aggregate)())
+
+
+def format_number(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.10g}"
+
@@ -0,0 +1,100 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+
+# Defaults, overridable through the environment
+DEFAULT_MAX_WORKERS = int(os.getenv("QUESTION_MAX_WORKERS", "4"))
+DEFAULT_MAX_QUEUE = int(os.getenv("QUESTION_MAX_QUEUE", "16"))
+
+
+class QueueFullError(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Too many questions in flight, please retry shortly.")
+        self.retry_after = retry_after
+
+
+class QuestionExecutor:
+    """
+    Runs blocking agent calls on a bounded worker pool, off the event loop.
+
+    At most `max_workers` calls run at once and at most `max_queue` more wait
+    for a worker. Anything beyond that is rejected straight away with
+    `QueueFullError` instead of piling up behind slow questions.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="question")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `func(*args, **kwargs)` in the pool and await its result."""
+        return await self.submit(func, *args, **kwargs)
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> "asyncio.Future":
+        """
+        Start `func(*args, **kwargs)` in the pool and return an awaitable for
+        its result; `QueueFullError` is raised straight away. Call it from
+        the event loop.
+        """
+        self._admit()
+        # Carry the caller's context (e.g. its tracing span) into the worker thread
+        context = contextvars.copy_context()
+        future = self._pool.submit(context.run, partial(self._call, func, *args, **kwargs))
+        # Release the slot when the call actually finishes (or is cancelled
+        # before starting), not when the awaiting request goes away
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        """Return current load and lifetime counters."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise QueueFullError()
+            self._pending += 1
+
+    def _release(self, future) -> None:
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def _call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            self._running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
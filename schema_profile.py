@@ -0,0 +1,304 @@
+"""
+Compact per-column summaries of a dataset, and prompt preambles built from them.
+
+A profile is computed once per dataset (the dataset cache stores it next to
+the Parquet copy) and rendered into a preamble that stays within a token
+budget however wide or long the table is, instead of pasting
+`head().to_markdown()` into every LLM call.
+
+    python schema_profile.py financial-csv-agent/income_statement.csv financial-csv-agent/balance_sheet.csv
+"""
+import argparse
+import os
+import sys
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from text_utils import estimate_tokens
+
+
+# Bump when the profile layout changes so stored profiles are recomputed
+PROFILE_VERSION = 3
+
+DEFAULT_SAMPLE_VALUES = int(os.getenv("PROFILE_SAMPLE_VALUES", "3"))
+DEFAULT_PREAMBLE_TOKENS = int(os.getenv("PROFILE_PREAMBLE_TOKENS", "800"))
+
+SAMPLE_MAX_CHARS = 24
+
+
+def _scalar(value: Any) -> Any:
+    """Convert numpy/pandas scalars into plain JSON-friendly values."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def profile_column(series: pd.Series, sample_values: int = DEFAULT_SAMPLE_VALUES) -> Dict[str, Any]:
+    """Summarize one column: dtype, null ratio, value range and a few sample values."""
+    rows = len(series)
+    non_null = series.dropna()
+    profile = {
+        "name": str(series.name),
+        "dtype": str(series.dtype),
+        "null_ratio": round(1 - len(non_null) / rows, 4) if rows else 0.0,
+        "nulls": int(rows - len(non_null)),
+    }
+    if pd.api.types.is_bool_dtype(series):
+        pass
+    elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        profile["min"] = _scalar(non_null.min()) if len(non_null) else None
+        profile["max"] = _scalar(non_null.max()) if len(non_null) else None
+    else:
+        profile["distinct"] = int(non_null.nunique())
+    profile["samples"] = [_scalar(value) for value in non_null.drop_duplicates().head(sample_values)]
+    return profile
+
+
+def _period_kind(days: float) -> str:
+    if days <= 100:
+        return "quarter"
+    if days <= 190:
+        return "half-year"
+    if 350 <= days <= 380:
+        return "year"
+    return f"{int(round(days))} days"
+
+
+def period_coverage(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Describe the periods spanned by `<column>_start`/`<column>_end` pairs
+    (see `csv_ingest.split_period_columns`): overall range, number of periods
+    and how many of each length.
+    """
+    coverage = []
+    for column in df.columns:
+        if not str(column).endswith("_start"):
+            continue
+        base = str(column)[:-len("_start")]
+        end_column = f"{base}_end"
+        if end_column not in df.columns:
+            continue
+        starts, ends = df[column], df[end_column]
+        if not (pd.api.types.is_datetime64_any_dtype(starts) and pd.api.types.is_datetime64_any_dtype(ends)):
+            continue
+        valid = starts.notna() & ends.notna()
+        if not valid.any():
+            continue
+        lengths = ((ends[valid] - starts[valid]).dt.days + 1).map(_period_kind).value_counts()
+        coverage.append({
+            "column": base,
+            "start": starts[valid].min().date().isoformat(),
+            "end": ends[valid].max().date().isoformat(),
+            "periods": int(valid.sum()),
+            "lengths": {kind: int(count) for kind, count in lengths.items()},
+        })
+    return coverage
+
+
+def profile_frame(df: pd.DataFrame, sample_values: int = DEFAULT_SAMPLE_VALUES) -> Dict[str, Any]:
+    """Summarize a DataFrame's shape, columns and period coverage."""
+    return {
+        "version": PROFILE_VERSION,
+        "rows": int(len(df)),
+        "columns": [profile_column(df[column], sample_values) for column in df.columns],
+        "periods": period_coverage(df),
+    }
+
+
+def _merge_periods(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    merged = {period["column"]: dict(period, lengths=dict(period["lengths"])) for period in old}
+    for period in new:
+        current = merged.get(period["column"])
+        if current is None:
+            merged[period["column"]] = period
+            continue
+        current["start"] = min(current["start"], period["start"])
+        current["end"] = max(current["end"], period["end"])
+        current["periods"] += period["periods"]
+        for kind, count in period["lengths"].items():
+            current["lengths"][kind] = current["lengths"].get(kind, 0) + count
+    return list(merged.values())
+
+
+def update_profile(profile: Dict[str, Any], df: pd.DataFrame, appended: pd.DataFrame,
+                   sample_values: int = DEFAULT_SAMPLE_VALUES) -> Dict[str, Any]:
+    """
+    Profile `df`, which is a dataset with `profile` plus the `appended` rows,
+    by profiling only the new rows and merging.
+
+    Null counts, ranges, samples and period coverage merge exactly. Distinct
+    counts of category columns come from the merged categories; those of
+    other text columns are recounted, the one statistic that reads old rows.
+    """
+    added = profile_frame(appended, sample_values)
+    rows = profile["rows"] + added["rows"]
+    columns = []
+    for position, (old, new) in enumerate(zip(profile["columns"], added["columns"])):
+        series = df.iloc[:, position]
+        nulls = old["nulls"] + new["nulls"]
+        column = dict(old, dtype=str(series.dtype), nulls=nulls,
+                      null_ratio=round(nulls / rows, 4) if rows else 0.0)
+        for bound, pick in (("min", min), ("max", max)):
+            if bound in old:
+                values = [value for value in (old[bound], new.get(bound)) if value is not None]
+                column[bound] = pick(values) if values else None
+        if "distinct" in old:
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                column["distinct"] = int(len(series.cat.categories))
+            else:
+                column["distinct"] = int(series.nunique())
+        samples = list(old["samples"])
+        for value in new["samples"]:
+            if len(samples) < sample_values and value not in samples:
+                samples.append(value)
+        column["samples"] = samples
+        columns.append(column)
+    return {
+        "version": PROFILE_VERSION,
+        "rows": int(rows),
+        "columns": columns,
+        "periods": _merge_periods(profile.get("periods", []), added["periods"]),
+    }
+
+
+@lru_cache(maxsize=32)
+def _profile_file(path: str, mtime: float, size: int) -> Dict[str, Any]:
+    from csv_ingest import ingest_csv, load_dataset
+
+    if path.endswith(".parquet"):
+        return profile_frame(load_dataset(path))
+    with open(path, "rb") as f:
+        return profile_frame(ingest_csv(f))
+
+
+def profile_file(path: str) -> Dict[str, Any]:
+    """Profile a CSV or Parquet file, reusing the profile until the file changes."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return _profile_file(path, stat.st_mtime, stat.st_size)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    if isinstance(value, str) and "T00:00:00" in value:
+        value = value.split("T")[0]
+    text = str(value)
+    return text if len(text) <= SAMPLE_MAX_CHARS else text[:SAMPLE_MAX_CHARS - 1] + "…"
+
+
+def _short_dtype(dtype: str) -> str:
+    for prefix, short in (("int", "int"), ("uint", "int"), ("float", "float"), ("datetime", "date"),
+                          ("bool", "bool"), ("category", "category")):
+        if dtype.startswith(prefix):
+            return short
+    return "text"
+
+
+def _render_column(column: Dict[str, Any], level: int) -> str:
+    """Render a column at detail level 3 (everything), 2 (no samples) or 1 (name and type)."""
+    details = [_short_dtype(column["dtype"])]
+    if level >= 2:
+        if column["null_ratio"]:
+            details.append(f"{column['null_ratio']:.0%} null")
+        if column.get("min") is not None:
+            details.append(f"{_format_value(column['min'])}..{_format_value(column['max'])}")
+        if "distinct" in column:
+            details.append(f"{column['distinct']} distinct")
+    if level >= 3 and column.get("samples") and "min" not in column:
+        details.append("e.g. " + ", ".join(_format_value(value) for value in column["samples"]))
+    return f"- {column['name']} ({', '.join(details)})"
+
+
+def render_schema(name: str, profile: Dict[str, Any], max_tokens: int = DEFAULT_PREAMBLE_TOKENS) -> str:
+    """
+    Render one dataset's profile as prompt text of at most about `max_tokens`.
+
+    When everything does not fit, the emptiest columns lose detail first:
+    sample values, then nulls and ranges, and finally they are only counted.
+    """
+    columns = profile["columns"]
+    header = [f"The DataFrame `{name}` has {profile['rows']} rows and {len(columns)} columns."]
+    for period in profile.get("periods", []):
+        lengths = ", ".join(f"{count} {kind}" for kind, count in period["lengths"].items())
+        header.append(f"`{period['column']}` periods cover {period['start']} to {period['end']} ({lengths}); "
+                      f"filter them with `{period['column']}_start`/`{period['column']}_end`.")
+    header.append("Columns (type, nulls, range or examples):")
+    footer = f"... and {{}} more columns, mostly empty; see `{name}.columns`."
+
+    levels = [3] * len(columns)
+    costs = [estimate_tokens(_render_column(column, 3)) + 1 for column in columns]
+    total = estimate_tokens("\n".join(header)) + sum(costs)
+    budget = max_tokens - estimate_tokens(footer.format(len(columns)))
+    emptiest_first = sorted(range(len(columns)), key=lambda i: -columns[i]["null_ratio"])
+    for level in (2, 1, 0):
+        for index in emptiest_first:
+            if total <= budget:
+                break
+            cost = estimate_tokens(_render_column(columns[index], level)) + 1 if level else 0
+            total += cost - costs[index]
+            costs[index], levels[index] = cost, level
+
+    lines = header + [_render_column(column, level) for column, level in zip(columns, levels) if level]
+    omitted = levels.count(0)
+    if omitted:
+        lines.append(footer.format(omitted))
+    return "\n".join(lines)
+
+
+def render_preamble(profiles: Dict[str, Dict[str, Any]], max_tokens: int = DEFAULT_PREAMBLE_TOKENS) -> str:
+    """Render several datasets' profiles, sharing the token budget between them."""
+    if not profiles:
+        return ""
+    budget = max_tokens // len(profiles)
+    return "\n\n".join(render_schema(name, profile, budget) for name, profile in profiles.items())
+
+
+def head_preview(frames: Dict[str, pd.DataFrame], number_of_head_rows: int = 3) -> str:
+    """The `head().to_markdown()` preview the schema preamble replaces."""
+    return "\n".join(
+        f"Here is a preview of the `{name}` dataframe:\n{df.head(number_of_head_rows).to_markdown()}\n"
+        for name, df in frames.items()
+    )
+
+
+def preamble_savings(preamble: str, preview: str, steps: int = 1) -> Dict[str, Any]:
+    """Compare a schema preamble with a head() preview, per LLM call and over `steps` calls."""
+    preamble_tokens = estimate_tokens(preamble)
+    preview_tokens = estimate_tokens(preview)
+    saved = preview_tokens - preamble_tokens
+    return {
+        "preamble_tokens": preamble_tokens,
+        "preview_tokens": preview_tokens,
+        "saved_tokens_per_call": saved,
+        "saved_tokens": saved * steps,
+        "saved_ratio": round(saved / preview_tokens, 4) if preview_tokens else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Print the schema preamble for CSV files and its token savings.")
+    parser.add_argument("paths", nargs="+", help="CSV or Parquet files; each is named after its file")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_PREAMBLE_TOKENS)
+    parser.add_argument("--head-rows", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    names = {os.path.splitext(os.path.basename(path))[0]: path for path in args.paths}
+    preamble = render_preamble({name: profile_file(path) for name, path in names.items()}, args.max_tokens)
+    frames = {name: pd.read_csv(path, encoding="utf-8-sig") if not path.endswith(".parquet") else pd.read_parquet(path)
+              for name, path in names.items()}
+    print(preamble)
+    savings = preamble_savings(preamble, head_preview(frames, args.head_rows))
+    print(f"\npreamble: ~{savings['preamble_tokens']} tokens, head({args.head_rows}) preview: "
+          f"~{savings['preview_tokens']} tokens, saved {savings['saved_ratio']:.0%} per LLM call", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
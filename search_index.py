@@ -0,0 +1,220 @@
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+# Defaults, overridable through the environment
+DEFAULT_TOP_K = int(os.getenv("SEARCH_TOP_K", "5"))
+DEFAULT_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "5"))
+
+STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "i", "in", "is",
+             "it", "of", "on", "or", "that", "the", "this", "to", "was", "what", "with", "do", "does",
+             "can", "which", "about", "me", "my", "using", "use"}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case words with stopwords dropped and plural "s" stripped."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(str(text).lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _facet_values(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(item).lower() for item in value]
+    return [str(value).lower()]
+
+
+class SearchIndex:
+    """
+    BM25-ranked inverted index over JSON documents stored in files.
+
+    `paths` are JSONL files, JSON files holding a list, or directories of
+    them. Every document is indexed on its `text_fields`, and each of
+    `facet_fields` gets an exact-match index for filtering. `refresh()`
+    re-reads only the files whose size or modification time changed,
+    re-indexes the documents in them that changed and drops those that were
+    deleted; searches call it at most once every `refresh_seconds`.
+    """
+
+    def __init__(self,
+                 paths: Sequence[str],
+                 text_fields: Sequence[str] = ("text",),
+                 facet_fields: Sequence[str] = (),
+                 k1: float = 1.5,
+                 b: float = 0.75,
+                 refresh_seconds: float = DEFAULT_REFRESH_SECONDS):
+        self.paths = list(paths)
+        self.text_fields = tuple(text_fields)
+        self.facet_fields = tuple(facet_fields)
+        self.k1 = k1
+        self.b = b
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._documents: Dict[str, dict] = {}
+        self._order: Dict[str, int] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._facets: Dict[str, Dict[str, Set[str]]] = {field: defaultdict(set) for field in self.facet_fields}
+        self._files: Dict[str, Tuple[float, int, List[str]]] = {}
+        self._next_order = 0
+        self._refreshed_at = 0.0
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def refresh(self) -> Dict[str, int]:
+        """Re-index changed files; return how many files were added, updated and removed."""
+        changes = {"added": 0, "updated": 0, "removed": 0}
+        with self._lock:
+            seen = set()
+            for path in self._corpus_files():
+                seen.add(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                known = self._files.get(path)
+                if known and known[:2] == (stat.st_mtime, stat.st_size):
+                    continue
+                doc_ids = []
+                for position, document in enumerate(self._read_file(path)):
+                    doc_id = f"{path}#{position}"
+                    # Appending to or editing a file only re-indexes the documents that changed
+                    if self._documents.get(doc_id) != document:
+                        self.add_document(doc_id, document)
+                    doc_ids.append(doc_id)
+                for doc_id in set(known[2] if known else ()) - set(doc_ids):
+                    self.remove_document(doc_id)
+                self._files[path] = (stat.st_mtime, stat.st_size, doc_ids)
+                changes["updated" if known else "added"] += 1
+            for path in set(self._files) - seen:
+                for doc_id in self._files.pop(path)[2]:
+                    self.remove_document(doc_id)
+                changes["removed"] += 1
+            self._refreshed_at = time.monotonic()
+        return changes
+
+    def add_document(self, doc_id: str, document: dict) -> None:
+        """Index one document, replacing any document with the same id."""
+        with self._lock:
+            order = self._order.get(doc_id, self._next_order)
+            if doc_id in self._documents:
+                self.remove_document(doc_id)
+            terms = Counter(token for field in self.text_fields for token in tokenize(document.get(field, "")))
+            for term, count in terms.items():
+                self._postings[term][doc_id] = count
+            length = sum(terms.values())
+            self._documents[doc_id] = document
+            self._order[doc_id] = order
+            self._next_order = max(self._next_order, order + 1)
+            self._lengths[doc_id] = length
+            self._total_length += length
+            for field in self.facet_fields:
+                for value in _facet_values(document.get(field)):
+                    self._facets[field][value].add(doc_id)
+
+    def remove_document(self, doc_id: str) -> None:
+        with self._lock:
+            document = self._documents.pop(doc_id, None)
+            if document is None:
+                return
+            for field in self.text_fields:
+                for term in set(tokenize(document.get(field, ""))):
+                    postings = self._postings.get(term)
+                    if postings is not None:
+                        postings.pop(doc_id, None)
+                        if not postings:
+                            del self._postings[term]
+            for field in self.facet_fields:
+                for value in _facet_values(document.get(field)):
+                    self._facets[field][value].discard(doc_id)
+            self._total_length -= self._lengths.pop(doc_id)
+            self._order.pop(doc_id)
+
+    def search(self, query: Optional[str], k: int = DEFAULT_TOP_K,
+               filters: Optional[Dict[str, Iterable[str]]] = None) -> List[dict]:
+        """
+        Return the top `k` documents for a query.
+
+        `filters` maps facet fields to accepted values: a document must match
+        every field, and any one of the values given for a field. Filtered
+        searches whose query matches nothing, and empty queries, return
+        documents in corpus order.
+        """
+        if time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+            self.refresh()
+        with self._lock:
+            candidates = self._filter(filters)
+            terms = tokenize(query or "")
+            scores = self._score(terms, candidates)
+            if scores:
+                ranked = sorted(scores, key=lambda doc_id: (-scores[doc_id], self._order[doc_id]))
+            elif candidates is not None or not terms:
+                ranked = sorted(self._documents if candidates is None else candidates, key=self._order.get)
+            else:
+                ranked = []
+            return [self._documents[doc_id] for doc_id in ranked[:k]]
+
+    def _filter(self, filters: Optional[Dict[str, Iterable[str]]]) -> Optional[Set[str]]:
+        candidates = None
+        for field, values in (filters or {}).items():
+            if values is None or field not in self._facets:
+                continue
+            matching = set()
+            for value in _facet_values(values):
+                matching |= self._facets[field].get(value, set())
+            candidates = matching if candidates is None else candidates & matching
+        return candidates
+
+    def _score(self, terms: List[str], candidates: Optional[Set[str]]) -> Dict[str, float]:
+        count = len(self._documents)
+        if not count or not terms:
+            return {}
+        average_length = self._total_length / count or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def _corpus_files(self) -> List[str]:
+        files = []
+        for path in self.paths:
+            if os.path.isdir(path):
+                files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl")) + glob.glob(os.path.join(path, "*.json"))))
+            elif os.path.exists(path):
+                files.append(path)
+        return [os.path.abspath(path) for path in files]
+
+    @staticmethod
+    def _read_file(path: str) -> List[dict]:
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                return [json.loads(line) for line in f if line.strip()]
+            data = json.load(f)
+        return data if isinstance(data, list) else [data]
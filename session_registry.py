@@ -0,0 +1,134 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+# Only for annotations, so the apps can import this without loading pandas
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Default budgets, overridable through the environment
+DEFAULT_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "64"))
+DEFAULT_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+def frame_nbytes(df: "Optional[pd.DataFrame]") -> int:
+    """Return the in-memory size of a DataFrame, including object columns."""
+    if df is None:
+        return 0
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+@dataclass
+class SessionEntry:
+    """One session's agent and the DataFrame it was built from."""
+    agent: Any
+    df: "pd.DataFrame"
+    dataset_key: Optional[str] = None
+    generated_image_path: Optional[str] = None
+    nbytes: int = 0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+class SessionRegistry:
+    """
+    Session-keyed store of agents and DataFrames with LRU eviction.
+
+    Entries are evicted least recently used first whenever the number of
+    entries exceeds `max_entries` or the summed DataFrame size exceeds
+    `max_bytes`. A DataFrame shared by several sessions is only counted once.
+    The entry that was just inserted is never evicted, so a single oversized
+    upload still gets served.
+    """
+
+    def __init__(self,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 on_evict: Optional[Callable[[str, SessionEntry], None]] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._nbytes = 0
+        self._frame_refs: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id: Optional[str]) -> Optional[SessionEntry]:
+        """Return the entry for a session and mark it as recently used."""
+        with self._lock:
+            entry = self._entries.get(session_id) if session_id else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry
+
+    def put(self, session_id: str, agent: Any, df: "pd.DataFrame", **kwargs) -> SessionEntry:
+        """Register (or replace) the agent and DataFrame for a session."""
+        entry = SessionEntry(agent=agent, df=df, nbytes=frame_nbytes(df), **kwargs)
+        with self._lock:
+            self._discard(session_id, evicted=False)
+            self._entries[session_id] = entry
+            refs = self._frame_refs.get(id(df), 0)
+            if refs == 0:
+                self._nbytes += entry.nbytes
+            self._frame_refs[id(df)] = refs + 1
+            self._enforce_budget()
+        return entry
+
+    def remove(self, session_id: Optional[str]) -> None:
+        """Drop a session, e.g. when the user resets the agent."""
+        with self._lock:
+            self._discard(session_id, evicted=False)
+
+    def uses_dataset(self, dataset_key: Optional[str]) -> bool:
+        """Whether any session is still on the dataset with this key."""
+        with self._lock:
+            return any(entry.dataset_key == dataset_key for entry in self._entries.values())
+
+    def stats(self) -> dict:
+        """Return the registry size and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._nbytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def _enforce_budget(self) -> None:
+        # Keep at least the most recent entry, even if it alone is over budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                          or self._nbytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._discard(oldest, evicted=True)
+
+    def _discard(self, session_id: Optional[str], evicted: bool) -> None:
+        entry = self._entries.pop(session_id, None) if session_id else None
+        if entry is None:
+            return
+        refs = self._frame_refs.pop(id(entry.df)) - 1
+        if refs:
+            self._frame_refs[id(entry.df)] = refs
+        else:
+            self._nbytes -= entry.nbytes
+        if evicted:
+            self.evictions += 1
+        if self.on_evict:
+            self.on_evict(session_id, entry)
+
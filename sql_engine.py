@@ -0,0 +1,155 @@
+import os
+import re
+import threading
+from typing import Dict, Optional, Union
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+import tracing
+from csv_ingest import ingest_csv
+
+
+# Limits, overridable through the environment
+DEFAULT_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "200"))
+DEFAULT_MAX_CHARS = int(os.getenv("SQL_MAX_CHARS", "8000"))
+DEFAULT_TIMEOUT = float(os.getenv("SQL_TIMEOUT", "30"))
+DEFAULT_MEMORY_LIMIT = os.getenv("SQL_MEMORY_LIMIT", "2GB")
+
+TABLE_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class SQLEngine:
+    """
+    In-process DuckDB engine over named tables, for the SQL tool.
+
+    Parquet files (stored uploads) are registered as views, so queries scan
+    only the columns and row groups they need; Arrow files (workspace tables)
+    are scanned from their memory map; CSV files are parsed once with
+    `csv_ingest` into tables with the same columns the python tool sees.
+    Only read queries are accepted, each with a timeout, and results are cut
+    to `max_rows` rows and `max_chars` characters.
+    """
+
+    def __init__(self,
+                 tables: Optional[Dict[str, Union[str, pd.DataFrame]]] = None,
+                 max_rows: int = DEFAULT_MAX_ROWS,
+                 max_chars: int = DEFAULT_MAX_CHARS,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 memory_limit: str = DEFAULT_MEMORY_LIMIT):
+        self.max_rows = max_rows
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self._conn = duckdb.connect(database=":memory:")
+        self._conn.execute(f"SET memory_limit = '{memory_limit}'")
+        self._lock = threading.Lock()
+        self.tables: Dict[str, str] = {}
+        # Registered Arrow tables are visible to one connection only, so every cursor registers them again
+        self._arrow_tables: Dict[str, object] = {}
+        for name, source in (tables or {}).items():
+            self.register(name, source)
+
+    def register(self, name: str, source: Union[str, pd.DataFrame]) -> None:
+        """Register (or replace) a table from a Parquet/CSV path or a DataFrame."""
+        if not TABLE_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid table name: {name!r}")
+        with self._lock:
+            if self._arrow_tables.pop(name, None) is not None:
+                self._conn.unregister(name)
+            self._conn.execute(f'DROP VIEW IF EXISTS "{name}"')
+            self._conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            if isinstance(source, str) and source.endswith(".parquet"):
+                path = os.path.abspath(source).replace("'", "''")
+                self._conn.execute(f"""CREATE VIEW "{name}" AS SELECT * FROM read_parquet('{path}')""")
+                self.tables[name] = os.path.abspath(source)
+                return
+            if isinstance(source, str) and source.endswith(".arrow"):
+                from workspace import map_arrow
+
+                # Workspace tables are scanned in place from the memory-mapped file
+                self._arrow_tables[name] = map_arrow(source)
+                self._conn.register(name, self._arrow_tables[name])
+                self.tables[name] = os.path.abspath(source)
+                return
+            if isinstance(source, str):
+                with open(source, "rb") as f:
+                    df = ingest_csv(f)
+                self.tables[name] = os.path.abspath(source)
+            else:
+                df, self.tables[name] = source, "<DataFrame>"
+            self._conn.register("_source_frame", df)
+            try:
+                self._conn.execute(f'CREATE TABLE "{name}" AS SELECT * FROM _source_frame')
+            finally:
+                self._conn.unregister("_source_frame")
+
+    def describe(self) -> str:
+        """List the registered tables and their columns, for tool descriptions."""
+        lines = []
+        for name in self.tables:
+            columns = self._conn.execute(f'DESCRIBE "{name}"').fetchall()
+            lines.append(f"{name}({', '.join(f'{column[0]} {column[1]}' for column in columns)})")
+        return "\n".join(lines)
+
+    def query(self, sql: str, max_rows: Optional[int] = None) -> str:
+        """Run one read-only SQL statement and return its result as a markdown table."""
+        with tracing.span("sql_tool", query_bytes=len(sql)) as span:
+            output = self._query(sql, max_rows or self.max_rows)
+            span.set(output_bytes=len(output))
+            return output
+
+    def _query(self, sql: str, max_rows: int) -> str:
+        try:
+            statements = self._conn.extract_statements(sql)
+        except duckdb.Error as e:
+            return f"Error: {e}"
+        if len(statements) != 1:
+            return "Error: send exactly one SQL statement."
+        if statements[0].type != duckdb.StatementType.SELECT:
+            return "Error: only read queries (SELECT, WITH, DESCRIBE, SUMMARIZE) are allowed."
+
+        # Each query gets its own cursor so concurrent tool calls do not share results
+        cursor = self._conn.cursor()
+        for name, table in self._arrow_tables.items():
+            cursor.register(name, table)
+        timer = threading.Timer(self.timeout, cursor.interrupt)
+        timer.start()
+        try:
+            cursor.execute(sql)
+            rows = cursor.fetchmany(max_rows + 1)
+            columns = [description[0] for description in cursor.description]
+        except duckdb.InterruptException:
+            return f"Error: the query did not finish within {self.timeout:g} seconds."
+        except duckdb.Error as e:
+            return f"Error: {e}"
+        finally:
+            timer.cancel()
+            cursor.close()
+
+        truncated = len(rows) > max_rows
+        result = pd.DataFrame(rows[:max_rows], columns=columns)
+        text = _to_markdown(result) if len(result) else "(no rows)"
+        if len(text) > self.max_chars:
+            text = text[:self.max_chars].rsplit("\n", 1)[0]
+            truncated = True
+        if truncated:
+            text += (f"\n... result truncated (limit {max_rows} rows, {self.max_chars} characters); "
+                     "aggregate or filter in SQL to see the rest.")
+        return text
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _format_float(value: float) -> str:
+    """Write a float in full, never in scientific notation: 169559000000, 0.25."""
+    return "" if pd.isna(value) else np.format_float_positional(value, trim="-")
+
+
+def _to_markdown(result: pd.DataFrame) -> str:
+    """Render a result as a markdown table, with financial-scale floats written out in full."""
+    align = ["right" if pd.api.types.is_numeric_dtype(result[column]) else "left" for column in result.columns]
+    text = result.apply(lambda column: column.map(_format_float) if pd.api.types.is_float_dtype(column) else column)
+    # Cells are written as-is; tabulate would otherwise re-parse them as numbers
+    return text.to_markdown(index=False, disable_numparse=True, colalign=align)
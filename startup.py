@@ -0,0 +1,170 @@
+"""
+Fast startup for the apps: lazily built values, background warm-up with a
+readiness report, and an import-time benchmark.
+
+The apps import only what they need to accept requests; langchain, pandas
+and the Cohere client are loaded on first use, or ahead of it by
+`Readiness.start()` while the server is already up. The benchmark imports an
+app in fresh interpreters under `python -X importtime` and fails when the
+median exceeds a budget, so cold-start regressions are caught:
+
+    python startup.py Nader_csv_agent_app --budget-ms 600
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+
+DEFAULT_MODEL = os.getenv("COHERE_MODEL", "command-r-plus-08-2024")
+DEFAULT_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "800"))
+
+T = TypeVar("T")
+
+
+class MissingAPIKeyError(RuntimeError):
+    """Raised when the LLM is first needed and `COHERE_API_KEY` is not set."""
+
+
+def build_cohere_llm(model: str = DEFAULT_MODEL, temperature: float = 0):
+    """Build the Cohere chat model, importing langchain_cohere only now."""
+    api_key = os.getenv("COHERE_API_KEY")
+    if not api_key:
+        raise MissingAPIKeyError("COHERE_API_KEY is not set; add it to the environment or a .env file.")
+    from langchain_cohere import ChatCohere
+
+    return ChatCohere(cohere_api_key=api_key, model=model, temperature=temperature)
+
+
+class Lazy(Generic[T]):
+    """A value built by `factory` on the first `get()`; concurrent first calls build it once."""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self._factory()
+                    self._built = True
+        return self._value
+
+    def set(self, value: T) -> None:
+        """Replace the value, e.g. with a fake LLM for offline runs."""
+        with self._lock:
+            self._value = value
+            self._built = True
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+
+class Readiness:
+    """
+    Runs warm-up steps on a background thread and reports their progress.
+
+    The app is ready once every step has succeeded; a failed step (say, a
+    missing API key) keeps it unready and is reported with its error.
+    """
+
+    def __init__(self, steps: Dict[str, Callable[[], object]]):
+        self.steps = steps
+        self.results: Dict[str, dict] = {}
+        self._started_at: Optional[float] = None
+        self._ready_seconds: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        for name, step in self.steps.items():
+            started = time.perf_counter()
+            try:
+                step()
+                self.results[name] = {"ok": True, "seconds": round(time.perf_counter() - started, 3)}
+            except Exception as e:
+                self.results[name] = {"ok": False, "seconds": round(time.perf_counter() - started, 3),
+                                      "error": str(e)}
+        if self.ready:
+            self._ready_seconds = time.perf_counter() - self._started_at
+
+    @property
+    def ready(self) -> bool:
+        return len(self.results) == len(self.steps) and all(result["ok"] for result in self.results.values())
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "steps": {name: self.results.get(name, {"ok": None}) for name in self.steps},
+            "ready_after_seconds": round(self._ready_seconds, 3) if self._ready_seconds is not None else None,
+        }
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Parse `-X importtime` output into (module, self us, cumulative us) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure_import(module: str, env: Optional[Dict[str, str]] = None) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Import `module` in a fresh interpreter; return its import time in ms and the per-module rows."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+    total = next((cumulative for name, _, cumulative in rows if name == module), 0)
+    return total / 1000, rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure an app's cold import time against a budget.")
+    parser.add_argument("modules", nargs="+", help="modules to import, e.g. Nader_csv_agent_app")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imported packages to list")
+    args = parser.parse_args(argv)
+
+    # Without an API key, as on a replica whose secrets are not mounted yet
+    env = {key: value for key, value in os.environ.items() if key != "COHERE_API_KEY"}
+    over_budget = False
+    for module in args.modules:
+        timings, rows = [], []
+        for _ in range(args.runs):
+            milliseconds, rows = measure_import(module, env)
+            timings.append(milliseconds)
+        median = statistics.median(timings)
+        over_budget |= median > args.budget_ms
+        print(f"{module}: median {median:.0f} ms over {args.runs} runs "
+              f"(min {min(timings):.0f}, max {max(timings):.0f}, budget {args.budget_ms:.0f} ms)"
+              f"{'  OVER BUDGET' if median > args.budget_ms else ''}")
+        top_level = {}
+        for name, _, cumulative in rows:
+            package = name.split(".")[0]
+            if package != module:
+                top_level[package] = max(top_level.get(package, 0), cumulative)
+        for package, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {package}")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
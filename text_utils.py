@@ -0,0 +1,20 @@
+"""
+Small text helpers shared by modules that should not depend on each other,
+such as the answer cache, the schema profiles and the web search client.
+"""
+import re
+
+
+# Rough tokens-per-character ratio for English text, numbers and identifiers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the prompt tokens of a text without calling a tokenizer."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case a question, collapse whitespace and drop trailing punctuation."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
@@ -0,0 +1,89 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+import tracing
+
+
+@dataclass
+class TokenUsage:
+    """Running token and LLM call counts for one agent run."""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    llm_calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def add(self, input_tokens: int = 0, output_tokens: int = 0) -> None:
+        self.input_tokens += int(input_tokens or 0)
+        self.output_tokens += int(output_tokens or 0)
+        self.llm_calls += 1
+
+
+def cohere_usage(response: Any) -> Tuple[int, int]:
+    """Return the billed input and output tokens of a native `co.chat` response."""
+    billed = getattr(getattr(response, "meta", None), "billed_units", None)
+    return int(getattr(billed, "input_tokens", 0) or 0), int(getattr(billed, "output_tokens", 0) or 0)
+
+
+def add_cohere_usage(usage: TokenUsage, response: Any) -> None:
+    """Add the billed tokens of a native `co.chat` response to `usage`."""
+    usage.add(*cohere_usage(response))
+
+
+def llm_result_tokens(response: LLMResult) -> Tuple[int, int]:
+    """Return the input and output tokens reported in a langchain LLM result."""
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            input_tokens += metadata.get("input_tokens", 0)
+            output_tokens += metadata.get("output_tokens", 0)
+    return input_tokens, output_tokens
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Langchain callback that totals the token usage reported by chat models."""
+
+    def __init__(self):
+        self.usage = TokenUsage()
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        input_tokens, output_tokens = llm_result_tokens(response)
+        with self._lock:
+            self.usage.add(input_tokens, output_tokens)
+
+
+class TracingCallbackHandler(TokenUsageHandler):
+    """
+    Langchain callback that records every LLM call as an `llm` span with its
+    token counts, and totals the run's usage like `TokenUsageHandler`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._starts: Dict[UUID, Tuple[float, float]] = {}
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = (time.time(), time.perf_counter())
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[list], *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = (time.time(), time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        super().on_llm_end(response, run_id=run_id, **kwargs)
+        input_tokens, output_tokens = llm_result_tokens(response)
+        start, started = self._starts.pop(run_id, (time.time(), time.perf_counter()))
+        tracing.record_llm_call(start, time.perf_counter() - started, input_tokens, output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        start, started = self._starts.pop(run_id, (time.time(), time.perf_counter()))
+        tracing.record_span("llm", start, time.perf_counter() - started, error=repr(error))
@@ -1,81 +1,64 @@
 from langchain.agents import Tool
-from langchain_community.tools.tavily_search import TavilySearchResults
+import os
+import threading
 from pydantic import BaseModel, Field
-from langchain_experimental.utilities import PythonREPL
-from typing import Dict, List, Optional
+from typing import List, Optional, Union
+from python_pool import get_default_pool
+from search_index import SearchIndex
+from sql_engine import DEFAULT_MAX_ROWS as SQL_MAX_ROWS, SQLEngine
+from web_search import get_default_client
 
 
-def search_developer_docs(query: str) -> dict:
-    
-    developer_docs = [{"text" : "## The Rerank endpoint\nThis endpoint takes in a query and a list of texts and produces an ordered array with each text assigned a relevance score."},
-    
-    {"text" : "## The Embed endpoint\nThis endpoint returns text embeddings. An embedding is a list of floating point numbers that captures semantic information about the text that it represents.."},
+EVALUATION_RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation_results.csv")
+FINANCIAL_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "financial-csv-agent")
+
+# Tables the SQL tool can query, registered once on first use
+SQL_TABLES = {
+    "income_statement": os.path.join(FINANCIAL_DATA_DIR, "income_statement.csv"),
+    "balance_sheet": os.path.join(FINANCIAL_DATA_DIR, "balance_sheet.csv"),
+    "evaluation_results": EVALUATION_RESULTS_PATH,
+}
+
+# Search corpora are JSONL files, re-indexed when they change
+SEARCH_CORPUS_DIR = os.getenv("SEARCH_CORPUS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_corpus"))
+developer_docs_index = SearchIndex([os.path.join(SEARCH_CORPUS_DIR, "developer_docs.jsonl")], text_fields=("text",))
+code_examples_index = SearchIndex([os.path.join(SEARCH_CORPUS_DIR, "code_examples.jsonl")], text_fields=("content",),
+                                  facet_fields=("programming_language", "endpoints"))
 
-    {"text" : "## Embed endpoint multilingual support\nIn addition to embed-english-v3.0 we offer a best-in-class multilingual model embed-multilingual-v3.0 with support for over 100 languages."},
-    
-    {"text" : "## The Chat endpoint\nThis endpoint facilitates a conversational interface, allowing users to send messages to the model and receive text responses."},
-    
-    {"text" : "## Retrieval Augmented Generation (RAG)\nRAG is a method for generating text using additional information fetched from an external data source, which can greatly increase the accuracy of the response."},
-    
-    {"text" : "## The temperature parameter\nTemperature is a number used to tune the degree of randomness of a generated text."},
-    ]
 
-    return developer_docs
+def search_developer_docs(query: str) -> dict:
+    """
+    Function to retrieve the developer docs most relevant to the query
+    """
+    return [{"text": doc["text"]} for doc in developer_docs_index.search(query)]
     
 def search_internet(query: str) -> dict:
-    tool = TavilySearchResults(
-        max_results=5,
-        search_depth="advanced",
-        include_answer=True,
-        include_raw_content=True
-    )
-    documents = tool.invoke({"query": query})
-    
-    return documents
+    """
+    Function to search the web through the shared, cached search client
+    """
+    return get_default_client().search(query)
 
 def search_code_examples(query: str) -> dict:
-    
-    code_examples = [
-        {"content": "Calendar Agent with Native Multi Step Tool"},
-        {"content": "Wikipedia Semantic Search with Cohere Embedding Archives"},
-        {"content": "RAG With Chat Embed and Rerank via Pinecone"},
-        {"content": "Build Chatbots That Know Your Business with MongoDB and Cohere"},
-        {"content": "Advanced Document Parsing For Enterprises"}
-    ]
-    
-    return code_examples
+    """
+    Function to retrieve the code examples most relevant to the query
+    """
+    return [{"content": example["content"]} for example in code_examples_index.search(query)]
 
-def search_code_examples_detailed(query: str = None, programming_language: Optional[str] = None, endpoints: Optional[List[str]] = None) -> dict:
-    
-    code_examples = [
-        {"content": "Calendar Agent with Native Multi Step Tool", "programming_language": "py", "endpoints": ["chat"]},
-        {"content": "Wikipedia Semantic Search with Cohere Embedding Archives", "programming_language": "py", "endpoints": ["embed", "rerank"]},
-        {"content": "RAG With Chat Embed and Rerank via Pinecone", "programming_language": "py", "endpoints": ["chat", "embed", "rerank"]},
-        {"content": "Build Chatbots That Know Your Business with MongoDB and Cohere", "programming_language": "py", "endpoints": ["chat", "embed", "rerank"]},
-        {"content": "Advanced Document Parsing For Enterprises", "programming_language": "py", "endpoints": ["embed"]},
-        {"content": "Build a Chrome extension to summarize web pages", "programming_language": "js", "endpoints": ["chat"]},
-        {"content": "Sentiment analysis using Google Apps Script", "programming_language": "js", "endpoints": ["classify"]},
-    ]
-    
-    # Filter based on file_type if provided
-    if programming_language:
-        filtered_examples = [ex for ex in code_examples if any(lang in ex["programming_language"] for lang in programming_language)]
-    
-    # Filter based on endpoints if provided
-    elif endpoints:
-        filtered_examples = [ex for ex in code_examples if any(endpoint in ex["endpoints"] for endpoint in endpoints)]
-    
-    else:
-        filtered_examples = code_examples
-                             
-    return filtered_examples
+def search_code_examples_detailed(query: str = None, programming_language: Optional[Union[str, List[str]]] = None, endpoints: Optional[List[str]] = None) -> dict:
+    """
+    Function to retrieve code examples for the query, keeping only those in one of
+    the given programming languages and using one of the given endpoints
+    """
+    filters = {"programming_language": programming_language, "endpoints": endpoints}
+    return code_examples_index.search(query, filters=filters)
 
 
-python_repl = PythonREPL()
+# Code runs in warm worker processes with pandas imported, a timeout and a memory cap
+python_pool = get_default_pool()
 python_tool = Tool(
     name="python_repl",
     description="Executes python code and returns the result. The code runs in a static sandbox without interactive mode, so print output or save output to a file.",
-    func=python_repl.run,
+    func=python_pool.run,
 )
 python_tool.name = "python_interpreter"
 
@@ -89,15 +72,35 @@ python_tool.args_schema = ToolInput
 
 def analyze_evaluation_results(code: str) -> dict:
     """
-    Function to run given python code
+    Function to run given python code with `evaluation_results` already loaded
     """
     input_code = ToolInput(code=code)
     
-    python_answer = python_tool.func(input_code.code)
+    python_answer = python_pool.run(input_code.code, frames={"evaluation_results": EVALUATION_RESULTS_PATH})
     
     return python_answer
 
 
+_sql_engine = None
+_sql_engine_lock = threading.Lock()
+
+
+def get_sql_engine() -> SQLEngine:
+    """Return the shared SQL engine, registering `SQL_TABLES` on first use."""
+    global _sql_engine
+    with _sql_engine_lock:
+        if _sql_engine is None:
+            _sql_engine = SQLEngine(SQL_TABLES)
+        return _sql_engine
+
+
+def run_sql_query(query: str) -> str:
+    """
+    Function to run a read-only SQL query over the registered tables
+    """
+    return get_sql_engine().query(query)
+
+
 search_developer_docs_tool = {
         "type": "function",
         "function": {
@@ -184,7 +187,7 @@ analyze_evaluation_results_tool = {
         "type": "function",
         "function": {
             "name": "analyze_evaluation_results",
-            "description": "Generate Python code using the pandas library to analyze evaluation results from a dataframe called `evaluation_results`. The dataframe has columns 'usecase','run','score','temperature','tokens', and 'latency'. You must start with `import pandas as pd` and read a CSV file called `evaluation_results.csv` into the `evaluation_results` dataframe.",
+            "description": "Generate Python code using the pandas library to analyze evaluation results from a dataframe called `evaluation_results`. The dataframe has columns 'usecase','run','score','temperature','tokens', and 'latency'. `pandas` is already imported as `pd` and the `evaluation_results` dataframe is already loaded, so do not import pandas or read any CSV file.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -196,4 +199,23 @@ analyze_evaluation_results_tool = {
                 "required": ["code"]
             }
         }
-}
\ No newline at end of file
+}
+
+run_sql_query_tool = {
+        "type": "function",
+        "function": {
+            "name": "run_sql_query",
+            "description": "Runs one read-only DuckDB SQL query and returns the result as a table. The tables `income_statement`, `balance_sheet` and `evaluation_results` are already registered; join them in a single query instead of making several calls. Use DESCRIBE <table> to list columns and double quotes for column names with spaces. "
+                           f"Results are limited to {SQL_MAX_ROWS} rows, so aggregate or filter in SQL.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "A single SQL SELECT, WITH, DESCRIBE or SUMMARIZE statement."
+                    }
+                },
+                "required": ["query"]
+            }
+        }
+}
@@ -0,0 +1,229 @@
+"""
+Lightweight request tracing and Prometheus-style metrics.
+
+`span(name, **attributes)` times a block of work. Spans nest through a
+context variable, so spans opened in worker threads that copy the caller's
+context (FastAPI's threadpool, `QuestionExecutor`) join the request's trace.
+Every finished span feeds the duration histogram, numeric `*_bytes`
+attributes feed the payload size histogram, and, when `TRACE_LOG_PATH` is
+set, the span is appended to that file as one JSON line for offline
+profiling. `render_metrics()` returns everything in the Prometheus text
+exposition format.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864, 268435456)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+STEP_BUCKETS = (0, 1, 2, 3, 4, 5, 7, 10, 15)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+               for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            # One count per bucket plus +Inf, then the sum
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(list(self.buckets) + ["+Inf"], series[:-1]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]:g}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        metric = Counter(name, documentation)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float]) -> Histogram:
+        metric = Histogram(name, documentation, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+SPAN_SECONDS = metrics.histogram("csv_agent_span_seconds", "Duration of traced operations.", DURATION_BUCKETS)
+PAYLOAD_BYTES = metrics.histogram("csv_agent_payload_bytes", "Size of uploads, code, tool output and answers.", BYTE_BUCKETS)
+LLM_TOKENS = metrics.histogram("csv_agent_llm_call_tokens", "Tokens per LLM call.", TOKEN_BUCKETS)
+LLM_TOKENS_TOTAL = metrics.counter("csv_agent_llm_tokens_total", "Tokens sent to and received from the LLM.")
+AGENT_STEPS = metrics.histogram("csv_agent_agent_steps", "Tool-use steps per agent run.", STEP_BUCKETS)
+SPAN_ERRORS = metrics.counter("csv_agent_span_errors_total", "Traced operations that raised.")
+
+
+def render_metrics() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+    return metrics.render()
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = 0.0  # Unix time
+    duration: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+_trace_log_path = os.getenv("TRACE_LOG_PATH")
+_trace_log_lock = threading.Lock()
+
+
+def set_trace_log(path: Optional[str]) -> None:
+    """Append finished spans to `path` as JSON lines; None turns the log off."""
+    global _trace_log_path
+    _trace_log_path = path
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _new_span(name: str, attributes: Dict[str, Any], start: float) -> Span:
+    parent = _current_span.get()
+    return Span(name=name,
+                trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+                span_id=uuid.uuid4().hex[:16],
+                parent_id=parent.span_id if parent else None,
+                start=start,
+                attributes=dict(attributes))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Time the enclosed block as a span; exceptions are recorded and re-raised."""
+    current = _new_span(name, attributes, time.time())
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=repr(e))
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        finish_span(current)
+
+
+def record_span(name: str, start: float, duration: float, **attributes: Any) -> Span:
+    """Record an already finished operation as a child of the current span."""
+    finished = _new_span(name, attributes, start)
+    finished.duration = duration
+    finish_span(finished)
+    return finished
+
+
+def finish_span(finished: Span) -> None:
+    SPAN_SECONDS.observe(finished.duration, span=finished.name)
+    if "error" in finished.attributes:
+        SPAN_ERRORS.inc(span=finished.name)
+    for name, value in finished.attributes.items():
+        if name.endswith("_bytes") and isinstance(value, (int, float)):
+            PAYLOAD_BYTES.observe(value, span=finished.name, payload=name[:-len("_bytes")])
+
+    if _trace_log_path:
+        line = json.dumps({
+            "name": finished.name,
+            "trace_id": finished.trace_id,
+            "span_id": finished.span_id,
+            "parent_id": finished.parent_id,
+            "start": finished.start,
+            "duration": finished.duration,
+            "attributes": finished.attributes,
+        }, default=str)
+        with _trace_log_lock:
+            with open(_trace_log_path, "a") as f:
+                f.write(line + "\n")
+
+
+def record_llm_call(start: float, duration: float, input_tokens: int, output_tokens: int) -> Span:
+    """Record one LLM call as an `llm` span and add its tokens to the metrics."""
+    LLM_TOKENS.observe(input_tokens, direction="input")
+    LLM_TOKENS.observe(output_tokens, direction="output")
+    LLM_TOKENS_TOTAL.inc(input_tokens, direction="input")
+    LLM_TOKENS_TOTAL.inc(output_tokens, direction="output")
+    return record_span("llm", start, duration, input_tokens=input_tokens, output_tokens=output_tokens)
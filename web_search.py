@@ -0,0 +1,208 @@
+"""
+Long-lived web search client for the `search_internet` tool.
+
+One pooled `httpx.Client` is shared by every call instead of building a
+`TavilySearchResults` (and a new connection) per query. Results are cached
+by normalized query and options, concurrent identical queries share one
+request, and each page's raw content is trimmed to a token budget before it
+reaches the model. `base_url` points the client at the Tavily API or at the
+stub server below:
+
+    python web_search.py --stub --port 8765
+    TAVILY_BASE_URL=http://127.0.0.1:8765 python web_search.py "cohere rerank"
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+import tracing
+from text_utils import CHARS_PER_TOKEN, normalize_question
+from ttl_cache import SingleFlight, TTLCache
+
+
+# Defaults, overridable through the environment
+DEFAULT_BASE_URL = os.getenv("TAVILY_BASE_URL", "https://api.tavily.com")
+DEFAULT_MAX_RESULTS = int(os.getenv("WEB_SEARCH_MAX_RESULTS", "5"))
+DEFAULT_RAW_CONTENT_TOKENS = int(os.getenv("WEB_SEARCH_RAW_CONTENT_TOKENS", "500"))
+DEFAULT_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "256"))
+DEFAULT_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "900"))
+DEFAULT_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "20"))
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("WEB_SEARCH_MAX_CONNECTIONS", "10"))
+
+
+def trim_to_tokens(text: Optional[str], max_tokens: int) -> Optional[str]:
+    """Cut text to about `max_tokens` tokens, at a word boundary."""
+    if not text:
+        return text
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + " …"
+
+
+class WebSearchClient:
+    """
+    Tavily search over a pooled HTTP client, with a TTL/LRU result cache and
+    single-flight deduplication of concurrent identical queries.
+
+    `raw_content_tokens=0` skips raw page content altogether.
+    """
+
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 base_url: str = DEFAULT_BASE_URL,
+                 max_results: int = DEFAULT_MAX_RESULTS,
+                 search_depth: str = "advanced",
+                 include_answer: bool = True,
+                 raw_content_tokens: int = DEFAULT_RAW_CONTENT_TOKENS,
+                 cache: Optional[TTLCache] = None,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        self.api_key = api_key if api_key is not None else os.getenv("TAVILY_API_KEY", "")
+        self.base_url = base_url.rstrip("/")
+        self.max_results = max_results
+        self.search_depth = search_depth
+        self.include_answer = include_answer
+        self.raw_content_tokens = raw_content_tokens
+        self.cache = cache if cache is not None else TTLCache(max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL)
+        self.single_flight = SingleFlight()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._http = httpx.Client(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def search(self, query: str, max_results: Optional[int] = None,
+               search_depth: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return `{"url", "title", "content", "raw_content"}` results for a query."""
+        options = {
+            "max_results": max_results or self.max_results,
+            "search_depth": search_depth or self.search_depth,
+            "include_answer": self.include_answer,
+            "include_raw_content": self.raw_content_tokens > 0,
+        }
+        key = (normalize_question(query), tuple(sorted(options.items())), self.raw_content_tokens)
+        with tracing.span("web_search", query_bytes=len(query)) as span:
+            results = self.cache.get(key)
+            span.set(cached=results is not None)
+            if results is None:
+                results = self.single_flight.do(key, lambda: self._fetch(key, query, options))
+            span.set(results=len(results))
+            return results
+
+    def _fetch(self, key, query: str, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # A caller that waited on another single-flight leader finds its result here
+        results = self.cache.get(key, count=False)
+        if results is not None:
+            return results
+        with self._lock:
+            self.requests += 1
+        response = self._http.post("/search", json={"api_key": self.api_key, "query": query, **options})
+        response.raise_for_status()
+        results = self._clean(response.json())
+        self.cache.set(key, results)
+        return results
+
+    def _clean(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        results = []
+        if payload.get("answer"):
+            results.append({"url": None, "title": "Answer", "content": payload["answer"]})
+        for result in payload.get("results", []):
+            cleaned = {"url": result.get("url"), "title": result.get("title"), "content": result.get("content")}
+            if self.raw_content_tokens > 0 and result.get("raw_content"):
+                cleaned["raw_content"] = trim_to_tokens(result["raw_content"], self.raw_content_tokens)
+            results.append(cleaned)
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.requests
+        return {"requests": requests, "shared": self.single_flight.shared, "cache": self.cache.stats()}
+
+    def close(self) -> None:
+        self._http.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> WebSearchClient:
+    """Return the process-wide search client, created on first use."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = WebSearchClient()
+        return _default_client
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.queries.append(body.get("query"))
+        query = body.get("query", "")
+        payload = {
+            "answer": f"Stub answer for {query}" if body.get("include_answer") else None,
+            "results": [
+                {
+                    "url": f"https://example.com/{i}",
+                    "title": f"Result {i} for {query}",
+                    "content": f"Snippet {i} about {query}.",
+                    "raw_content": (f"Page {i} about {query}. " * 2000) if body.get("include_raw_content") else None,
+                }
+                for i in range(int(body.get("max_results") or DEFAULT_MAX_RESULTS))
+            ],
+        }
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0) -> ThreadingHTTPServer:
+    """Serve canned Tavily-shaped results on localhost; `server.queries` records what was asked."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StubHandler)
+    server.queries = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a web search, or serve stub search results.")
+    parser.add_argument("query", nargs="?")
+    parser.add_argument("--stub", action="store_true", help="serve stub results instead of searching")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    if args.stub:
+        server = start_stub_server(args.port)
+        print(f"Stub search server on http://127.0.0.1:{server.server_address[1]}", file=sys.stderr)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+    if not args.query:
+        parser.error("a query is required unless --stub is given")
+    print(json.dumps(get_default_client().search(args.query), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Named catalogs of tables, shared by every session and python worker.
+
+Uploads are stored once, by content hash, as uncompressed Arrow IPC files and
+memory-mapped. Frames are backed by the mapped Arrow buffers (ArrowDtype
+columns; only timestamp columns are converted to numpy), so the OS page cache
+holds one copy of each distinct table however many sessions and worker
+processes read it. Arrow buffers are immutable: every session gets its own
+`copy()` of a frame, which copies no data, and a session that modifies it
+gets new buffers for the columns it changed, leaving everyone else's alone.
+
+A `Workspace` is one session's catalog, e.g. `income_statement` and
+`balance_sheet` uploaded together for one multi-table agent.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+import tracing
+from csv_ingest import ingest_csv
+from dataset_cache import fingerprint_stream
+from schema_profile import PROFILE_VERSION, profile_frame
+from ttl_cache import KeyedLocks
+
+
+WORKSPACE_DIR = os.getenv("WORKSPACE_DIR", os.path.join(tempfile.gettempdir(), "csv_agent_workspace"))
+DEFAULT_MAX_MAPPED_TABLES = int(os.getenv("WORKSPACE_MAX_MAPPED_TABLES", "64"))
+DEFAULT_MAX_DISK_BYTES = int(os.getenv("WORKSPACE_MAX_DISK_BYTES", str(10 * 1024 * 1024 * 1024)))
+
+ARROW_SUFFIX = ".arrow"
+
+TABLE_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _types_mapper(arrow_type: pa.DataType) -> Optional[pd.ArrowDtype]:
+    # Timestamps become numpy datetimes, which the profiles and planner understand
+    return None if pa.types.is_timestamp(arrow_type) else pd.ArrowDtype(arrow_type)
+
+
+def write_arrow(df: pd.DataFrame, path: str) -> None:
+    """Store a frame as an uncompressed Arrow IPC file, which can be memory-mapped."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    partial_path = f"{path}.partial"
+    with pa.OSFile(partial_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(partial_path, path)
+
+
+def map_arrow(path: str) -> pa.Table:
+    """Memory-map an Arrow IPC file; no data is read until it is used."""
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def map_frame(path: str) -> pd.DataFrame:
+    """A DataFrame over the memory-mapped buffers of an Arrow IPC file."""
+    return map_arrow(path).to_pandas(types_mapper=_types_mapper)
+
+
+def table_name(filename: str) -> str:
+    """Derive a table name from an uploaded file name, e.g. `income_statement`."""
+    stem = os.path.splitext(os.path.basename(filename or ""))[0]
+    name = re.sub(r"\W+", "_", stem).strip("_").lower()
+    return name if TABLE_NAME_PATTERN.match(name) else f"t_{name}"
+
+
+@dataclass
+class StoredTable:
+    """A stored upload: its content hash, Arrow file, shared frame and profile."""
+    key: str
+    path: str
+    frame: pd.DataFrame
+    profile: Dict[str, Any]
+
+
+class TableStore:
+    """
+    Content-addressed Arrow files, each memory-mapped once per process.
+
+    The `max_mapped` most recently used tables stay mapped; a table dropped
+    from the store is unmapped once no session holds a frame over it. Files
+    on disk are capped at `max_disk_bytes`, removing the least recently used
+    tables that are no longer mapped anywhere in the process first.
+    """
+
+    def __init__(self,
+                 directory: str = WORKSPACE_DIR,
+                 max_mapped: int = DEFAULT_MAX_MAPPED_TABLES,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        self.directory = directory
+        self.max_mapped = max_mapped
+        self.max_disk_bytes = max_disk_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._tables: "OrderedDict[str, StoredTable]" = OrderedDict()
+        # Every table some session still holds, whether or not the store keeps it mapped
+        self._mapped: "weakref.WeakValueDictionary[str, StoredTable]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        # Concurrent uploads of the same file wait for a single parse
+        self._key_locks = KeyedLocks()
+        self.hits = 0
+        self.maps = 0
+        self.parses = 0
+        self.removals = 0
+
+    def load_csv(self, stream: BinaryIO) -> StoredTable:
+        """Return the stored table for a CSV upload, parsing it only if it is new."""
+        with tracing.span("workspace.load") as span:
+            key = fingerprint_stream(stream)
+            with self._key_locks.hold(key):
+                table = self.get(key)
+                if table is not None:
+                    span.set(source="memory")
+                    return table
+                path = self._path(key)
+                if os.path.exists(path):
+                    self._touch(path)
+                    span.set(source="disk")
+                else:
+                    with tracing.span("dataset.parse_csv"):
+                        write_arrow(ingest_csv(stream), path)
+                    with self._lock:
+                        self.parses += 1
+                    span.set(source="parse")
+                frame = map_frame(path)
+                table = StoredTable(key=key, path=path, frame=frame, profile=self._profile(key, frame))
+                span.set(rows=len(frame), arrow_bytes=os.path.getsize(path))
+                with self._lock:
+                    self.maps += 1
+                    self._tables[key] = table
+                    self._mapped[key] = table
+                    while len(self._tables) > self.max_mapped:
+                        self._tables.popitem(last=False)
+                self._enforce_disk_budget(keep=key)
+                return table
+
+    def get(self, key: Optional[str]) -> Optional[StoredTable]:
+        with self._lock:
+            table = self._tables.get(key) if key else None
+            if table is None:
+                return None
+            self._tables.move_to_end(key)
+            self.hits += 1
+        self._touch(table.path)
+        return table
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mapped_tables": len(self._tables),
+                "mapped_bytes": sum(os.path.getsize(table.path) for table in self._tables.values()
+                                    if os.path.exists(table.path)),
+                "max_mapped": self.max_mapped,
+                "disk_bytes": sum(size for _, size, _, _ in self._stored_files()),
+                "max_disk_bytes": self.max_disk_bytes,
+                "hits": self.hits,
+                "maps": self.maps,
+                "parses": self.parses,
+                "removals": self.removals,
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{ARROW_SUFFIX}")
+
+    def _profile_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.profile.json")
+
+    def _profile(self, key: str, frame: pd.DataFrame) -> Dict[str, Any]:
+        """Read the table's stored profile, or profile it and store the result."""
+        path = self._profile_path(key)
+        try:
+            with open(path, "r") as f:
+                profile = json.load(f)
+            if profile.get("version") == PROFILE_VERSION:
+                return profile
+        except (OSError, ValueError):
+            pass
+        profile = profile_frame(frame)
+        with open(path, "w") as f:
+            json.dump(profile, f)
+        return profile
+
+    def _touch(self, path: str) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _stored_files(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ARROW_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name[:-len(ARROW_SUFFIX)], path))
+        return files
+
+    def _enforce_disk_budget(self, keep: str) -> None:
+        files = sorted(self._stored_files())
+        usage = sum(size for _, size, _, _ in files)
+        for _, size, key, path in files:
+            if usage <= self.max_disk_bytes:
+                break
+            # Tables being loaded or still mapped stay on disk: the python
+            # workers and the SQL tool open them by path
+            if key == keep or key in self._key_locks:
+                continue
+            with self._lock:
+                if key in self._mapped:
+                    continue
+                self.removals += 1
+            for stale in (path, self._profile_path(key)):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+            usage -= size
+
+
+class Workspace:
+    """
+    One session's catalog of named tables over a shared `TableStore`.
+
+    `frames()` returns the session's own copy-on-write frames; `paths()` and
+    `profiles()` feed the python workers, the SQL tool and the prompt.
+    """
+
+    def __init__(self, store: TableStore, tables: Optional[Dict[str, StoredTable]] = None):
+        self.store = store
+        self.tables: Dict[str, StoredTable] = dict(tables or {})
+        self._frames: Dict[str, pd.DataFrame] = {}
+
+    def add_csv(self, name: str, stream: BinaryIO) -> StoredTable:
+        """Add (or replace) the table `name` with a CSV upload."""
+        if not TABLE_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid table name: {name!r}")
+        table = self.store.load_csv(stream)
+        self.tables[name] = table
+        self._frames.pop(name, None)
+        return table
+
+    def remove(self, name: str) -> None:
+        self.tables.pop(name, None)
+        self._frames.pop(name, None)
+
+    def frames(self) -> Dict[str, pd.DataFrame]:
+        """This session's frames: copies that share the mapped data until modified."""
+        for name, table in self.tables.items():
+            if name not in self._frames:
+                self._frames[name] = table.frame.copy()
+        return dict(self._frames)
+
+    def paths(self) -> Dict[str, str]:
+        return {name: table.path for name, table in self.tables.items()}
+
+    def profiles(self) -> Dict[str, Dict[str, Any]]:
+        return {name: table.profile for name, table in self.tables.items()}
+
+    @property
+    def key(self) -> str:
+        """Fingerprint of the catalog: its table names and their contents."""
+        catalog = ",".join(f"{name}={table.key}" for name, table in sorted(self.tables.items()))
+        return hashlib.sha256(catalog.encode()).hexdigest()
+
+
+_default_store: Optional[TableStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_table_store() -> TableStore:
+    """Return the process-wide table store shared by the apps."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = TableStore()
+        return _default_store